@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""Per-entity history index and compressed monthly segments for audit_logs.
+
+audit_logs is append-only and never compacted; answering "what did this lead
+look like on date X" or "who changed what this month" means scanning it. This
+streams audit events in created_at order (from a watermark) into:
+
+    segments/<YYYY-MM>.seg   raw events as zlib JSONL blocks (>II size, count header)
+    index.sqlite             entity_events  (entity_type, entity_id, created_at) -> action,
+                                            user, metadata, block position
+                             activity       month × user × action × entity_type counts
+                             blocks         segment block offsets and time bounds
+
+Point-in-time state is the lifecycle (create/update/delete) plus the metadata
+of every event up to X merged in order. `lead.bulk_delete` rows carry a comma
+separated entity_id and are indexed once per lead.
+
+Priority changes never reach audit_logs; leads only keep the current priority,
+priority_changed_at and an undated priority_previous_values array. With
+--leads each run records a synthetic `lead.priority` event per lead at its
+priority_changed_at, so the index accumulates dated priority history from the
+first run on (earlier values stay undated in `previous`).
+
+Once events are in a segment, --prune-older-than-days deletes them from
+audit_logs (opt-in; the segment holds the raw rows).
+
+Usage:
+    python scripts/audit_index.py ingest                        # from DATABASE_URL
+    python scripts/audit_index.py ingest --source audit.jsonl
+    python scripts/audit_index.py ingest --leads db              # also record priority changes
+    python scripts/audit_index.py history lead <id> --at 2026-03-01
+    python scripts/audit_index.py activity 2026-10 [--user <uuid>]
+    python scripts/audit_index.py raw <event_id>
+"""
+import argparse
+import json
+import os
+import sqlite3
+import struct
+import sys
+import zlib
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+
+from pg_local import copy_block, copy_out, psql_stream
+from snapshots import db_rows, read_rows
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+INDEX_DIR = os.path.join(ROOT, '.cache', 'audit-index')
+
+COLUMNS = ['id', 'user_id', 'action', 'entity_type', 'entity_id', 'metadata', 'created_at']
+UTC_TS = "to_char({0} AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS.US\"Z\"')"
+OVERLAP = timedelta(minutes=5)  # rows committed late with an earlier created_at
+BLOCK_EVENTS = 1024
+BLOCK_HEADER = struct.Struct('>II')
+LIFECYCLE = {'create': 'active', 'update': 'active', 'deactivate': 'inactive',
+             'delete': 'deleted', 'bulk_delete': 'deleted', 'approve': 'approved', 'decline': 'declined'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blocks (
+    month TEXT, offset INTEGER, size INTEGER, count INTEGER, min_at TEXT, max_at TEXT,
+    PRIMARY KEY (month, offset));
+CREATE TABLE IF NOT EXISTS entity_events (
+    event_id TEXT, entity_type TEXT, entity_id TEXT, created_at TEXT, action TEXT, user_id TEXT,
+    metadata TEXT, month TEXT, block INTEGER, pos INTEGER,
+    PRIMARY KEY (event_id, entity_id));
+CREATE INDEX IF NOT EXISTS entity_events_entity ON entity_events (entity_type, entity_id, created_at);
+CREATE INDEX IF NOT EXISTS entity_events_event ON entity_events (event_id);
+CREATE TABLE IF NOT EXISTS activity (
+    month TEXT, user_id TEXT, action TEXT, entity_type TEXT, events INTEGER, entities INTEGER,
+    PRIMARY KEY (month, user_id, action, entity_type));
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def entity_ids(event):
+    raw = event.get('entity_id') or ''
+    if event['action'].endswith('bulk_delete'):
+        return [i.strip() for i in raw.split(',') if i.strip()] or [raw]
+    return [raw]
+
+
+def decode_event(row):
+    event = {c: row.get(c) for c in COLUMNS}
+    if isinstance(event['metadata'], str):
+        event['metadata'] = json.loads(event['metadata'])
+    return event
+
+
+class AuditIndex:
+    def __init__(self, root=INDEX_DIR):
+        self.root = root
+        self.seg_dir = os.path.join(root, 'segments')
+        os.makedirs(self.seg_dir, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, 'index.sqlite'))
+        self.db.executescript(SCHEMA)
+
+    @property
+    def watermark(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'watermark'").fetchone()
+        return row and row[0]
+
+    def seg_path(self, month):
+        return os.path.join(self.seg_dir, month + '.seg')
+
+    def append_block(self, month, events):
+        path = self.seg_path(month)
+        row = self.db.execute('SELECT max(offset + size) FROM blocks WHERE month = ?', (month,)).fetchone()
+        end = row[0] or 0
+        data = zlib.compress(''.join(json.dumps(e, separators=(',', ':')) + '\n' for e in events).encode(), 9)
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.truncate(end)  # a block that never made it into the index
+            f.seek(end)
+            f.write(BLOCK_HEADER.pack(len(data), len(events)) + data)
+            f.flush()
+            os.fsync(f.fileno())
+        stamps = [e['created_at'] for e in events]
+        self.db.execute('INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?)',
+                        (month, end, BLOCK_HEADER.size + len(data), len(events), min(stamps), max(stamps)))
+        return end
+
+    def read_block(self, month, offset):
+        with open(self.seg_path(month), 'rb') as f:
+            f.seek(offset)
+            size, _ = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+            return [json.loads(line) for line in zlib.decompress(f.read(size)).decode().splitlines()]
+
+    def ingest(self, events, advance=True):
+        """Index events arriving in created_at order; ids seen before are skipped."""
+        n = 0
+        high = self.watermark
+        for month, group in groupby(events, key=lambda e: e['created_at'][:7]):
+            pending = []
+            for event in group:
+                if self.db.execute('SELECT 1 FROM entity_events WHERE event_id = ? LIMIT 1',
+                                   (event['id'],)).fetchone():
+                    continue
+                pending.append(event)
+                if advance and (high is None or event['created_at'] > high):
+                    high = event['created_at']
+                if len(pending) == BLOCK_EVENTS:
+                    self.flush(month, pending)
+                    n += len(pending)
+                    pending = []
+            if pending:
+                self.flush(month, pending)
+                n += len(pending)
+            # commit per month: segment bytes are on disk before the index points at them
+            if high:
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('watermark', ?)", (high,))
+            self.db.commit()
+        return n
+
+    def flush(self, month, events):
+        offset = self.append_block(month, events)
+        rows = []
+        activity = {}
+        for pos, e in enumerate(events):
+            ids = entity_ids(e)
+            meta = json.dumps(e['metadata']) if e['metadata'] is not None else None
+            for entity_id in ids:
+                rows.append((e['id'], e['entity_type'], entity_id, e['created_at'], e['action'],
+                             e['user_id'], meta, month, offset, pos))
+            key = (month, e['user_id'] or '', e['action'], e['entity_type'])
+            acc = activity.setdefault(key, [0, 0])
+            acc[0] += 1
+            acc[1] += len(ids)
+        self.db.executemany('INSERT OR IGNORE INTO entity_events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        self.db.executemany(
+            'INSERT INTO activity VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (month, user_id, action, entity_type) '
+            'DO UPDATE SET events = events + excluded.events, entities = entities + excluded.entities',
+            [k + tuple(v) for k, v in activity.items()])
+
+    def history(self, entity_type, entity_id, at=None):
+        query = ('SELECT created_at, action, user_id, metadata, event_id FROM entity_events '
+                 'WHERE entity_type = ? AND entity_id = ?')
+        params = [entity_type, entity_id]
+        if at:
+            query += ' AND created_at <= ?'
+            params.append(at if len(at) > 10 else at + 'T23:59:59.999999Z')
+        return self.db.execute(query + ' ORDER BY created_at, event_id', params).fetchall()
+
+    def state_at(self, entity_type, entity_id, at):
+        state = {'status': None, 'fields': {}, 'last_changed_at': None, 'last_changed_by': None, 'events': 0}
+        for created_at, action, user_id, metadata, _ in self.history(entity_type, entity_id, at):
+            verb = action.split('.', 1)[-1]
+            state['status'] = LIFECYCLE.get(verb, state['status'])
+            if metadata and verb != 'bulk_delete':  # {count} describes the batch, not the entity
+                state['fields'].update(json.loads(metadata))
+            state['last_changed_at'], state['last_changed_by'] = created_at, user_id
+            state['events'] += 1
+        return state
+
+    def activity(self, month, user_id=None):
+        query = 'SELECT user_id, action, entity_type, events, entities FROM activity WHERE month = ?'
+        params = [month]
+        if user_id:
+            query += ' AND user_id = ?'
+            params.append(user_id)
+        return self.db.execute(query + ' ORDER BY user_id, action', params).fetchall()
+
+    def raw(self, event_id):
+        row = self.db.execute('SELECT month, block, pos FROM entity_events WHERE event_id = ? LIMIT 1',
+                              (event_id,)).fetchone()
+        return self.read_block(row[0], row[1])[row[2]] if row else None
+
+    def archived_ids(self, before):
+        return [r[0] for r in self.db.execute(
+            "SELECT DISTINCT event_id FROM entity_events WHERE created_at < ? AND action != 'lead.priority'",
+            (before,))]
+
+
+def source_events(source, watermark):
+    since = None
+    if watermark:
+        since = (datetime.fromisoformat(watermark.replace('Z', '+00:00')) - OVERLAP).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    if source == 'db':
+        cols = [UTC_TS.format(c) + f' AS {c}' if c == 'created_at' else c for c in COLUMNS]
+        query = f'SELECT {", ".join(cols)} FROM public.audit_logs'
+        if since:
+            query += f" WHERE created_at >= '{since}'"
+        query += ' ORDER BY created_at, id'
+        rows = (dict(zip(COLUMNS, values)) for values in copy_out(query))
+    else:
+        rows = sorted((r for r in read_rows(source) if not since or r['created_at'] >= since),
+                      key=lambda r: (r['created_at'], r['id']))
+    return (decode_event(r) for r in rows)
+
+
+def priority_events(source):
+    """One synthetic lead.priority event per lead, keyed by its last change time."""
+    cols = ['id', 'priority', 'priority_changed_at', 'priority_previous_values']
+    if source == 'db':
+        query = ('SELECT id, priority, ' + UTC_TS.format('priority_changed_at') +
+                 ' AS priority_changed_at, priority_previous_values FROM public.leads '
+                 'WHERE priority_changed_at IS NOT NULL')
+        rows = db_rows(f'({query}) AS l', cols)
+    else:
+        rows = (r for r in read_rows(source) if r.get('priority_changed_at'))
+    events = []
+    for r in rows:
+        previous = r.get('priority_previous_values') or []
+        if isinstance(previous, str):
+            previous = [v.strip('"') for v in previous.strip('{}').split(',') if v]
+        events.append({'id': f'priority:{r["id"]}:{r["priority_changed_at"]}', 'user_id': None,
+                       'action': 'lead.priority', 'entity_type': 'lead', 'entity_id': r['id'],
+                       'metadata': {'priority': r.get('priority'), 'previous': previous},
+                       'created_at': r['priority_changed_at']})
+    return sorted(events, key=lambda e: (e['created_at'], e['id']))
+
+
+def prune_script(ids):
+    yield 'BEGIN;\nCREATE TEMP TABLE audit_archived (id uuid PRIMARY KEY) ON COMMIT DROP;\n'
+    yield from copy_block('audit_archived', ['id'], ([i] for i in ids))
+    yield 'DELETE FROM public.audit_logs a USING audit_archived x WHERE a.id = x.id;\nCOMMIT;\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['ingest', 'history', 'activity', 'raw'])
+    parser.add_argument('args', nargs='*')
+    parser.add_argument('--index-dir', default=INDEX_DIR)
+    parser.add_argument('--source', default='db', help="'db' or an audit_logs export")
+    parser.add_argument('--leads', help="'db' or a leads export to record priority changes from")
+    parser.add_argument('--at', help='reconstruct state as of this date/time')
+    parser.add_argument('--user')
+    parser.add_argument('--prune-older-than-days', type=int,
+                        help='delete indexed events older than this from audit_logs')
+    args = parser.parse_intermixed_args()
+
+    index = AuditIndex(args.index_dir)
+    if args.command == 'ingest':
+        n = index.ingest(source_events(args.source, index.watermark))
+        print(f'{n} events indexed; watermark {index.watermark}', file=sys.stderr)
+        if args.leads:
+            n = index.ingest(priority_events(args.leads), advance=False)
+            print(f'{n} priority changes recorded', file=sys.stderr)
+        if args.prune_older_than_days is not None and args.source == 'db':
+            before = (datetime.now(timezone.utc) - timedelta(days=args.prune_older_than_days)).isoformat()
+            ids = index.archived_ids(before)
+            if ids:
+                psql_stream(prune_script(ids))
+            print(f'{len(ids)} events older than {before[:10]} pruned from audit_logs', file=sys.stderr)
+    elif args.command == 'history':
+        entity_type, entity_id = args.args
+        if args.at:
+            print(json.dumps(index.state_at(entity_type, entity_id, args.at), indent=2))
+        else:
+            for created_at, action, user_id, metadata, event_id in index.history(entity_type, entity_id):
+                print(f'{created_at}\t{action}\t{user_id or "-"}\t{metadata or ""}')
+    elif args.command == 'activity':
+        for user_id, action, entity_type, events, entities in index.activity(args.args[0], args.user):
+            print(f'{user_id or "-"}\t{action}\t{entity_type}\t{events} events\t{entities} entities')
+    else:
+        event = index.raw(args.args[0])
+        if event is None:
+            sys.exit(f'{args.args[0]} is not indexed')
+        print(json.dumps(event))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Bootstrap a scratch Postgres database from supabase/migrations, with snapshots.
+
+Migrations are replayed in canonical order (byte-wise filename order, which is
+what the Supabase CLI uses, so `0091_program_offerings.sql` lands before
+`009_chat_channels.sql` and `20260526133800_...` before `20260526_...`).
+
+Every migration extends a chained fingerprint: sha256(previous + name + sha256(body)).
+After a run the database is dumped to `.cache/db-snapshots/<fingerprint>.dump`.
+The next run restores the longest cached prefix and only applies the files
+after it, so adding a migration replays one file, while editing an old one
+falls back to the last snapshot before the edit.
+
+A few old migrations (KNOWN_FAILING) cannot apply cleanly to a fresh database;
+they run past their failing statements with a warning per error, every other
+migration stops the bootstrap on its first error.
+
+Usage:
+    python scripts/bootstrap_local_db.py            # restore/apply, print URL
+    python scripts/bootstrap_local_db.py --order    # show order + fingerprints
+    python scripts/bootstrap_local_db.py --rebuild  # ignore snapshots
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from pg_local import SCRATCH_DB, SUPABASE_SHIM_SQL, ROLES_SHIM_SQL, psql, psql_errors, recreate_database
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+MIGRATIONS_DIR = os.path.join(ROOT, 'supabase', 'migrations')
+CACHE_DIR = os.path.join(ROOT, '.cache', 'db-snapshots')
+MANIFEST = 'manifest.json'
+
+VERSION_RE = re.compile(r'^(\d+)_')
+# Migrations that fail on a fresh database: they reference objects production
+# got by hand (cohort_memberships, session_attendance, platform_settings, enum
+# values) or use syntax Postgres rejects (CREATE POLICY IF NOT EXISTS). They are
+# replayed past their failing statements, errors printed, so later files apply.
+KNOWN_FAILING = {
+    '002_fix_rls_policies.sql',
+    '009_chat_channels.sql',
+    '024_admin_rls_crud_policies.sql',
+    '039_fix_cohort_delete_constraint.sql',
+    '047_fix_assignment_submission_format.sql',
+    '059_content_aggregator.sql',
+    '062_form_submissions.sql',
+}
+
+
+def migration_order(migrations_dir=MIGRATIONS_DIR):
+    """Return migration filenames in the order the Supabase CLI applies them."""
+    names = [n for n in os.listdir(migrations_dir) if n.endswith('.sql')]
+    return sorted(names, key=lambda n: n.encode())
+
+
+def duplicate_versions(names):
+    seen = {}
+    for name in names:
+        m = VERSION_RE.match(name)
+        if m:
+            seen.setdefault(m.group(1), []).append(name)
+    return {v: ns for v, ns in seen.items() if len(ns) > 1}
+
+
+def fingerprint_chain(names, migrations_dir=MIGRATIONS_DIR):
+    """Return [(name, chained fingerprint)] for each migration prefix."""
+    chain = []
+    prev = hashlib.sha256(SUPABASE_SHIM_SQL.encode()).hexdigest()
+    for name in names:
+        with open(os.path.join(migrations_dir, name), 'rb') as f:
+            body = hashlib.sha256(f.read()).hexdigest()
+        prev = hashlib.sha256(f'{prev}\n{name}\n{body}'.encode()).hexdigest()
+        chain.append((name, prev))
+    return chain
+
+
+def load_manifest(cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = os.path.join(cache_dir, MANIFEST + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(cache_dir, MANIFEST))
+
+
+def best_snapshot(chain, manifest, cache_dir=CACHE_DIR):
+    """Index of the longest prefix with a snapshot on disk, or -1."""
+    for i in range(len(chain) - 1, -1, -1):
+        fp = chain[i][1]
+        if fp in manifest and os.path.exists(os.path.join(cache_dir, fp + '.dump')):
+            return i
+    return -1
+
+
+def restore_snapshot(fp, url, cache_dir=CACHE_DIR):
+    psql(ROLES_SHIM_SQL, url)
+    subprocess.run(
+        ['pg_restore', '--no-owner', '--jobs', str(os.cpu_count() or 2),
+         '--dbname', url, os.path.join(cache_dir, fp + '.dump')],
+        check=True,
+    )
+
+
+def dump_snapshot(fp, url, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, fp + '.dump')
+    subprocess.run(['pg_dump', '--format=custom', '--no-owner', '--file', path + '.tmp', url], check=True)
+    os.replace(path + '.tmp', path)
+
+
+def apply_migration(name, url, migrations_dir=MIGRATIONS_DIR):
+    with open(os.path.join(migrations_dir, name)) as f:
+        sql = f.read()
+    if name in KNOWN_FAILING:
+        for error in psql_errors(sql, url):
+            print(f'warning: {name}: {error.split("ERROR:", 1)[1].strip()}', file=sys.stderr)
+        return
+    try:
+        psql(sql, url)
+    except RuntimeError as e:
+        raise RuntimeError(f'{name}: {e}') from None
+
+
+def bootstrap(dbname=SCRATCH_DB, rebuild=False, keep=5):
+    names = migration_order()
+    chain = fingerprint_chain(names)
+    manifest = load_manifest()
+    start = -1 if rebuild else best_snapshot(chain, manifest)
+
+    url = recreate_database(dbname)
+    t0 = time.time()
+    if start >= 0:
+        restore_snapshot(chain[start][1], url)
+        print(f'Restored snapshot after {chain[start][0]} ({start + 1} migrations) in {time.time() - t0:.1f}s')
+    else:
+        psql(SUPABASE_SHIM_SQL, url)
+
+    pending = names[start + 1:]
+    for name in pending:
+        apply_migration(name, url)
+    if pending:
+        print(f'Applied {len(pending)} migration(s) in {time.time() - t0:.1f}s')
+        fp = chain[-1][1]
+        dump_snapshot(fp, url)
+        manifest[fp] = {'last': names[-1], 'count': len(names), 'created_at': int(time.time())}
+        prune(manifest, keep)
+        save_manifest(manifest)
+    return url
+
+
+def prune(manifest, keep, cache_dir=CACHE_DIR):
+    """Keep the newest `keep` snapshots."""
+    ordered = sorted(manifest, key=lambda fp: manifest[fp]['created_at'], reverse=True)
+    for fp in ordered[keep:]:
+        del manifest[fp]
+        path = os.path.join(cache_dir, fp + '.dump')
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=SCRATCH_DB, help='scratch database name')
+    parser.add_argument('--order', action='store_true', help='print migration order and exit')
+    parser.add_argument('--rebuild', action='store_true', help='ignore cached snapshots')
+    parser.add_argument('--keep', type=int, default=5, help='snapshots to keep')
+    args = parser.parse_args()
+
+    if args.order:
+        names = migration_order()
+        manifest = load_manifest()
+        for name, fp in fingerprint_chain(names):
+            mark = '*' if fp in manifest else ' '
+            print(f'{mark} {fp[:12]}  {name}')
+        for version, dupes in duplicate_versions(names).items():
+            print(f'warning: version {version} shared by {", ".join(dupes)}', file=sys.stderr)
+        return
+
+    print(bootstrap(args.db, rebuild=args.rebuild, keep=args.keep))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""Resolve a campaign audience in bulk and emit email_queue rows via COPY.
+
+This is the batch counterpart of EmailHubPage's resolveRecipients + the
+per-recipient buildCampaignEmail loop. Instead of re-rendering the HTML for
+every recipient, the template is rendered once and split on `{{name}}`; each
+recipient only costs a string join. Recipients are deduped by normalized email
+and `send_after` is spread into throttled windows so the queue worker drains
+the campaign at a fixed rate.
+
+Audience keys match the UI (all_members, executives, leads, hot_leads,
+active_leads, lava_leads) plus `priority:<P>`, `offering:<type>`,
+`cohort:<cohort_id>` and `custom:<a@x.com,b@y.com>`.
+
+Usage:
+    python scripts/campaign_audience.py template.json \\
+        --audience hot_leads --audience cohort:<uuid> \\
+        --leads "src/assets/All Leads Master Sheet.csv" --users users.jsonl \\
+        --memberships memberships.csv --per-window 500 --window-minutes 10 > campaign.sql
+"""
+import argparse
+import json
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pg_local import copy_block, psql_stream, sql_literal
+from snapshots import normalize_email, read_rows
+
+# ── Brand tokens (src/lib/buildCampaignEmail.ts) ─────────────────────────────
+BRAND_BG = '#0B0B0B'
+CARD_BG = '#111111'
+BORDER = '#1F2937'
+LIME = '#D0FF71'
+LIME_TEXT = '#0B0B0B'
+GRAY_300 = '#D1D5DB'
+GRAY_400 = '#9CA3AF'
+WHITE = '#FFFFFF'
+
+NAME_PLACEHOLDER = '{{name}}'
+
+LEAD_PRIORITY_AUDIENCES = {'hot_leads': 'HOT', 'active_leads': 'ACTIVE', 'lava_leads': 'LAVA'}
+MEMBER_ROLES = {'all_members': ('participant', 'executive'), 'executives': ('executive',)}
+
+
+# ── Rendering (Python port of buildCampaignEmail.ts, kept byte-identical) ────
+
+def wrap_html(subject, body_rows):
+    return f'''<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="utf-8" />
+  <meta name="viewport" content="width=device-width,initial-scale=1" />
+  <title>{subject}</title>
+  <style>body,table,td{{font-family:Arial,sans-serif!important;}}</style>
+</head>
+<body style="margin:0;padding:0;background:{BRAND_BG};">
+  <table role="presentation" width="100%" cellpadding="0" cellspacing="0" style="background:{BRAND_BG};">
+    <tr>
+      <td align="center" style="padding:32px 16px;">
+        <table role="presentation" width="600" cellpadding="0" cellspacing="0" style="max-width:600px;width:100%;">
+          <tr>
+            <td style="background:{CARD_BG};border:1px solid {BORDER};border-radius:16px;">
+              <table width="100%" cellpadding="0" cellspacing="0">
+
+                <!-- Logo / brand -->
+                <tr>
+                  <td style="padding:24px 24px 0 24px;">
+                    <div style="font-family:Arial,sans-serif;font-size:20px;font-weight:900;color:{WHITE};letter-spacing:-0.5px;">
+                      Zkandar <span style="color:{LIME};">AI</span>
+                    </div>
+                  </td>
+                </tr>
+
+                {body_rows}
+
+                <!-- Footer -->
+                <tr>
+                  <td style="padding:0 24px 24px 24px;border-top:1px solid {BORDER};margin-top:24px;">
+                    <div style="font-family:Arial,sans-serif;font-size:11px;color:{GRAY_400};margin-top:20px;line-height:1.6;">
+                      You received this email because you are connected with Zkandar AI.
+                      If you believe this was sent in error, please contact admin@zkandar.com.
+                    </div>
+                  </td>
+                </tr>
+
+              </table>
+            </td>
+          </tr>
+        </table>
+      </td>
+    </tr>
+  </table>
+</body>
+</html>'''
+
+
+def render_heading(text):
+    return f'''<tr>
+  <td style="padding:20px 24px 8px 24px;">
+    <div style="font-family:Arial,sans-serif;font-size:24px;font-weight:700;color:{WHITE};line-height:1.3;">{text}</div>
+  </td>
+</tr>'''
+
+
+def render_paragraph(text):
+    return f'''<tr>
+  <td style="padding:8px 24px;">
+    <div style="font-family:Arial,sans-serif;font-size:14px;color:{GRAY_300};line-height:1.7;">{text}</div>
+  </td>
+</tr>'''
+
+
+def render_bullet_list(items):
+    lis = ''.join(
+        f'<li style="font-family:Arial,sans-serif;font-size:14px;color:{GRAY_300};line-height:1.7;margin-bottom:6px;">{item}</li>'
+        for item in items
+    )
+    return f'''<tr>
+  <td style="padding:8px 24px 8px 40px;">
+    <ul style="margin:0;padding-left:18px;">{lis}</ul>
+  </td>
+</tr>'''
+
+
+def render_image(url, alt):
+    return f'''<tr>
+  <td style="padding:12px 24px;">
+    <img src="{url}" alt="{alt}" style="width:100%;max-width:552px;height:auto;border-radius:12px;display:block;" />
+  </td>
+</tr>'''
+
+
+def render_divider():
+    return f'''<tr>
+  <td style="padding:12px 24px;">
+    <div style="border-top:1px solid {BORDER};"></div>
+  </td>
+</tr>'''
+
+
+def render_spacer(height):
+    return f'''<tr>
+  <td style="padding:0;height:{height}px;line-height:{height}px;font-size:1px;">&nbsp;</td>
+</tr>'''
+
+
+def render_button(label, url):
+    return f'''<tr>
+  <td style="padding:12px 24px;">
+    <table cellpadding="0" cellspacing="0">
+      <tr>
+        <td bgcolor="{LIME}" style="border-radius:10px;">
+          <a href="{url}" style="display:inline-block;padding:14px 24px;font-family:Arial,sans-serif;font-size:14px;font-weight:700;color:{LIME_TEXT};text-decoration:none;border-radius:10px;">
+            {label}
+          </a>
+        </td>
+      </tr>
+    </table>
+  </td>
+</tr>'''
+
+
+def render_headline_row(headline):
+    return f'''<tr>
+  <td style="padding:20px 24px 12px 24px;border-bottom:1px solid {BORDER};">
+    <div style="font-family:Arial,sans-serif;font-size:18px;font-weight:700;color:{WHITE};">{headline}</div>
+  </td>
+</tr>'''
+
+
+def render_block(block):
+    kind = block.get('type')
+    if kind == 'heading':
+        return render_heading(block['text'])
+    if kind == 'paragraph':
+        return render_paragraph(block['text'])
+    if kind == 'bullet_list':
+        return render_bullet_list(block['items'])
+    if kind == 'image':
+        return render_image(block['url'], block.get('alt') or '')
+    if kind == 'divider':
+        return render_divider()
+    if kind == 'spacer':
+        return render_spacer(block['height'])
+    if kind == 'button':
+        return render_button(block['label'], block['url'])
+    return ''
+
+
+def render_shell(template):
+    """Render the campaign once and split it on {{name}} for cheap substitution."""
+    rows = []
+    if template.get('headline'):
+        rows.append(render_headline_row(template['headline']))
+    for block in template.get('blocks') or []:
+        rows.append(render_block(block))
+    if template.get('cta_text') and template.get('cta_url'):
+        rows.append(render_button(template['cta_text'], template['cta_url']))
+    return wrap_html(template['subject'], '\n'.join(rows)).split(NAME_PLACEHOLDER)
+
+
+def personalize(parts, name):
+    # EmailHubPage greets by first name
+    return (name.split(' ')[0] if name else '').join(parts)
+
+
+# ── Audience resolution ──────────────────────────────────────────────────────
+
+class AudienceIndex:
+    """Prebuilt lookups over lead/user snapshots: priority, offering, role, cohort."""
+
+    def __init__(self, leads=(), users=(), memberships=()):
+        self.people = []           # (email, name) in load order
+        self.by_priority = {}
+        self.by_offering = {}
+        self.by_role = {}
+        self.by_cohort = {}
+        self.all_leads = []
+        user_pos = {}
+
+        for user in users:
+            email = normalize_email(user.get('email'))
+            if not email:
+                continue
+            pos = self.add(email, user.get('full_name'))
+            user_pos[user.get('id')] = pos
+            self.by_role.setdefault(user.get('role'), []).append(pos)
+
+        for lead in leads:
+            email = normalize_email(lead.get('email'))
+            if not email:
+                continue
+            pos = self.add(email, lead.get('full_name'))
+            self.all_leads.append(pos)
+            self.by_priority.setdefault((lead.get('priority') or '').strip().upper(), []).append(pos)
+            self.by_offering.setdefault((lead.get('offering_type') or '').strip().lower(), []).append(pos)
+
+        for m in memberships:
+            pos = user_pos.get(m.get('user_id'))
+            if pos is not None:
+                self.by_cohort.setdefault(m.get('cohort_id'), []).append(pos)
+
+    def add(self, email, name):
+        self.people.append((email, (name or '').strip()))
+        return len(self.people) - 1
+
+    def select(self, key):
+        if key in MEMBER_ROLES:
+            return [p for role in MEMBER_ROLES[key] for p in self.by_role.get(role, ())]
+        if key == 'leads':
+            return self.all_leads
+        if key in LEAD_PRIORITY_AUDIENCES:
+            return self.by_priority.get(LEAD_PRIORITY_AUDIENCES[key], [])
+        kind, _, value = key.partition(':')
+        if kind == 'priority':
+            return self.by_priority.get(value.strip().upper(), [])
+        if kind == 'offering':
+            return self.by_offering.get(value.strip().lower(), [])
+        if kind == 'cohort':
+            return self.by_cohort.get(value, [])
+        if kind == 'custom':
+            return [self.add(e, '') for e in map(normalize_email, value.replace(';', ',').split(',')) if e]
+        raise ValueError(f'Unknown audience: {key}')
+
+    def resolve(self, keys):
+        """Union of the selected audiences, deduped by email (first non-empty name wins)."""
+        recipients = {}
+        for key in keys:
+            for pos in self.select(key):
+                email, name = self.people[pos]
+                if not recipients.get(email):
+                    recipients[email] = name
+        return list(recipients.items())
+
+
+# ── Output ───────────────────────────────────────────────────────────────────
+
+def send_schedule(count, start, per_window, window):
+    """send_after for the k-th recipient: `per_window` recipients per window."""
+    for k in range(count):
+        yield start + window * (k // per_window) if per_window else start
+
+
+def campaign_script(template, audience_keys, recipients, start, per_window, window, created_by=None):
+    """Yield one transaction: campaign row + COPY of recipients and queue rows."""
+    campaign_id = str(uuid.uuid4())
+    parts = render_shell(template)
+    scheduled = start > datetime.now(timezone.utc)
+    preview = personalize(parts, 'Preview')
+
+    yield 'BEGIN;\n'
+    yield ('INSERT INTO public.email_campaigns (id, subject, headline, body, html_preview, audience, '
+           'recipient_count, status, sent_at, scheduled_for, created_by) VALUES ('
+           + ', '.join([
+               sql_literal(campaign_id), sql_literal(template['subject']), sql_literal(template.get('headline')),
+               sql_literal(json.dumps(template.get('blocks') or [], separators=(',', ':'))), sql_literal(preview),
+               sql_literal(', '.join(audience_keys)), str(len(recipients)),
+               sql_literal('scheduled' if scheduled else 'sent'),
+               'NULL' if scheduled else 'NOW()',
+               sql_literal(start.isoformat()) if scheduled else 'NULL',
+               sql_literal(created_by),
+           ]) + ');\n')
+    yield from copy_block(
+        'public.email_campaign_recipients', ['campaign_id', 'email', 'name', 'status'],
+        ((campaign_id, email, name or None, 'queued') for email, name in recipients),
+    )
+    times = send_schedule(len(recipients), start, per_window, window)
+    yield from copy_block(
+        'public.email_queue',
+        ['campaign_id', 'recipient_email', 'recipient_name', 'subject', 'html_body', 'status', 'attempts', 'send_after'],
+        ((campaign_id, email, name or None, template['subject'], personalize(parts, name), 'pending', 0, when.isoformat())
+         for (email, name), when in zip(recipients, times)),
+    )
+    yield 'COMMIT;\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('template', help='JSON with subject, headline, blocks, cta_text, cta_url')
+    parser.add_argument('--audience', action='append', required=True)
+    parser.add_argument('--leads', help='leads snapshot (csv/json/jsonl or db:public.leads)')
+    parser.add_argument('--users', help='users snapshot')
+    parser.add_argument('--memberships', help='cohort_memberships snapshot')
+    parser.add_argument('--start', help='ISO time of the first window (default: now)')
+    parser.add_argument('--per-window', type=int, default=0, help='recipients per window (0 = no throttling)')
+    parser.add_argument('--window-minutes', type=float, default=10)
+    parser.add_argument('--created-by', help='auth user id recorded on the campaign')
+    parser.add_argument('--load', action='store_true', help='stream straight into DATABASE_URL')
+    args = parser.parse_args()
+
+    with open(args.template) as f:
+        template = json.load(f)
+    if isinstance(template.get('blocks'), str):
+        template['blocks'] = json.loads(template['blocks'])
+
+    index = AudienceIndex(
+        leads=read_rows(args.leads) if args.leads else (),
+        users=read_rows(args.users) if args.users else (),
+        memberships=read_rows(args.memberships) if args.memberships else (),
+    )
+    recipients = index.resolve(args.audience)
+    if not recipients:
+        sys.exit('No recipients found')
+
+    start = datetime.fromisoformat(args.start) if args.start else datetime.now(timezone.utc)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    script = campaign_script(template, args.audience, recipients, start, args.per_window,
+                             timedelta(minutes=args.window_minutes), args.created_by)
+    if args.load:
+        psql_stream(script)
+    else:
+        sys.stdout.writelines(script)
+    print(f'{len(recipients)} recipients queued', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""Archive old chat_messages into compressed per-room, per-month segments.
+
+chat_messages only has (room_id, created_at) for history reads and keeps
+growing. This moves messages older than a cutoff out of the table into
+append-only segment files, one per room and month:
+
+    <archive>/<room_id>/<YYYY-MM>.seg   blocks: >II (compressed size, count) + zlib(JSONL)
+    <archive>/<room_id>/<YYYY-MM>.idx   one JSON line per block: offset, size,
+                                        count, min/max created_at, message ids
+    <archive>/ids/<xx>.tsv              message id -> room, month (sharded by id prefix)
+
+Rows are archived whole (reactions, metadata, file/voice columns, parent_id,
+forwarded_from), so threads can be rebuilt from the archive. Messages that are
+pinned, or that a message still in the table replies to or forwards, stay hot,
+and so does everything up their threads: deleting them would null the reply's
+parent_id (ON DELETE SET NULL) or drop the pin (ON DELETE CASCADE).
+
+Segments are only ever appended to. A block whose index line never got written
+(crash mid-append) is truncated away on the next append.
+
+Usage:
+    python scripts/chat_archive.py archive --archive-dir /data/chat --older-than-days 180
+    python scripts/chat_archive.py archive --archive-dir /data/chat --source export.jsonl
+    python scripts/chat_archive.py get --archive-dir /data/chat <message_id>
+    python scripts/chat_archive.py scan --archive-dir /data/chat <room_id> --since 2025-01-01
+    python scripts/chat_archive.py verify --archive-dir /data/chat
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import zlib
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+
+from pg_local import copy_block, copy_out, psql, psql_stream
+from snapshots import json_rows
+
+COLUMNS = ['id', 'room_id', 'sender_id', 'body', 'message_type', 'file_url', 'file_name', 'file_type',
+           'file_size', 'voice_duration', 'parent_id', 'forwarded_from', 'is_edited', 'edited_at',
+           'reactions', 'metadata', 'created_at']
+JSON_COLUMNS = {'reactions', 'metadata'}
+BLOCK_MESSAGES = 512
+BLOCK_HEADER = struct.Struct('>II')
+
+UTC_TS = "to_char({0} AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS.US\"Z\"')"
+
+# messages that must stay because something staying points at them: pinned
+# messages, what recent messages reply to or forward, and so on up each thread
+KEPT = """WITH RECURSIVE kept(id) AS (
+        SELECT p.message_id FROM public.chat_pinned_messages p
+        UNION
+        SELECT v.id FROM public.chat_messages r
+        CROSS JOIN LATERAL (VALUES (r.parent_id), (r.forwarded_from)) v(id)
+        WHERE r.created_at >= '{cutoff}' AND (r.parent_id IS NOT NULL OR r.forwarded_from IS NOT NULL)
+        UNION
+        SELECT v.id FROM kept k JOIN public.chat_messages r ON r.id = k.id
+        CROSS JOIN LATERAL (VALUES (r.parent_id), (r.forwarded_from)) v(id)
+    )
+    SELECT id FROM kept WHERE id IS NOT NULL"""
+
+# a message may leave the table only if nothing that stays behind points at it
+ARCHIVABLE = "m.created_at < '{cutoff}' AND m.id NOT IN (" + KEPT + ')'
+
+
+def month_of(created_at):
+    return created_at[:7]
+
+
+def decode_row(row):
+    """Typed message dict from a COPY/JSON row."""
+    msg = {c: row.get(c) for c in COLUMNS}
+    for c in JSON_COLUMNS:
+        if isinstance(msg[c], str):
+            msg[c] = json.loads(msg[c])
+    if isinstance(msg['file_size'], str):
+        msg['file_size'] = int(msg['file_size'])
+    if isinstance(msg['is_edited'], str):
+        msg['is_edited'] = msg['is_edited'] in ('t', 'true')
+    return msg
+
+
+class Segment:
+    def __init__(self, root, room_id, month):
+        self.dir = os.path.join(root, room_id)
+        self.seg_path = os.path.join(self.dir, month + '.seg')
+        self.idx_path = os.path.join(self.dir, month + '.idx')
+
+    def blocks(self):
+        if not os.path.exists(self.idx_path):
+            return []
+        with open(self.idx_path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def read_block(self, f, entry):
+        f.seek(entry['offset'])
+        size, count = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+        lines = zlib.decompress(f.read(size)).decode().splitlines()
+        if count != entry['count'] or len(lines) != count:
+            raise ValueError(f'{self.seg_path}: block at {entry["offset"]} is corrupt')
+        return [json.loads(line) for line in lines]
+
+    def append(self, messages):
+        os.makedirs(self.dir, exist_ok=True)
+        blocks = self.blocks()
+        end = blocks[-1]['offset'] + blocks[-1]['size'] if blocks else 0
+        mode = 'r+b' if os.path.exists(self.seg_path) else 'wb'
+        with open(self.seg_path, mode) as seg, open(self.idx_path, 'a') as idx:
+            seg.truncate(end)  # drop a block whose index line was never written
+            seg.seek(end)
+            for i in range(0, len(messages), BLOCK_MESSAGES):
+                chunk = messages[i:i + BLOCK_MESSAGES]
+                data = zlib.compress(''.join(json.dumps(m, separators=(',', ':')) + '\n'
+                                             for m in chunk).encode(), 9)
+                seg.write(BLOCK_HEADER.pack(len(data), len(chunk)) + data)
+                seg.flush()
+                os.fsync(seg.fileno())
+                stamps = [m['created_at'] for m in chunk]
+                idx.write(json.dumps({'offset': end, 'size': BLOCK_HEADER.size + len(data), 'count': len(chunk),
+                                      'min': min(stamps), 'max': max(stamps),
+                                      'ids': [m['id'] for m in chunk]}, separators=(',', ':')) + '\n')
+                idx.flush()
+                end += BLOCK_HEADER.size + len(data)
+
+    def get(self, message_id):
+        for entry in self.blocks():
+            if message_id in entry['ids']:
+                with open(self.seg_path, 'rb') as f:
+                    return self.read_block(f, entry)[entry['ids'].index(message_id)]
+        return None
+
+    def scan(self, since=None, until=None):
+        with open(self.seg_path, 'rb') as f:
+            for entry in self.blocks():
+                if (since and entry['max'] < since) or (until and entry['min'] >= until):
+                    continue
+                for msg in self.read_block(f, entry):
+                    if (not since or msg['created_at'] >= since) and (not until or msg['created_at'] < until):
+                        yield msg
+
+
+class Archive:
+    def __init__(self, root):
+        self.root = root
+        self.ids_dir = os.path.join(root, 'ids')
+
+    def shard(self, message_id):
+        return os.path.join(self.ids_dir, message_id[:2] + '.tsv')
+
+    def locate(self, message_id):
+        path = self.shard(message_id)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            for line in f:
+                mid, room_id, month = line.rstrip('\n').split('\t')
+                if mid == message_id:
+                    return room_id, month
+        return None
+
+    def write(self, messages):
+        """Append messages sorted by (room_id, created_at) to their segments; skips archived ids."""
+        os.makedirs(self.ids_dir, exist_ok=True)
+        written = segments = 0
+        for (room_id, month), group in groupby(messages, key=lambda m: (m['room_id'], month_of(m['created_at']))):
+            segment = Segment(self.root, room_id, month)
+            known = {mid for entry in segment.blocks() for mid in entry['ids']}
+            msgs = [m for m in group if m['id'] not in known]
+            if not msgs:
+                continue
+            segment.append(msgs)
+            shards = {}
+            for m in msgs:
+                shards.setdefault(self.shard(m['id']), []).append(f'{m["id"]}\t{room_id}\t{month}\n')
+            # the id map is written last: an id listed here is always readable
+            for path, lines in shards.items():
+                with open(path, 'a') as f:
+                    f.writelines(lines)
+            written += len(msgs)
+            segments += 1
+        return written, segments
+
+    def get(self, message_id):
+        where = self.locate(message_id)
+        return Segment(self.root, *where).get(message_id) if where else None
+
+    def months(self, room_id):
+        room_dir = os.path.join(self.root, room_id)
+        if not os.path.isdir(room_dir):
+            return []
+        return sorted(f[:-4] for f in os.listdir(room_dir) if f.endswith('.seg'))
+
+    def scan(self, room_id, since=None, until=None):
+        for month in self.months(room_id):
+            if (since and month < since[:7]) or (until and month > until[:7]):
+                continue
+            yield from Segment(self.root, room_id, month).scan(since, until)
+
+    def verify(self):
+        rooms = blocks = messages = 0
+        for room_id in sorted(os.listdir(self.root)):
+            if room_id == 'ids':
+                continue
+            rooms += 1
+            for month in self.months(room_id):
+                seg = Segment(self.root, room_id, month)
+                with open(seg.seg_path, 'rb') as f:
+                    for entry in seg.blocks():
+                        msgs = seg.read_block(f, entry)
+                        if [m['id'] for m in msgs] != entry['ids']:
+                            raise ValueError(f'{seg.seg_path}: ids out of sync at {entry["offset"]}')
+                        blocks += 1
+                        messages += len(msgs)
+        return rooms, blocks, messages
+
+
+def export_query(cutoff):
+    cols = [UTC_TS.format('m.' + c) + f' AS {c}' if c in ('created_at', 'edited_at') else 'm.' + c
+            for c in COLUMNS]
+    return (f'SELECT {", ".join(cols)} FROM public.chat_messages m WHERE {ARCHIVABLE.format(cutoff=cutoff)} '
+            'ORDER BY m.room_id, m.created_at, m.id')
+
+
+def delete_script(ids, cutoff):
+    """Delete archived ids that are still archivable, in one statement."""
+    yield 'BEGIN;\nCREATE TEMP TABLE chat_archived (id uuid PRIMARY KEY) ON COMMIT DROP;\n'
+    yield from copy_block('chat_archived', ['id'], ([i] for i in ids))
+    yield (f'DELETE FROM public.chat_messages m USING chat_archived a '
+           f'WHERE m.id = a.id AND {ARCHIVABLE.format(cutoff=cutoff)};\n'
+           'COMMIT;\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['archive', 'get', 'scan', 'verify'])
+    parser.add_argument('target', nargs='?', help='message id for `get`, room id for `scan`')
+    parser.add_argument('--archive-dir', required=True)
+    parser.add_argument('--older-than-days', type=int, default=180)
+    parser.add_argument('--source', default='db', help="'db' or a JSON/JSONL export (nothing is deleted)")
+    parser.add_argument('--keep-hot', action='store_true', help='write segments but do not delete rows')
+    parser.add_argument('--vacuum', action='store_true', help='VACUUM ANALYZE chat_messages afterwards')
+    parser.add_argument('--since')
+    parser.add_argument('--until')
+    args = parser.parse_intermixed_args()
+
+    archive = Archive(args.archive_dir)
+    if args.command == 'get':
+        msg = archive.get(args.target)
+        if msg is None:
+            sys.exit(f'{args.target} is not archived')
+        print(json.dumps(msg, ensure_ascii=False))
+    elif args.command == 'scan':
+        for msg in archive.scan(args.target, args.since, args.until):
+            sys.stdout.write(json.dumps(msg, ensure_ascii=False) + '\n')
+    elif args.command == 'verify':
+        rooms, blocks, messages = archive.verify()
+        print(f'{rooms} rooms, {blocks} blocks, {messages} messages OK')
+    else:
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=args.older_than_days)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        if args.source == 'db':
+            rows = (dict(zip(COLUMNS, values)) for values in copy_out(export_query(cutoff)))
+        else:
+            rows = sorted((r for r in json_rows(args.source) if r['created_at'] < cutoff),
+                          key=lambda r: (r['room_id'], r['created_at'], r['id']))
+        ids = []
+
+        def tracked():
+            for row in rows:
+                ids.append(row['id'])
+                yield decode_row(row)
+
+        written, segments = archive.write(tracked())
+        print(f'{len(ids)} archivable messages before {cutoff}: {written} written to {segments} segments '
+              f'({len(ids) - written} already archived)', file=sys.stderr)
+        if args.source == 'db' and ids and not args.keep_hot:
+            psql_stream(delete_script(ids, cutoff))
+            print('Deleted archived rows from public.chat_messages', file=sys.stderr)
+            if args.vacuum:
+                psql('VACUUM (ANALYZE) public.chat_messages;')
+
+
+if __name__ == '__main__':
+    main()
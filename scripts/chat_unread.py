@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""Materialize per-(room, user) unread counts and per-room last messages.
+
+get_unread_counts() aggregates chat_messages against chat_read_receipts for
+every room a user is in, on every sidebar load. This job keeps the answer in
+chat_unread_counts / chat_room_last_message instead and only consumes what
+changed since its watermarks:
+
+  * new messages bump the counter of every other member who has not read
+    past them, and replace the room's last message;
+  * changed receipts recount that one (room, user) from a per-room tail of
+    recent message timestamps (messages newer than the oldest receipt in the
+    room); members without a receipt use room totals minus their own messages;
+  * membership is diffed in full (it is small), new pairs are counted the same way.
+
+A receipt older than the retained tail (rare: a new member with an old
+receipt) is resolved during the refresh: the messages between the receipt and
+the tail are counted in SQL, the tail itself from the state. Deleted messages (e.g. chat_archive.py) are not
+seen by the watermark; run with --rebuild after bulk deletes.
+
+State lives in --state-dir (default .cache/chat-unread):
+    state.json      watermarks, members, receipts, per-room totals and tails,
+                    counters and rooms changed since the last successful --load
+
+Usage:
+    python scripts/chat_unread.py --load            # incremental, upsert to DATABASE_URL
+    python scripts/chat_unread.py --rebuild --load  # from scratch
+    python scripts/chat_unread.py --verify          # diff against get_unread_counts semantics
+"""
+import argparse
+import bisect
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+from pg_local import copy_block, copy_out, psql_rows, psql_stream
+from snapshots import db_rows
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+STATE_DIR = os.path.join(ROOT, '.cache', 'chat-unread')
+
+UTC_TS = "to_char({0} AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS.US\"Z\"')"
+# re-read a little before the watermark to catch rows committed late
+OVERLAP = timedelta(minutes=5)
+PREVIEW_CHARS = 140
+COUNT_COLUMNS = ['room_id', 'user_id', 'unread_count', 'last_read_at']
+LAST_COLUMNS = ['room_id', 'message_id', 'sender_id', 'message_type', 'preview', 'created_at', 'message_count']
+
+
+def shift(ts, delta):
+    return (datetime.fromisoformat(ts.replace('Z', '+00:00')) + delta).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def preview(msg):
+    if msg['body']:
+        return ' '.join(msg['body'].split())[:PREVIEW_CHARS]
+    return {'file': '[file]', 'voice': '[voice note]'}.get(msg['message_type'], '')
+
+
+class Room:
+    def __init__(self, data=None):
+        data = data or {}
+        self.total = data.get('total', 0)
+        self.by_sender = data.get('by_sender', {})
+        self.tail_from = data.get('tail_from')       # tail holds every message newer than this
+        self.tail = data.get('tail', [])             # sorted [created_at, sender_id]
+        self.last = data.get('last')
+
+    def to_dict(self):
+        return {'total': self.total, 'by_sender': self.by_sender, 'tail_from': self.tail_from,
+                'tail': self.tail, 'last': self.last}
+
+    def add(self, msg):
+        self.total += 1
+        self.by_sender[msg['sender_id']] = self.by_sender.get(msg['sender_id'], 0) + 1
+        if self.tail_from is None or msg['created_at'] > self.tail_from:
+            bisect.insort(self.tail, [msg['created_at'], msg['sender_id']])
+        if self.last is None or msg['created_at'] >= self.last['created_at']:
+            self.last = {'id': msg['id'], 'sender_id': msg['sender_id'], 'message_type': msg['message_type'],
+                         'preview': preview(msg), 'created_at': msg['created_at']}
+
+    def unread(self, user_id, last_read_at):
+        """Unread count for a member, or None if the tail does not reach back far enough."""
+        if last_read_at is None:
+            return self.total - self.by_sender.get(user_id, 0)
+        if self.tail_from is not None and last_read_at < self.tail_from:
+            return None
+        start = bisect.bisect_right(self.tail, [last_read_at, '\uffff'])
+        return sum(1 for _, sender in self.tail[start:] if sender != user_id)
+
+    def prune(self, receipts):
+        if not receipts:
+            return
+        oldest = min(receipts)
+        if self.tail_from is None or oldest > self.tail_from:
+            self.tail = self.tail[bisect.bisect_right(self.tail, [oldest, '\uffff']):]
+            self.tail_from = oldest
+
+
+class UnreadState:
+    def __init__(self, state_dir=STATE_DIR):
+        self.state_dir = state_dir
+        self.rooms = {}
+        self.members = {}        # room -> set(user)
+        self.receipts = {}       # room -> {user: last_read_at}
+        self.counts = {}         # (room, user) -> unread
+        self.msg_watermark = None
+        self.receipt_watermark = None
+        self.recent_ids = {}     # message id -> created_at, inside the overlap window
+        self.touched = set()
+        self.touched_rooms = set()
+        self.recount = set()
+        self.removed = set()
+        self.load()
+
+    def load(self):
+        path = os.path.join(self.state_dir, 'state.json')
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            state = json.load(f)
+        self.rooms = {r: Room(d) for r, d in state['rooms'].items()}
+        self.members = {r: set(u) for r, u in state['members'].items()}
+        self.receipts = state['receipts']
+        self.counts = {tuple(k.split('/')): v for k, v in state['counts'].items()}
+        self.msg_watermark = state['msg_watermark']
+        self.receipt_watermark = state['receipt_watermark']
+        self.recent_ids = state['recent_ids']
+        # kept until a load succeeds, so a failed or skipped --load is retried next run
+        unloaded = state.get('unloaded', {})
+        self.touched = {tuple(k) for k in unloaded.get('counts', [])}
+        self.touched_rooms = set(unloaded.get('rooms', []))
+        self.removed = {tuple(k) for k in unloaded.get('removed', [])}
+
+    def save(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = os.path.join(self.state_dir, 'state.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'rooms': {r: room.to_dict() for r, room in self.rooms.items()},
+                       'members': {r: sorted(u) for r, u in self.members.items()},
+                       'receipts': self.receipts,
+                       'counts': {f'{r}/{u}': v for (r, u), v in self.counts.items()},
+                       'msg_watermark': self.msg_watermark, 'receipt_watermark': self.receipt_watermark,
+                       'recent_ids': self.recent_ids,
+                       'unloaded': {'counts': sorted(self.touched), 'rooms': sorted(self.touched_rooms),
+                                    'removed': sorted(self.removed)}}, f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+
+    def room(self, room_id):
+        room = self.rooms.get(room_id)
+        if room is None:
+            room = self.rooms[room_id] = Room()
+        return room
+
+    def set_count(self, room_id, user_id):
+        n = self.room(room_id).unread(user_id, self.receipts.get(room_id, {}).get(user_id))
+        key = (room_id, user_id)
+        if n is None:
+            self.recount.add(key)
+            n = self.counts.get(key, 0)
+        if self.counts.get(key) != n:
+            self.touched.add(key)
+        self.counts[key] = n
+
+    def sync_members(self, rows):
+        members = {}
+        for r in rows:
+            members.setdefault(r['room_id'], set()).add(r['user_id'])
+        for room_id in set(members) | set(self.members):
+            now, before = members.get(room_id, set()), self.members.get(room_id, set())
+            for user_id in before - now:
+                self.counts.pop((room_id, user_id), None)
+                self.removed.add((room_id, user_id))
+            self.members[room_id] = now
+            for user_id in now - before:
+                self.set_count(room_id, user_id)
+                self.touched.add((room_id, user_id))
+        self.members = {r: u for r, u in self.members.items() if u}
+
+    def fold_receipts(self, rows):
+        n = 0
+        for r in rows:
+            room_receipts = self.receipts.setdefault(r['room_id'], {})
+            if room_receipts.get(r['user_id']) == r['last_read_at']:
+                continue
+            room_receipts[r['user_id']] = r['last_read_at']
+            if r['user_id'] in self.members.get(r['room_id'], ()):
+                self.set_count(r['room_id'], r['user_id'])
+            if self.receipt_watermark is None or r['last_read_at'] > self.receipt_watermark:
+                self.receipt_watermark = r['last_read_at']
+            n += 1
+        return n
+
+    def fold_messages(self, rows):
+        n = 0
+        high = self.msg_watermark
+        for msg in rows:
+            if msg['id'] in self.recent_ids:
+                continue
+            self.recent_ids[msg['id']] = msg['created_at']
+            room = self.room(msg['room_id'])
+            room.add(msg)
+            self.touched_rooms.add(msg['room_id'])
+            receipts = self.receipts.get(msg['room_id'], {})
+            for user_id in self.members.get(msg['room_id'], ()):
+                if user_id == msg['sender_id']:
+                    continue
+                read = receipts.get(user_id)
+                if read is None or msg['created_at'] > read:
+                    key = (msg['room_id'], user_id)
+                    self.counts[key] = self.counts.get(key, 0) + 1
+                    self.touched.add(key)
+            if high is None or msg['created_at'] > high:
+                high = msg['created_at']
+            n += 1
+        self.msg_watermark = high
+        if high:
+            floor = shift(high, -OVERLAP)
+            self.recent_ids = {i: ts for i, ts in self.recent_ids.items() if ts >= floor}
+        return n
+
+    def resolve_recounts(self, url=None):
+        """Count pairs whose receipt predates the tail: SQL up to the tail, the tail from state."""
+        if not self.recount:
+            return 0
+        pairs = []
+        for room_id, user_id in sorted(self.recount):
+            room = self.room(room_id)
+            pairs.append(f"('{room_id}'::uuid, '{user_id}'::uuid, "
+                         f"'{self.receipts[room_id][user_id]}'::timestamptz, '{room.tail_from}'::timestamptz)")
+        for room_id, user_id, n in psql_rows(
+                'SELECT r.room_id, r.user_id, count(m.id) '
+                f'FROM (VALUES {", ".join(pairs)}) AS r(room_id, user_id, read_at, tail_from) '
+                'LEFT JOIN public.chat_messages m ON m.room_id = r.room_id AND m.sender_id <> r.user_id '
+                'AND m.created_at > r.read_at AND m.created_at <= r.tail_from '
+                'GROUP BY r.room_id, r.user_id;', url):
+            room = self.rooms[room_id]
+            key = (room_id, user_id)
+            self.counts[key] = int(n) + room.unread(user_id, room.tail_from)
+            self.touched.add(key)
+        resolved = len(self.recount)
+        self.recount = set()
+        return resolved
+
+    def prune(self):
+        for room_id, room in self.rooms.items():
+            members = self.members.get(room_id, ())
+            receipts = self.receipts.get(room_id, {})
+            room.prune([ts for user, ts in receipts.items() if user in members])
+
+
+def fetch_members():
+    return db_rows('public.chat_room_members', ['room_id', 'user_id'])
+
+
+def query_rows(query, columns):
+    return (dict(zip(columns, values)) for values in copy_out(query))
+
+
+def fetch_receipts(since):
+    query = (f'SELECT room_id, user_id, {UTC_TS.format("last_read_at")} AS last_read_at '
+             'FROM public.chat_read_receipts')
+    if since:
+        query += f" WHERE last_read_at > '{since}'"
+    return query_rows(query, ['room_id', 'user_id', 'last_read_at'])
+
+
+def fetch_messages(since):
+    query = (f'SELECT id, room_id, sender_id, body, message_type, {UTC_TS.format("created_at")} AS created_at '
+             'FROM public.chat_messages')
+    if since:
+        query += f" WHERE created_at > '{since}'"
+    # the ORDER BY is the outermost one, so the fold sees messages in order
+    return query_rows(query + ' ORDER BY created_at, id', ['id', 'room_id', 'sender_id', 'body', 'message_type',
+                                                           'created_at'])
+
+
+def refresh(state):
+    # order matters: receipts before messages so new messages compare against current receipts
+    state.sync_members(fetch_members())
+    receipts = state.fold_receipts(fetch_receipts(state.receipt_watermark and shift(state.receipt_watermark, -OVERLAP)))
+    messages = state.fold_messages(fetch_messages(state.msg_watermark and shift(state.msg_watermark, -OVERLAP)))
+    recounted = state.resolve_recounts()
+    state.prune()
+    return receipts, messages, recounted
+
+
+FULL_SYNC_SQL = """
+DELETE FROM public.chat_unread_counts c
+WHERE NOT EXISTS (SELECT 1 FROM unread_in i WHERE i.room_id = c.room_id AND i.user_id = c.user_id);
+DELETE FROM public.chat_room_last_message l
+WHERE NOT EXISTS (SELECT 1 FROM last_in i WHERE i.room_id = l.room_id);
+"""
+
+
+def upsert_script(state, full=False):
+    yield ('BEGIN;\n'
+           'CREATE TEMP TABLE unread_in (room_id uuid, user_id uuid, unread_count integer, '
+           'last_read_at timestamptz, PRIMARY KEY (room_id, user_id)) ON COMMIT DROP;\n'
+           'CREATE TEMP TABLE unread_gone (room_id uuid, user_id uuid) ON COMMIT DROP;\n'
+           'CREATE TEMP TABLE last_in (LIKE public.chat_room_last_message INCLUDING DEFAULTS) ON COMMIT DROP;\n')
+    yield from copy_block('unread_in', COUNT_COLUMNS, (
+        [r, u, state.counts[(r, u)], state.receipts.get(r, {}).get(u)]
+        for r, u in sorted(state.touched) if (r, u) in state.counts))
+    yield from copy_block('unread_gone', ['room_id', 'user_id'], sorted(state.removed))
+    yield from copy_block('last_in', LAST_COLUMNS, (
+        [r, room.last['id'], room.last['sender_id'], room.last['message_type'], room.last['preview'],
+         room.last['created_at'], room.total]
+        for r, room in sorted(state.rooms.items()) if r in state.touched_rooms and room.last))
+    yield """
+DELETE FROM public.chat_unread_counts c USING unread_gone g
+WHERE c.room_id = g.room_id AND c.user_id = g.user_id;
+%s
+
+INSERT INTO public.chat_unread_counts (room_id, user_id, unread_count, last_read_at)
+SELECT room_id, user_id, unread_count, last_read_at FROM unread_in
+ON CONFLICT (room_id, user_id) DO UPDATE SET
+    unread_count = EXCLUDED.unread_count, last_read_at = EXCLUDED.last_read_at, updated_at = now();
+
+INSERT INTO public.chat_room_last_message (room_id, message_id, sender_id, message_type, preview, created_at,
+    message_count)
+SELECT room_id, message_id, sender_id, message_type, preview, created_at, message_count FROM last_in
+ON CONFLICT (room_id) DO UPDATE SET
+    message_id = EXCLUDED.message_id, sender_id = EXCLUDED.sender_id, message_type = EXCLUDED.message_type,
+    preview = EXCLUDED.preview, created_at = EXCLUDED.created_at, message_count = EXCLUDED.message_count,
+    updated_at = now();
+
+COMMIT;
+""" % (FULL_SYNC_SQL if full else '')
+
+
+def verify(url=None):
+    """Rows where the materialized count differs from the live aggregate."""
+    return psql_rows("""
+WITH live AS (
+    SELECT crm.room_id, crm.user_id, count(m.id) AS n
+    FROM public.chat_room_members crm
+    LEFT JOIN public.chat_read_receipts rr ON rr.room_id = crm.room_id AND rr.user_id = crm.user_id
+    LEFT JOIN public.chat_messages m ON m.room_id = crm.room_id AND m.sender_id <> crm.user_id
+        AND (rr.last_read_at IS NULL OR m.created_at > rr.last_read_at)
+    GROUP BY crm.room_id, crm.user_id
+)
+SELECT coalesce(l.room_id, c.room_id), coalesce(l.user_id, c.user_id), l.n, c.unread_count
+FROM live l FULL JOIN public.chat_unread_counts c ON c.room_id = l.room_id AND c.user_id = l.user_id
+WHERE l.n IS DISTINCT FROM c.unread_count AND NOT (l.n = 0 AND c.unread_count IS NULL);
+""", url)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--state-dir', default=STATE_DIR)
+    parser.add_argument('--rebuild', action='store_true', help='drop job state and recompute everything')
+    parser.add_argument('--load', action='store_true', help='upsert changed rows into DATABASE_URL')
+    parser.add_argument('--verify', action='store_true', help='compare chat_unread_counts with a live aggregate')
+    args = parser.parse_args()
+
+    if args.rebuild or not args.verify:
+        if args.rebuild:
+            path = os.path.join(args.state_dir, 'state.json')
+            if os.path.exists(path):
+                os.remove(path)
+        state = UnreadState(args.state_dir)
+        receipts, messages, recounted = refresh(state)
+        if args.rebuild:
+            state.touched = set(state.counts)
+            state.touched_rooms = set(state.rooms)
+        state.save()
+        print(f'{messages} new messages, {receipts} receipt changes -> {len(state.touched)} counters, '
+              f'{len(state.touched_rooms)} rooms, {len(state.removed)} removed to load, '
+              f'{recounted} recounted in SQL', file=sys.stderr)
+        if args.load:
+            psql_stream(upsert_script(state, full=args.rebuild))
+            state.touched, state.touched_rooms, state.removed = set(), set(), set()
+            state.save()
+    if args.verify:
+        bad = verify()
+        for row in bad[:20]:
+            print('\t'.join(row))
+        print(f'{len(bad)} mismatched (room, user) counters', file=sys.stderr)
+        sys.exit(1 if bad else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""Build per-cohort attendance × assignment matrices and a performance rollup.
+
+MyPerformancePage and WorkspaceAttendance walk cohort → sessions →
+assignments → submissions (and session_attendance) once per member. This
+reads each table once and, per cohort, builds
+
+    attendance   users × sessions as one int bitset per member (bit i = session i)
+    scores       users × assignments as score lists plus a submitted bitset
+
+then derives, a column at a time, attendance rate over held sessions, current
+attendance and submission streaks, missing work, percentile ranks within the
+cohort and at-risk flags. The result is one row per cohort in
+public.cohort_performance, so an admin dashboard is a single read.
+
+Members are resolved like MyPerformancePage: users whose company belongs to the
+cohort plus cohort_memberships; owners/admins are left out. A session is held
+once its status is 'completed'; an assignment counts as due once its due_date
+is on or before --as-of.
+
+Usage:
+    python scripts/cohort_matrix.py --source db --load
+    python scripts/cohort_matrix.py --source exports/ --out rollup.jsonl   # <table>.csv/json/jsonl
+    python scripts/cohort_matrix.py --source db --report
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+from pg_local import copy_block, psql_stream
+from snapshots import db_rows, read_rows
+
+TABLES = {
+    'cohorts': ['id', 'name', 'start_date', 'end_date'],
+    'companies': ['id', 'cohort_id'],
+    'users': ['id', 'full_name', 'email', 'role', 'company_id'],
+    'cohort_memberships': ['user_id', 'cohort_id'],
+    'sessions': ['id', 'cohort_id', 'session_number', 'scheduled_date', 'status'],
+    'assignments': ['id', 'session_id', 'due_date'],
+    'submissions': ['assignment_id', 'user_id', 'score'],
+    'session_attendance': ['session_id', 'user_id'],
+}
+ROLLUP_COLUMNS = ['cohort_id', 'session_ids', 'assignment_ids', 'summary', 'members']
+STAFF_ROLES = {'owner', 'admin'}
+
+# at-risk thresholds (WorkspaceAttendance colours < 50% red)
+LOW_ATTENDANCE = 0.5
+LOW_SCORE = 50
+MISSED_RECENT = 2
+# MyPerformancePage: assignmentBoost = avg(graded) / 100 * 45
+BOOST_POINTS = 45
+
+
+def load_tables(source):
+    tables = {}
+    for table, columns in TABLES.items():
+        if source == 'db':
+            tables[table] = list(db_rows(f'public.{table}', columns))
+            continue
+        for ext in ('.csv', '.jsonl', '.json'):
+            path = os.path.join(source, table + ext)
+            if os.path.exists(path):
+                tables[table] = list(read_rows(path))
+                break
+        else:
+            sys.exit(f'{source}: no export for {table}')
+    return tables
+
+
+def bits(flags):
+    """Bitset from a list of booleans, bit i = flags[i]."""
+    value = 0
+    for i, flag in enumerate(flags):
+        if flag:
+            value |= 1 << i
+    return value
+
+
+def run_from_top(value, mask):
+    """Length of the run of set bits in `value`, walking down from the highest bit of `mask`."""
+    run = 0
+    for i in range(mask.bit_length() - 1, -1, -1):
+        if not mask >> i & 1:
+            continue
+        if not value >> i & 1:
+            break
+        run += 1
+    return run
+
+
+def last_n_bits(mask, n):
+    """The highest `n` set bits of mask."""
+    out = 0
+    for i in range(mask.bit_length() - 1, -1, -1):
+        if n == 0:
+            break
+        if mask >> i & 1:
+            out |= 1 << i
+            n -= 1
+    return out
+
+
+def percentile_ranks(values):
+    """Mid-rank percentile of each value among the non-None ones (None stays None)."""
+    present = sorted(v for v in values if v is not None)
+    n = len(present)
+    ranks = {}
+    i = 0
+    while i < n:
+        j = i
+        while j < n and present[j] == present[i]:
+            j += 1
+        ranks[present[i]] = round((i + (j - i) / 2) / n * 100, 1)
+        i = j
+    return [None if v is None else ranks[v] for v in values]
+
+
+def index_tables(tables):
+    by_cohort = {}
+
+    def cohort(cid):
+        return by_cohort.setdefault(cid, {'members': set(), 'sessions': [], 'assignments': []})
+
+    company_cohort = {c['id']: c['cohort_id'] for c in tables['companies'] if c.get('cohort_id')}
+    users = {u['id']: u for u in tables['users']}
+    for u in users.values():
+        cid = company_cohort.get(u.get('company_id'))
+        if cid and u.get('role') not in STAFF_ROLES:
+            cohort(cid)['members'].add(u['id'])
+    for m in tables['cohort_memberships']:
+        if m['user_id'] in users and users[m['user_id']].get('role') not in STAFF_ROLES:
+            cohort(m['cohort_id'])['members'].add(m['user_id'])
+    session_cohort = {}
+    for s in tables['sessions']:
+        if s.get('cohort_id'):
+            cohort(s['cohort_id'])['sessions'].append(s)
+            session_cohort[s['id']] = s['cohort_id']
+    for a in tables['assignments']:
+        cid = session_cohort.get(a.get('session_id'))
+        if cid:
+            cohort(cid)['assignments'].append(a)
+    return by_cohort, users
+
+
+def cohort_matrix(group, tables, as_of):
+    """Dense matrices and derived metrics for one cohort."""
+    members = sorted(group['members'])
+    sessions = sorted(group['sessions'], key=lambda s: (int(s['session_number'] or 0), s['scheduled_date'] or ''))
+    assignments = sorted(group['assignments'], key=lambda a: (a['due_date'] or '', a['id']))
+    row = {u: i for i, u in enumerate(members)}
+    s_col = {s['id']: i for i, s in enumerate(sessions)}
+    a_col = {a['id']: i for i, a in enumerate(assignments)}
+
+    attendance = [0] * len(members)
+    for r in tables['session_attendance']:
+        i, j = row.get(r['user_id']), s_col.get(r['session_id'])
+        if i is not None and j is not None:
+            attendance[i] |= 1 << j
+    scores = [[None] * len(assignments) for _ in members]
+    submitted = [0] * len(members)
+    for r in tables['submissions']:
+        i, j = row.get(r['user_id']), a_col.get(r['assignment_id'])
+        if i is None or j is None:
+            continue
+        submitted[i] |= 1 << j
+        if r.get('score') not in (None, ''):
+            scores[i][j] = int(r['score'])
+
+    held = bits([s.get('status') == 'completed' for s in sessions])
+    due = bits([(a['due_date'] or '')[:10] <= as_of for a in assignments])
+    n_held, n_due = held.bit_count(), due.bit_count()
+    recent_due = last_n_bits(due, MISSED_RECENT)
+
+    # column-wise passes over the member axis
+    attended = [(a & held).bit_count() for a in attendance]
+    rates = [round(a / n_held, 3) if n_held else None for a in attended]
+    done = [(s & due).bit_count() for s in submitted]
+    graded = [[v for v in row_scores if v is not None] for row_scores in scores]
+    averages = [round(sum(g) / len(g), 1) if g else None for g in graded]
+    attendance_pct = percentile_ranks(rates)
+    score_pct = percentile_ranks(averages)
+
+    out = []
+    for i, user_id in enumerate(members):
+        missing = due & ~submitted[i]
+        flags = []
+        if rates[i] is not None and rates[i] < LOW_ATTENDANCE:
+            flags.append('low_attendance')
+        if recent_due and (missing & recent_due) == recent_due and recent_due.bit_count() == MISSED_RECENT:
+            flags.append('missed_recent')
+        if n_due and not done[i]:
+            flags.append('no_submissions')
+        if averages[i] is not None and averages[i] < LOW_SCORE:
+            flags.append('low_scores')
+        out.append({
+            'user_id': user_id,
+            'attendance': format(attendance[i], 'x'),
+            'attended': attended[i],
+            'attendance_rate': rates[i],
+            'attendance_streak': run_from_top(attendance[i], held),
+            'submitted': format(submitted[i], 'x'),
+            'missing': format(missing, 'x'),
+            'scores': scores[i],
+            'completed': done[i],
+            'completion_rate': round(done[i] / n_due, 3) if n_due else None,
+            'completion_streak': run_from_top(submitted[i], due),
+            'avg_score': averages[i],
+            'readiness_boost': round(averages[i] / 100 * BOOST_POINTS) if averages[i] is not None else 0,
+            'attendance_percentile': attendance_pct[i],
+            'score_percentile': score_pct[i],
+            'flags': flags,
+            'at_risk': bool(flags),
+        })
+
+    rated = [r for r in rates if r is not None]
+    scored = [a for a in averages if a is not None]
+    summary = {
+        'members': len(members), 'sessions': len(sessions), 'held_sessions': n_held,
+        'assignments': len(assignments), 'due_assignments': n_due,
+        'held_mask': format(held, 'x'), 'due_mask': format(due, 'x'),
+        'avg_attendance_rate': round(sum(rated) / len(rated), 3) if rated else None,
+        'avg_score': round(sum(scored) / len(scored), 1) if scored else None,
+        'at_risk': sum(m['at_risk'] for m in out),
+        'as_of': as_of,
+    }
+    return {'session_ids': [s['id'] for s in sessions], 'assignment_ids': [a['id'] for a in assignments],
+            'summary': summary, 'members': out}
+
+
+def build(tables, as_of):
+    by_cohort, _ = index_tables(tables)
+    known = {c['id'] for c in tables['cohorts']}
+    return {cid: cohort_matrix(group, tables, as_of) for cid, group in by_cohort.items() if cid in known}
+
+
+def load_script(rollups):
+    """Replace the rollup row of every rebuilt cohort in one transaction."""
+    yield ('BEGIN;\nCREATE TEMP TABLE cohort_performance_in (LIKE public.cohort_performance INCLUDING DEFAULTS) '
+           'ON COMMIT DROP;\n')
+    yield from copy_block('cohort_performance_in', ROLLUP_COLUMNS, (
+        [cid, '{' + ','.join(r['session_ids']) + '}', '{' + ','.join(r['assignment_ids']) + '}',
+         json.dumps(r['summary']), json.dumps(r['members'], separators=(',', ':'))]
+        for cid, r in rollups.items()
+    ))
+    yield (f'INSERT INTO public.cohort_performance ({", ".join(ROLLUP_COLUMNS)}) '
+           f'SELECT {", ".join(ROLLUP_COLUMNS)} FROM cohort_performance_in\n'
+           'ON CONFLICT (cohort_id) DO UPDATE SET session_ids = EXCLUDED.session_ids, '
+           'assignment_ids = EXCLUDED.assignment_ids, summary = EXCLUDED.summary, '
+           'members = EXCLUDED.members, updated_at = now();\n'
+           'DELETE FROM public.cohort_performance p WHERE NOT EXISTS '
+           '(SELECT 1 FROM cohort_performance_in i WHERE i.cohort_id = p.cohort_id);\n'
+           'COMMIT;\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', default='db', help="'db' or a directory of <table>.csv/json/jsonl exports")
+    parser.add_argument('--as-of', default=datetime.now(timezone.utc).date().isoformat(),
+                        help='assignments due on or before this date count as due')
+    parser.add_argument('--load', action='store_true', help='upsert public.cohort_performance')
+    parser.add_argument('--out', help='write one rollup per cohort as JSONL')
+    parser.add_argument('--report', action='store_true', help='print cohort summaries and at-risk members')
+    args = parser.parse_args()
+
+    tables = load_tables(args.source)
+    rollups = build(tables, args.as_of)
+    print(f'{len(rollups)} cohorts, {sum(r["summary"]["members"] for r in rollups.values())} members',
+          file=sys.stderr)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            for cid, r in rollups.items():
+                f.write(json.dumps({'cohort_id': cid, **r}) + '\n')
+    if args.load:
+        psql_stream(load_script(rollups))
+        print(f'Loaded {len(rollups)} rows into public.cohort_performance', file=sys.stderr)
+    if args.report:
+        names = {c['id']: c['name'] for c in tables['cohorts']}
+        users = {u['id']: u.get('full_name') or u.get('email') for u in tables['users']}
+        for cid, r in sorted(rollups.items(), key=lambda kv: names.get(kv[0], '')):
+            s = r['summary']
+            print(f'{names.get(cid, cid)}: {s["members"]} members, {s["held_sessions"]}/{s["sessions"]} sessions held, '
+                  f'{s["due_assignments"]}/{s["assignments"]} assignments due, '
+                  f'attendance {s["avg_attendance_rate"]}, avg score {s["avg_score"]}, {s["at_risk"]} at risk')
+            for m in r['members']:
+                if m['at_risk']:
+                    print(f'    {users.get(m["user_id"], m["user_id"])}: {", ".join(m["flags"])}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""Columnar table snapshots with column pruning and chunk skipping.
+
+Writes leads / team_submissions / management_submissions / submissions (or any
+snapshot source) column by column, in row groups of --chunk-rows rows, with
+per-chunk min/max/null statistics. Readers ask for the columns they need plus
+predicates such as `priority = HOT` or `date_of_payment >= 2025-07-01`.
+Only those columns' chunks are read, and a row group whose stats rule a
+predicate out is not read at all.
+
+Two formats:
+    .parquet   when pyarrow is installed (row-group statistics, pyarrow filters)
+    .colz      built in: per row group and column one zlib-compressed JSON array,
+               then a zlib JSON footer (schema, offsets, stats), its length (>I)
+               and the magic. Readers seek to the footer, then to the chunks.
+
+Values are kept as the text the snapshot carried. Numeric columns - typed
+from the table's schema when exporting from the database, NUMERIC_COLUMNS
+(or --numeric) for snapshot files - get numeric stats, and predicates compare
+them numerically; in Parquet they are stored as int64/float64, so they read
+back as numbers. A numeric column holding any non-number falls back to text.
+Everything else, phone numbers included, stays text. ISO dates compare
+correctly as text.
+
+Usage:
+    python scripts/columnar.py export --out-dir .cache/columnar            # the four tables from DATABASE_URL
+    python scripts/columnar.py export --table leads --source leads.csv --sort-by priority --out-dir snap/
+    python scripts/columnar.py read snap/leads.colz --columns email,priority --where "priority = HOT"
+    python scripts/columnar.py read snap/leads.colz --where "date_of_payment >= 2025-07-01" \\
+        --where "date_of_payment < 2025-08-01" --format csv
+    python scripts/columnar.py stats snap/leads.colz
+"""
+import argparse
+import csv
+import json
+import os
+import struct
+import sys
+import zlib
+
+from pg_local import psql_rows
+from snapshots import db_rows, read_rows, table_columns
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = pq = None
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+OUT_DIR = os.path.join(ROOT, '.cache', 'columnar')
+
+TABLES = ['leads', 'team_submissions', 'management_submissions', 'submissions']
+MAGIC = b'COLZ1\n'
+FOOTER = struct.Struct('>I')
+CHUNK_ROWS = 8192
+OPS = ('<=', '>=', '!=', '=', '<', '>', ' in ')
+NUMERIC_TYPES = ('smallint', 'integer', 'bigint', 'numeric', 'real', 'double precision')
+# numeric columns of TABLES, for snapshot files (the database export reads the schema)
+NUMERIC_COLUMNS = {
+    'leads': {'payment_amount', 'seats', 'balance', 'balance_2', 'coupon_percent', 'amount_paid',
+              'amount_paid_2', 'amount_paid_3', 'sessions_done', 'company_match_score'},
+    'team_submissions': {'q5_confidence_ai_workflow', 'q6_skill_level_ai_tools',
+                         'q8_outputs_meet_standards_confidence', 'q11_readiness'},
+    'management_submissions': {'q4_visibility', 'q7_alignment_confidence', 'q10_team_readiness',
+                               'q11_impact_speed', 'q11_impact_quality', 'q11_impact_efficiency',
+                               'q11_impact_client_satisfaction', 'q11_impact_competitive_advantage'},
+    'submissions': {'score'},
+}
+
+
+def as_number(val):
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return None
+
+
+def as_text(val):
+    """Text form of a value, so rows from JSON sources (numbers, lists) compare with text."""
+    return val if isinstance(val, str) else json.dumps(val, ensure_ascii=False)
+
+
+def numeric_columns(table, url=None):
+    """Numeric columns of a database table, from information_schema."""
+    types = ', '.join(f"'{t}'" for t in NUMERIC_TYPES)
+    return {r[0] for r in psql_rows(
+        'SELECT column_name FROM information_schema.columns '
+        f"WHERE table_schema = 'public' AND table_name = '{table}' AND data_type IN ({types});", url)}
+
+
+def parse_where(clauses):
+    """["priority = HOT", "seats >= 2", "offering_type in A|B"] -> [(col, op, value)]."""
+    preds = []
+    for clause in clauses or []:
+        for op in OPS:
+            if op in clause:
+                col, _, value = clause.partition(op)
+                value = value.strip().strip('\'"')
+                op = op.strip()
+                preds.append((col.strip(), op, value.split('|') if op == 'in' else value))
+                break
+        else:
+            raise ValueError(f'cannot parse predicate: {clause!r}')
+    return preds
+
+
+def compare(a, op, b):
+    if op == '=':
+        return a == b
+    if op == '!=':
+        return a != b
+    if op == '<':
+        return a < b
+    if op == '<=':
+        return a <= b
+    if op == '>':
+        return a > b
+    return a >= b
+
+
+def typed(value, numeric):
+    return as_number(value) if numeric else as_text(value)
+
+
+def row_matches(row, preds, numeric):
+    for col, op, want in preds:
+        val = row.get(col)
+        if val is None:
+            return False
+        if op == 'in':
+            if typed(val, numeric.get(col)) not in [typed(w, numeric.get(col)) for w in want]:
+                return False
+            continue
+        a, b = typed(val, numeric.get(col)), typed(want, numeric.get(col))
+        if a is None or b is None or not compare(a, op, b):
+            return False
+    return True
+
+
+def chunk_may_match(stats, preds, numeric):
+    """False only when a chunk's min/max proves no row can satisfy the predicates."""
+    for col, op, want in preds:
+        s = stats.get(col)
+        if s is None:
+            continue
+        if s['min'] is None:  # column all NULL in this chunk
+            return False
+        lo, hi = s['min'], s['max']
+        if op == 'in':
+            values = [typed(w, numeric.get(col)) for w in want]
+            if not any(v is not None and lo <= v <= hi for v in values):
+                return False
+            continue
+        b = typed(want, numeric.get(col))
+        if b is None:
+            continue
+        if ((op == '=' and not lo <= b <= hi) or (op == '!=' and lo == hi == b)
+                or (op == '<' and not lo < b) or (op == '<=' and not lo <= b)
+                or (op == '>' and not hi > b) or (op == '>=' and not hi >= b)):
+            return False
+    return True
+
+
+class ColzWriter:
+    def __init__(self, path, columns, chunk_rows=CHUNK_ROWS, numeric=()):
+        self.path = path
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+        self.f = open(path + '.tmp', 'wb')
+        self.f.write(MAGIC)
+        self.groups = []
+        self.numeric = {c: c in numeric for c in columns}
+        self.pending = []
+
+    def write(self, row):
+        self.pending.append(row)
+        if len(self.pending) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        group = {'rows': len(self.pending), 'columns': {}}
+        for col in self.columns:
+            values = [r.get(col) for r in self.pending]
+            present = [as_text(v) for v in values if v is not None]
+            if self.numeric[col] and any(as_number(v) is None for v in present):
+                self.numeric[col] = False
+            data = zlib.compress(json.dumps(values, ensure_ascii=False, separators=(',', ':')).encode(), 6)
+            group['columns'][col] = {
+                'offset': self.f.tell(), 'size': len(data), 'nulls': len(values) - len(present),
+                # text bounds always; numeric bounds are derived in close() once the column type is known
+                'min': min(present) if present else None, 'max': max(present) if present else None,
+                'nmin': min((as_number(v) for v in present), default=None) if self.numeric[col] else None,
+                'nmax': max((as_number(v) for v in present), default=None) if self.numeric[col] else None,
+            }
+            self.f.write(data)
+        self.groups.append(group)
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        for group in self.groups:
+            for col, s in group['columns'].items():
+                if self.numeric[col] and s['min'] is not None:
+                    s['min'], s['max'] = s['nmin'], s['nmax']
+                del s['nmin'], s['nmax']
+        footer = zlib.compress(json.dumps({
+            'columns': self.columns, 'numeric': [c for c in self.columns if self.numeric[c]],
+            'groups': self.groups, 'rows': sum(g['rows'] for g in self.groups),
+        }, separators=(',', ':')).encode())
+        self.f.write(footer + FOOTER.pack(len(footer)) + MAGIC)
+        self.f.close()
+        os.replace(self.path + '.tmp', self.path)
+
+
+class ColzReader:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            f.seek(-(FOOTER.size + len(MAGIC)), os.SEEK_END)
+            (size,) = FOOTER.unpack(f.read(FOOTER.size))
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path}: not a columnar snapshot')
+            f.seek(-(FOOTER.size + len(MAGIC) + size), os.SEEK_END)
+            meta = json.loads(zlib.decompress(f.read(size)))
+        self.columns = meta['columns']
+        self.numeric = {c: True for c in meta['numeric']}
+        self.groups = meta['groups']
+        self.rows = meta['rows']
+
+    def read(self, columns=None, where=None):
+        preds = parse_where(where) if isinstance(where, list) else where or []
+        columns = columns or self.columns
+        needed = list(dict.fromkeys(columns + [p[0] for p in preds]))
+        unknown = [c for c in needed if c not in self.columns]
+        if unknown:
+            raise KeyError(f'{self.path}: no column {", ".join(unknown)}')
+        self.chunks_read = self.chunks_skipped = 0
+        with open(self.path, 'rb') as f:
+            for group in self.groups:
+                if not chunk_may_match(group['columns'], preds, self.numeric):
+                    self.chunks_skipped += 1
+                    continue
+                self.chunks_read += 1
+                data = {}
+                for col in needed:
+                    s = group['columns'][col]
+                    f.seek(s['offset'])
+                    data[col] = json.loads(zlib.decompress(f.read(s['size'])))
+                for i in range(group['rows']):
+                    row = {col: data[col][i] for col in needed}
+                    if row_matches(row, preds, self.numeric):
+                        yield {col: row[col] for col in columns}
+
+
+def write_parquet(path, columns, rows, chunk_rows, numeric=()):
+    values = {c: [] for c in columns}
+    for row in rows:
+        for c in columns:
+            values[c].append(row.get(c))
+    arrays = {}
+    for c in columns:
+        present = [v for v in values[c] if v is not None]
+        # only declared numeric columns are typed (numeric row-group stats); the rest stay text as given
+        if c in numeric and all(as_number(v) is not None for v in present):
+            ints = all(isinstance(v, int) or str(v).strip().lstrip('+-').isdigit() for v in present)
+            arrays[c] = pyarrow.array([None if v is None else int(v) if ints else float(v) for v in values[c]],
+                                      type=pyarrow.int64() if ints else pyarrow.float64())
+        else:
+            arrays[c] = pyarrow.array([None if v is None else as_text(v) for v in values[c]],
+                                      type=pyarrow.string())
+    table = pyarrow.table(arrays)
+    pq.write_table(table, path + '.tmp', row_group_size=chunk_rows, compression='zstd', write_statistics=True)
+    os.replace(path + '.tmp', path)
+    return table.num_rows
+
+
+def read_parquet(path, columns=None, where=None):
+    preds = list(parse_where(where) if isinstance(where, list) else where or [])
+    numeric = {f.name: True for f in pq.read_schema(path)
+               if pyarrow.types.is_floating(f.type) or pyarrow.types.is_integer(f.type)}
+    filters = []
+    for i, (col, op, want) in enumerate(preds):
+        # predicate values take the column's type; one that is not a number stays out of the
+        # pushed-down filters and row_matches rejects it
+        if op == 'in':
+            want = [typed(w, numeric.get(col)) for w in want]
+            filters.append((col, 'in', [w for w in want if w is not None]))
+        else:
+            want = typed(want, numeric.get(col))
+            if want is not None:
+                filters.append((col, '==' if op == '=' else op, want))
+        preds[i] = (col, op, want)
+    needed = list(dict.fromkeys(columns + [p[0] for p in preds])) if columns else None
+    for row in pq.read_table(path, columns=needed, filters=filters or None).to_pylist():
+        if row_matches(row, preds, numeric):
+            yield {c: row[c] for c in columns} if columns else row
+
+
+def snapshot_rows(path, columns=None, where=None):
+    """Rows of a .colz / .parquet snapshot, pruned to `columns` and filtered by `where`."""
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise RuntimeError(f'{path}: reading Parquet needs pyarrow')
+        return read_parquet(path, columns, where)
+    return ColzReader(path).read(columns, where)
+
+
+def export(table, rows, columns, out_dir, chunk_rows, sort_by=None, fmt=None, numeric=()):
+    fmt = fmt or ('parquet' if pq is not None else 'colz')
+    path = os.path.join(out_dir, f'{table}.{fmt}')
+    if sort_by:
+        # clustering on a filter column makes chunk stats selective
+        by_number = sort_by in numeric
+        rows = sorted(rows, key=lambda r: (r.get(sort_by) is None, (as_number(r.get(sort_by)) or 0.0) if by_number
+                                           else as_text(r.get(sort_by))))
+    if fmt == 'parquet':
+        return path, write_parquet(path, columns, rows, chunk_rows, numeric)
+    writer = ColzWriter(path, columns, chunk_rows, numeric)
+    n = 0
+    for row in rows:
+        writer.write(row)
+        n += 1
+    writer.close()
+    return path, n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['export', 'read', 'stats'])
+    parser.add_argument('path', nargs='?', help='snapshot file for read/stats')
+    parser.add_argument('--table', action='append', help=f'table(s) to export (default: {", ".join(TABLES)})')
+    parser.add_argument('--source', default='db', help="'db' or a snapshot file (with a single --table)")
+    parser.add_argument('--out-dir', default=OUT_DIR)
+    parser.add_argument('--format', choices=['parquet', 'colz', 'jsonl', 'csv'],
+                        help='export: parquet/colz (default parquet if pyarrow is installed); read: jsonl/csv')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--sort-by', help='cluster rows on this column before writing')
+    parser.add_argument('--numeric', help='comma-separated numeric columns of a snapshot file '
+                                          '(default: NUMERIC_COLUMNS for the table)')
+    parser.add_argument('--columns', help='comma-separated columns to read')
+    parser.add_argument('--where', action='append', help="predicate, e.g. \"priority = HOT\" (repeatable, ANDed)")
+    args = parser.parse_intermixed_args()
+
+    if args.command == 'export':
+        if args.format in ('jsonl', 'csv'):
+            parser.error('export writes parquet or colz')
+        if args.format == 'parquet' and pq is None:
+            sys.exit('pyarrow is not installed; use --format colz')
+        tables = args.table or TABLES
+        if args.source != 'db' and len(tables) != 1:
+            parser.error('--source needs exactly one --table')
+        os.makedirs(args.out_dir, exist_ok=True)
+        for table in tables:
+            if args.source == 'db':
+                columns = table_columns(f'public.{table}')
+                rows = db_rows(f'public.{table}', columns)
+                numeric = numeric_columns(table)
+            else:
+                rows = list(read_rows(args.source))
+                columns = list(dict.fromkeys(k for r in rows for k in r))
+                numeric = set(args.numeric.split(',')) if args.numeric else NUMERIC_COLUMNS.get(table, set())
+            path, n = export(table, rows, columns, args.out_dir, args.chunk_rows, args.sort_by, args.format,
+                             numeric)
+            print(f'{table}: {n} rows, {len(columns)} columns -> {path} ({os.path.getsize(path)} bytes)',
+                  file=sys.stderr)
+        return
+
+    if not args.path:
+        parser.error(f'{args.command} needs a snapshot path')
+    if args.path.endswith('.parquet') and pq is None:
+        sys.exit(f'{args.path}: reading Parquet needs pyarrow')
+    if args.command == 'stats':
+        if args.path.endswith('.parquet'):
+            meta = pq.ParquetFile(args.path).metadata
+            print(f'{meta.num_rows} rows, {meta.num_row_groups} row groups, {meta.num_columns} columns')
+            return
+        reader = ColzReader(args.path)
+        print(f'{reader.rows} rows, {len(reader.groups)} row groups, {len(reader.columns)} columns')
+        for col in reader.columns:
+            stats = [g['columns'][col] for g in reader.groups]
+            size = sum(s['size'] for s in stats)
+            nulls = sum(s['nulls'] for s in stats)
+            kind = 'number' if reader.numeric.get(col) else 'text'
+            print(f'  {col:<28} {kind:<6} {size:>9} bytes  {nulls} nulls')
+        return
+
+    columns = args.columns.split(',') if args.columns else None
+    if args.path.endswith('.parquet'):
+        rows = snapshot_rows(args.path, columns, args.where)
+        reader = None
+    else:
+        reader = ColzReader(args.path)
+        rows = reader.read(columns, args.where)
+    n = 0
+    writer = None
+    for row in rows:
+        if args.format == 'csv':
+            if writer is None:
+                writer = csv.DictWriter(sys.stdout, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+        else:
+            sys.stdout.write(json.dumps(row, ensure_ascii=False) + '\n')
+        n += 1
+    if reader is not None:
+        print(f'{n} rows; {reader.chunks_read} row groups read, {reader.chunks_skipped} skipped', file=sys.stderr)
+    else:
+        print(f'{n} rows', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
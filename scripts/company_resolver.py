@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Resolve leads.company_name to companies in bulk and propose missing companies.
+
+leads.company_name is free text ("-", "Moy Design Studio", "Interiors-Dxb",
+"Cabinet&Co"). This builds one index over companies.name plus the company
+strings of leads already linked by hand, then scores every unlinked lead
+against it in a single pass:
+
+  * names are folded (accents, case, punctuation) and legal suffixes dropped;
+    an exact folded or space-less match scores 1,
+  * otherwise candidates come from an inverted index on token prefixes and on
+    the first letters of the space-less key, and are scored by IDF-weighted
+    soft token overlap (tokens match on equality or a close spelling, and
+    "design" or "studio" alone carry little weight) blended with a character
+    similarity of the whole name.
+
+Leads at --min-score or above are linked; those between --review-score and
+--min-score are listed for review and left unlinked. Unmatched names are
+clustered (same blocks, same score) into proposed new companies, named after
+their most common variant.
+Placeholders such as "-" or "Freelancer" are left alone.
+
+Results go to <state-dir>/matches.csv and proposals.csv. --apply writes
+leads.company_id / company_match_score with one COPY and one UPDATE (rows with
+company_id set and no score were linked by hand and are never touched);
+--create-companies also inserts the proposals and links their leads.
+
+Usage:
+    python scripts/company_resolver.py --source db
+    python scripts/company_resolver.py --source db --apply --create-companies
+    python scripts/company_resolver.py --source exports/        # leads / companies .csv/json/jsonl
+"""
+import argparse
+import csv
+import math
+import os
+import re
+import sys
+import unicodedata
+from collections import Counter
+from difflib import SequenceMatcher
+
+from pg_local import copy_block, psql_stream
+from snapshots import db_rows, read_rows
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+STATE_DIR = os.path.join(ROOT, '.cache', 'company-resolver')
+
+TABLES = {
+    'leads': ['id', 'company_name', 'company_id', 'company_match_score'],
+    'companies': ['id', 'name'],
+}
+COMPANY_SUFFIXES = {'llc', 'ltd', 'limited', 'inc', 'co', 'fz', 'fze', 'fzco', 'fzllc', 'the', 'and',
+                    'est', 'wll', 'plc', 'int', 'intl', 'international'}
+# what the sales team types when there is no company
+PLACEHOLDERS = {'', 'na', 'n a', 'none', 'no', 'tba', 'freelancer', 'freelance', 'self employed', 'unemployed',
+                'founder', 'private', 'student', 'independent'}
+MIN_SCORE = 0.85
+REVIEW_SCORE = 0.65
+BLOCK_PREFIX = 4
+TOKEN_MATCH = 0.8  # spelling similarity at which two tokens count as the same word
+
+
+def fold(text):
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode().lower()
+    return re.sub(r'[^a-z0-9]+', ' ', text).split()
+
+
+def normalize_company(name):
+    return ' '.join(w for w in fold(name) if w not in COMPANY_SUFFIXES)
+
+
+def token_similarity(a, b):
+    ratio = SequenceMatcher(None, a, b).ratio()
+    return ratio if ratio >= TOKEN_MATCH else 0.0
+
+
+def block_keys(compact, tokens):
+    return {'=' + compact[:BLOCK_PREFIX]} | {t[:BLOCK_PREFIX] for t in tokens}
+
+
+class CompanyIndex:
+    """Folded-name index over known company names and aliases."""
+
+    def __init__(self):
+        self.exact = {}      # folded key / space-less key -> company id
+        self.entries = []    # (company id, key, tokens)
+        self.blocks = {}     # token prefix / space-less key prefix -> entry positions
+        self.df = Counter()
+
+    def add(self, company_id, name):
+        key = normalize_company(name)
+        if not key or key in PLACEHOLDERS:
+            return
+        compact = key.replace(' ', '')
+        if key in self.exact or compact in self.exact:
+            return
+        self.exact[key] = self.exact[compact] = company_id
+        pos = len(self.entries)
+        tokens = set(key.split())
+        self.entries.append((company_id, key, tokens))
+        self.df.update(tokens)
+        for block in block_keys(compact, tokens):
+            self.blocks.setdefault(block, []).append(pos)
+
+    def weight(self, token):
+        return math.log(1 + len(self.entries) / (1 + self.df[token]))
+
+    def score(self, key, tokens, entry_key, entry_tokens):
+        def covered(side, other):
+            total = 0.0
+            for t in side:
+                best = 1.0 if t in other else max((token_similarity(t, u) for u in other), default=0.0)
+                total += self.weight(t) * best
+            return total
+        weights = sum(self.weight(t) for t in tokens) + sum(self.weight(t) for t in entry_tokens)
+        overlap = (covered(tokens, entry_tokens) + covered(entry_tokens, tokens)) / weights
+        chars = SequenceMatcher(None, key.replace(' ', ''), entry_key.replace(' ', '')).ratio()
+        return 0.6 * overlap + 0.4 * chars
+
+    def lookup(self, name):
+        """(company id, score) of the best match for `name`, or (None, 0.0)."""
+        key = normalize_company(name)
+        compact = key.replace(' ', '')
+        hit = self.exact.get(key) or self.exact.get(compact)
+        if hit:
+            return hit, 1.0
+        tokens = set(key.split())
+        candidates = set()
+        for block in block_keys(compact, tokens):
+            candidates.update(self.blocks.get(block, ()))
+        best, best_score = None, 0.0
+        for pos in candidates:
+            company_id, entry_key, entry_tokens = self.entries[pos]
+            score = self.score(key, tokens, entry_key, entry_tokens)
+            if score > best_score:
+                best, best_score = company_id, score
+        return best, round(best_score, 3)
+
+
+def load_tables(source):
+    tables = {}
+    for table, columns in TABLES.items():
+        if source == 'db':
+            tables[table] = list(db_rows(f'public.{table}', columns))
+            continue
+        for ext in ('.csv', '.jsonl', '.json'):
+            path = os.path.join(source, table + ext)
+            if os.path.exists(path):
+                tables[table] = list(read_rows(path))
+                break
+        else:
+            sys.exit(f'{source}: no export for {table}')
+    return tables
+
+
+def is_manual(lead):
+    return bool(lead.get('company_id')) and lead.get('company_match_score') in (None, '')
+
+
+def resolve(tables, min_score=MIN_SCORE, review_score=REVIEW_SCORE):
+    """Return (links, review, unmatched): [(lead, company id, score)] and [lead]."""
+    index = CompanyIndex()
+    for c in tables['companies']:
+        index.add(c['id'], c['name'])
+    for lead in tables['leads']:
+        if is_manual(lead):
+            index.add(lead['company_id'], lead['company_name'])
+    links, review, unmatched = [], [], []
+    cache = {}
+    for lead in tables['leads']:
+        if is_manual(lead):
+            continue
+        key = normalize_company(lead.get('company_name'))
+        if key in PLACEHOLDERS:
+            continue
+        if key not in cache:
+            cache[key] = index.lookup(lead['company_name'])
+        company_id, score = cache[key]
+        if company_id and score >= min_score:
+            links.append((lead, company_id, score))
+        elif company_id and score >= review_score:
+            review.append((lead, company_id, score))
+        else:
+            unmatched.append(lead)
+    return links, review, unmatched
+
+
+def cluster(leads, min_score=MIN_SCORE):
+    """Group unmatched leads by company name into [(proposed name, [leads])], largest first."""
+    index = CompanyIndex()
+    members = {}
+    for lead in leads:
+        key = normalize_company(lead['company_name'])
+        cluster_id, score = index.lookup(key)
+        if cluster_id is None or score < min_score:
+            cluster_id = key
+        index.add(cluster_id, key)  # later variants also match this spelling exactly
+        members.setdefault(cluster_id, []).append(lead)
+    out = []
+    for group in members.values():
+        names = Counter(lead['company_name'].strip() for lead in group)
+        out.append((names.most_common(1)[0][0], group))
+    return sorted(out, key=lambda c: (-len(c[1]), c[0].lower()))
+
+
+def write_csv(path, header, rows):
+    with open(path + '.tmp', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    os.replace(path + '.tmp', path)
+
+
+def link_script(links, proposals):
+    """Apply all links (and create proposed companies) in one transaction."""
+    yield ('BEGIN;\nCREATE TEMP TABLE lead_company_link '
+           '(lead_id uuid, company_id uuid, company_name text, score numeric) ON COMMIT DROP;\n')
+    rows = [[lead['id'], company_id, None, score] for lead, company_id, score in links]
+    rows += [[lead['id'], None, name, 1] for name, group in proposals for lead in group]
+    yield from copy_block('lead_company_link', ['lead_id', 'company_id', 'company_name', 'score'], rows)
+    if proposals:
+        yield ('INSERT INTO public.companies (name) SELECT DISTINCT company_name FROM lead_company_link '
+               'WHERE company_id IS NULL ON CONFLICT (name) DO NOTHING;\n'
+               'UPDATE lead_company_link k SET company_id = c.id FROM public.companies c '
+               'WHERE k.company_id IS NULL AND c.name = k.company_name;\n')
+    yield ('UPDATE public.leads l SET company_id = k.company_id, company_match_score = k.score '
+           'FROM lead_company_link k WHERE l.id = k.lead_id '
+           # linked by hand since the snapshot was taken
+           'AND NOT (l.company_id IS NOT NULL AND l.company_match_score IS NULL) '
+           'AND (l.company_id IS DISTINCT FROM k.company_id OR l.company_match_score IS DISTINCT FROM k.score);\n'
+           'COMMIT;\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', default='db', help="'db' or a directory of leads/companies exports")
+    parser.add_argument('--min-score', type=float, default=MIN_SCORE, help='link at or above this score')
+    parser.add_argument('--review-score', type=float, default=REVIEW_SCORE,
+                        help='list matches between this and --min-score for review')
+    parser.add_argument('--state-dir', default=STATE_DIR)
+    parser.add_argument('--apply', action='store_true', help='write leads.company_id')
+    parser.add_argument('--create-companies', action='store_true',
+                        help='with --apply, insert proposed companies and link their leads')
+    args = parser.parse_args()
+
+    tables = load_tables(args.source)
+    links, review, unmatched = resolve(tables, args.min_score, args.review_score)
+    proposals = cluster(unmatched, args.min_score)
+    names = {c['id']: c['name'] for c in tables['companies']}
+
+    os.makedirs(args.state_dir, exist_ok=True)
+    matches_path = os.path.join(args.state_dir, 'matches.csv')
+    proposals_path = os.path.join(args.state_dir, 'proposals.csv')
+    write_csv(matches_path, ['lead_id', 'company_name', 'company_id', 'matched_name', 'score', 'status'],
+              [[lead['id'], lead['company_name'], cid, names.get(cid, ''), score, status]
+               for status, rows in (('linked', links), ('review', review))
+               for lead, cid, score in rows])
+    write_csv(proposals_path, ['proposed_name', 'leads', 'variants', 'lead_ids'],
+              [[name, len(group), ' | '.join(sorted({lead['company_name'].strip() for lead in group})),
+                ' '.join(lead['id'] for lead in group)] for name, group in proposals])
+    print(f'{len(tables["leads"])} leads, {len(tables["companies"])} companies: {len(links)} linked, '
+          f'{len(review)} for review -> {matches_path}; {len(unmatched)} unmatched in {len(proposals)} '
+          f'proposed companies -> {proposals_path}', file=sys.stderr)
+
+    if args.apply:
+        psql_stream(link_script(links, proposals if args.create_companies else []))
+        created = sum(len(group) for _, group in proposals) if args.create_companies else 0
+        print(f'Linked {len(links) + created} leads', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
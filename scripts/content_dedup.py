@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""Canonicalize content URLs and drop already-known items before insert.
+
+content_items.original_url is unique, so the aggregator only finds out about
+duplicates when an insert fails, and near-duplicates (utm params, `www.`,
+trailing slashes, youtu.be vs youtube.com/watch) get in as new rows. This stage
+canonicalizes each URL and checks it against a persisted Bloom filter; only
+Bloom hits are confirmed against the exact set of known canonical URLs, so a
+run of mostly-new items never touches the exact set at all.
+
+State lives in --state-dir (default .cache/content-dedup):
+    urls.bloom   Bloom filter (JSON header line + bit array)
+    urls.txt     append-only list of known canonical URLs
+
+Usage:
+    python scripts/content_dedup.py seed db:public.content_items   # or an export
+    python scripts/content_dedup.py filter scraped.jsonl --add > new_items.jsonl
+    python scripts/content_dedup.py canonical 'https://youtu.be/abc?si=x'
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from snapshots import read_rows
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+STATE_DIR = os.path.join(ROOT, '.cache', 'content-dedup')
+
+TRACKING_PARAMS = {
+    'fbclid', 'gclid', 'dclid', 'msclkid', 'mc_cid', 'mc_eid', 'igshid', 'ref', 'ref_src',
+    'ref_url', 'source', 'si', 'feature', 'spm', '_hsenc', '_hsmi', 'mkt_tok', 'yclid',
+}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'hsa_')
+YOUTUBE_HOSTS = {'youtube.com', 'm.youtube.com', 'music.youtube.com', 'youtube-nocookie.com'}
+# youtube URLs are fully identified by these params; everything else is noise
+YOUTUBE_KEEP = {'v', 'list'}
+
+
+def canonical_url(url):
+    """Normalize a URL so trivially different spellings compare equal; None if empty or unparseable."""
+    url = (url or '').strip()
+    if not url:
+        return None
+    if '://' not in url:
+        url = 'https://' + url
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:  # bad port or IPv6 literal
+        return None
+    host = (parts.hostname or '').lower().rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+    netloc = host if port in (None, 80, 443) else f'{host}:{port}'
+    path = parts.path or '/'
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+             if k.lower() not in TRACKING_PARAMS and not k.lower().startswith(TRACKING_PREFIXES)]
+
+    if host == 'youtu.be':
+        video = path.strip('/').split('/')[0]
+        netloc, path, query = 'youtube.com', '/watch', [('v', video)] + query
+    elif host in YOUTUBE_HOSTS:
+        netloc = 'youtube.com'
+        segments = path.strip('/').split('/')
+        if len(segments) >= 2 and segments[0] in ('shorts', 'embed', 'live', 'v'):
+            path, query = '/watch', [('v', segments[1])] + query
+    if netloc == 'youtube.com' and path == '/watch':
+        query = [(k, v) for k, v in query if k in YOUTUBE_KEEP]
+
+    if len(path) > 1:
+        path = path.rstrip('/')
+    return urlunsplit(('https', netloc, path, urlencode(sorted(query)), ''))
+
+
+class BloomFilter:
+    def __init__(self, capacity=1_000_000, error_rate=0.001, bits=None, hashes=None, data=None):
+        self.bits = bits or max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = hashes or max(1, round(self.bits / capacity * math.log(2)))
+        self.data = data if data is not None else bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, item):
+        for p in self.positions(item):
+            self.data[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.data[p >> 3] & (1 << (p & 7)) for p in self.positions(item))
+
+    def save(self, path):
+        with open(path + '.tmp', 'wb') as f:
+            f.write(json.dumps({'bits': self.bits, 'hashes': self.hashes, 'count': self.count}).encode() + b'\n')
+            f.write(self.data)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            header = json.loads(f.readline())
+            bloom = cls(bits=header['bits'], hashes=header['hashes'], data=bytearray(f.read()))
+        bloom.count = header['count']
+        return bloom
+
+
+class UrlIndex:
+    def __init__(self, state_dir=STATE_DIR, capacity=1_000_000):
+        self.state_dir = state_dir
+        self.bloom_path = os.path.join(state_dir, 'urls.bloom')
+        self.exact_path = os.path.join(state_dir, 'urls.txt')
+        if os.path.exists(self.bloom_path):
+            self.bloom = BloomFilter.load(self.bloom_path)
+        else:
+            self.bloom = BloomFilter(capacity)
+        self._exact = None
+        self.pending = set()
+        self.bloom_hits = 0
+
+    @property
+    def exact(self):
+        # only loaded once the Bloom filter reports a possible duplicate
+        if self._exact is None:
+            self._exact = set()
+            if os.path.exists(self.exact_path):
+                with open(self.exact_path) as f:
+                    self._exact.update(line.rstrip('\n') for line in f)
+        return self._exact
+
+    def __contains__(self, url):
+        if url not in self.bloom:
+            return False
+        self.bloom_hits += 1
+        return url in self.exact or url in self.pending
+
+    def add(self, url):
+        if url in self:
+            return False
+        self.bloom.add(url)
+        self.pending.add(url)
+        if self._exact is not None:
+            self._exact.add(url)
+        return True
+
+    def save(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        with open(self.exact_path, 'a') as f:
+            f.writelines(u + '\n' for u in sorted(self.pending))
+        self.pending = set()
+        self.bloom.save(self.bloom_path)
+
+
+def new_items(items, index, url_key='url', add=False):
+    """Yield items whose canonical URL is unseen (also deduping within the batch)."""
+    batch = set()
+    for item in items:
+        url = canonical_url(item.get(url_key))
+        if not url or url in batch or url in index:
+            continue
+        batch.add(url)
+        item[url_key] = url
+        if add:
+            index.add(url)
+        yield item
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['seed', 'filter', 'canonical'])
+    parser.add_argument('source', help='snapshot / item file, or a URL for `canonical`')
+    parser.add_argument('--state-dir', default=STATE_DIR)
+    parser.add_argument('--url-key', default=None, help='item field holding the URL')
+    parser.add_argument('--capacity', type=int, default=1_000_000, help='expected distinct URLs')
+    parser.add_argument('--add', action='store_true', help='record emitted items as known')
+    args = parser.parse_args()
+
+    if args.command == 'canonical':
+        print(canonical_url(args.source))
+        return
+
+    index = UrlIndex(args.state_dir, args.capacity)
+    if args.command == 'seed':
+        key = args.url_key or 'original_url'
+        added = sum(index.add(u) for u in map(canonical_url, (r.get(key) for r in read_rows(args.source))) if u)
+        index.save()
+        print(f'{added} canonical URLs recorded ({index.bloom.count} total)', file=sys.stderr)
+        return
+
+    key = args.url_key or 'url'
+    emitted = 0
+    for item in new_items(read_rows(args.source), index, key, add=args.add):
+        sys.stdout.write(json.dumps(item) + '\n')
+        emitted += 1
+    if args.add:
+        index.save()
+    print(f'{emitted} new items ({index.bloom_hits} Bloom hits checked exactly)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""Daily follow-up work lists per lead owner, kept in an incremental priority queue.
+
+Each lead yields at most one task of each kind, due on a fixed date:
+
+  stale        HOT / LAVA lead whose priority has not moved for STALE_AFTER
+               days (due priority_changed_at + that many days)
+  installment  not paid_full and an instalment outstanding: a DOP slot with no
+               amount, or balance_dop with an open balance (due REMIND_BEFORE
+               days before the earliest such date)
+  support      support_date_booked (due the day before, gone after the day)
+  start        upcoming start_date (due REMIND_BEFORE days before, gone after)
+
+Tasks sit in a binary heap keyed by due date. A refresh re-reads only leads
+whose relevant columns changed (by updated_at against DATABASE_URL, by content
+hash for a snapshot file, as ledger.py does) and pushes only the tasks whose
+due date or value moved; replaced and removed tasks are invalidated by
+sequence number and skipped when they surface. Building the list for --as-of
+pops just the tasks already due, so a day's run costs O(changes · log n) plus
+the size of the list itself.
+
+Due tasks are ranked within each owner (owner_id, 'unassigned' when empty) by
+
+    KIND_WEIGHT + PRIORITY_WEIGHT + log10(1 + value) + 0.5 * log2(1 + days overdue)
+
+where value is the open balance for instalments and payment_amount otherwise.
+
+State lives in --state-dir (default .cache/follow-up):
+    state.json          per-lead hash, owner/priority and tasks, the heap,
+                        watermark
+    <as-of>.csv         the day's work list
+    <as-of>-<owner|all>[-top<limit>].csv
+                        the same, filtered by --owner / --limit
+
+Usage:
+    python scripts/follow_up.py --leads db
+    python scripts/follow_up.py --leads "src/assets/All Leads Master Sheet.csv" --as-of 2026-02-01
+    python scripts/follow_up.py --owner <uuid> --limit 20          # from state, no refresh
+"""
+import argparse
+import csv
+import hashlib
+import heapq
+import json
+import math
+import os
+import sys
+from datetime import date, timedelta
+
+from ledger import PAYMENT_SLOTS, cents, parse_day, truthy
+from pg_local import psql_rows
+from snapshots import db_rows, read_rows, table_columns
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+STATE_DIR = os.path.join(ROOT, '.cache', 'follow-up')
+
+LEAD_COLUMNS = ['id', 'full_name', 'owner_id', 'priority', 'priority_changed_at', 'payment_amount',
+                'paid_full', 'is_payment_plan', 'payment_plan', 'balance', 'balance_2', 'balance_dop',
+                'amount_paid', 'date_of_payment', 'amount_paid_2', 'date_of_payment_2',
+                'amount_paid_3', 'date_of_payment_3', 'start_date', 'support_date_booked', 'updated_at']
+STALE_AFTER = {'LAVA': 3, 'HOT': 7}
+REMIND_BEFORE = {'installment': 3, 'support': 1, 'start': 3}
+KIND_WEIGHT = {'installment': 3.0, 'stale': 2.0, 'support': 1.5, 'start': 1.0}
+PRIORITY_WEIGHT = {'LAVA': 3.0, 'HOT': 2.5, 'ACTIVE': 1.5, 'COMPLETED': 1.0, 'COLD': 0.5, 'NOT INTERESTED': 0.0}
+UNASSIGNED = 'unassigned'
+WORKLIST_HEADER = ['owner_id', 'rank', 'lead_id', 'full_name', 'priority', 'task', 'due', 'days_overdue',
+                   'value', 'score']
+
+
+def lead_hash(row):
+    return hashlib.blake2b('\x1f'.join(str(row.get(c) or '') for c in LEAD_COLUMNS[:-1]).encode(),
+                           digest_size=8).hexdigest()
+
+
+def shift(day, days):
+    return (date.fromisoformat(day) + timedelta(days=days)).isoformat()
+
+
+def tasks_for(row):
+    """{kind: [due, expires or None, value cents]} for one lead."""
+    priority = (row.get('priority') or '').strip().upper()
+    price = cents(row.get('payment_amount')) or 0
+    tasks = {}
+
+    changed = parse_day(row.get('priority_changed_at'))
+    if priority in STALE_AFTER and changed:
+        tasks['stale'] = [shift(changed, STALE_AFTER[priority]), None, price]
+
+    if not truthy(row.get('paid_full')):
+        paid = sum(cents(row.get(a)) or 0 for a, _ in PAYMENT_SLOTS)
+        unpaid = [parse_day(row.get(d)) for a, d in PAYMENT_SLOTS if not cents(row.get(a))]
+        balance = (cents(row.get('balance')) or 0) + (cents(row.get('balance_2')) or 0)
+        open_amount = balance or max(price - paid, 0)
+        if open_amount and (balance or paid or truthy(row.get('is_payment_plan')) or row.get('payment_plan')):
+            dates = [d for d in unpaid + [parse_day(row.get('balance_dop'))] if d]
+            if dates:
+                tasks['installment'] = [shift(min(dates), -REMIND_BEFORE['installment']), None, open_amount]
+
+    if priority != 'NOT INTERESTED':
+        for kind, column in (('support', 'support_date_booked'), ('start', 'start_date')):
+            day = parse_day(row.get(column))
+            if day:
+                tasks[kind] = [shift(day, -REMIND_BEFORE[kind]), day, price]
+    return tasks
+
+
+def score(kind, priority, value, overdue):
+    return (KIND_WEIGHT[kind] + PRIORITY_WEIGHT.get(priority, 1.0) + math.log10(1 + value / 100)
+            + 0.5 * math.log2(1 + max(overdue, 0)))
+
+
+class FollowUps:
+    def __init__(self, state_dir=STATE_DIR):
+        self.state_dir = state_dir
+        self.leads = {}    # id -> [hash, {'name', 'owner', 'priority', 'tasks': {kind: [due, expires, value, seq]}}]
+        self.heap = []     # [due, seq, lead id, kind]
+        self.seq = 0
+        self.watermark = None
+        self.pushed = 0
+        self.load()
+
+    def load(self):
+        path = os.path.join(self.state_dir, 'state.json')
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            state = json.load(f)
+        self.leads = state['leads']
+        self.heap = state['heap']  # saved in heap order
+        self.seq = state['seq']
+        self.watermark = state['watermark']
+
+    def save(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = os.path.join(self.state_dir, 'state.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'leads': self.leads, 'heap': self.heap, 'seq': self.seq, 'watermark': self.watermark},
+                      f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+
+    def live(self, entry):
+        lead = self.leads.get(entry[2])
+        task = lead and lead[1]['tasks'].get(entry[3])
+        return task if task and task[3] == entry[1] else None
+
+    def set_tasks(self, lead_id, tasks):
+        old = self.leads[lead_id][1]['tasks']
+        new = {}
+        for kind, (due, expires, value) in tasks.items():
+            prev = old.get(kind)
+            if prev and prev[:3] == [due, expires, value]:
+                new[kind] = prev
+                continue
+            self.seq += 1
+            new[kind] = [due, expires, value, self.seq]
+            heapq.heappush(self.heap, [due, self.seq, lead_id, kind])
+            self.pushed += 1
+        self.leads[lead_id][1]['tasks'] = new
+
+    def fold(self, rows, complete=False):
+        """Refresh changed leads; with complete=True, leads missing from `rows` are dropped."""
+        changed = 0
+        seen = set()
+        for row in rows:
+            lead_id = row['id']
+            seen.add(lead_id)
+            stamp = row.get('updated_at')
+            if stamp and (self.watermark is None or stamp > self.watermark):
+                self.watermark = stamp
+            h = lead_hash(row)
+            prev = self.leads.get(lead_id)
+            if prev is not None and prev[0] == h:
+                continue
+            changed += 1
+            meta = {'name': row.get('full_name') or '', 'owner': row.get('owner_id') or UNASSIGNED,
+                    'priority': (row.get('priority') or '').strip().upper(), 'tasks': prev[1]['tasks'] if prev else {}}
+            self.leads[lead_id] = [h, meta]
+            self.set_tasks(lead_id, tasks_for(row))
+        removed = [i for i in self.leads if i not in seen] if complete else []
+        self.drop(removed)
+        return changed, len(removed)
+
+    def drop(self, ids):
+        for lead_id in ids:
+            self.leads.pop(lead_id, None)  # its heap entries go stale
+
+    def compact(self):
+        """Rebuild the heap from live tasks once stale entries outnumber them."""
+        live = sum(len(lead[1]['tasks']) for lead in self.leads.values())
+        if len(self.heap) <= 2 * live + 1024:
+            return False
+        self.heap = [[t[0], t[3], lead_id, kind] for lead_id, lead in self.leads.items()
+                     for kind, t in lead[1]['tasks'].items()]
+        heapq.heapify(self.heap)
+        return True
+
+    def due(self, as_of, today=None):
+        """Tasks due on `as_of`: [(owner, score, lead id, kind, task)].
+
+        Tasks expired by `as_of` are left out; only those expired before `today`
+        (the real date) are retired, so a look-ahead run loses nothing.
+        """
+        day = as_of.isoformat()
+        retire = min(day, (today or date.today()).isoformat())
+        out, keep = [], []
+        while self.heap and self.heap[0][0] <= day:
+            entry = heapq.heappop(self.heap)
+            task = self.live(entry)
+            if task is None:
+                continue
+            lead = self.leads[entry[2]][1]
+            if task[1] and task[1] < retire:
+                del lead['tasks'][entry[3]]
+                continue
+            keep.append(entry)
+            if task[1] and task[1] < day:
+                continue
+            overdue = (as_of - date.fromisoformat(task[0])).days
+            out.append((lead['owner'], score(entry[3], lead['priority'], task[2], overdue), entry[2], entry[3], task))
+        for entry in keep:  # still open tomorrow unless the lead changes
+            heapq.heappush(self.heap, entry)
+        return out
+
+    def worklists(self, as_of, owner=None, limit=None, today=None):
+        """owner -> ranked rows of WORKLIST_HEADER."""
+        lists = {}
+        for task_owner, s, lead_id, kind, task in self.due(as_of, today):
+            if owner is None or task_owner == owner:
+                lists.setdefault(task_owner, []).append((s, lead_id, kind, task))
+        out = {}
+        for task_owner, items in sorted(lists.items()):
+            items.sort(key=lambda i: (-i[0], i[3][0], i[1]))
+            out[task_owner] = [
+                [task_owner, rank, lead_id, self.leads[lead_id][1]['name'], self.leads[lead_id][1]['priority'],
+                 kind, task[0], (as_of - date.fromisoformat(task[0])).days, f'{task[2] / 100:.2f}', f'{s:.3f}']
+                for rank, (s, lead_id, kind, task) in enumerate(items[:limit], 1)]
+        return out
+
+
+def lead_rows(source, watermark):
+    if source != 'db':
+        return read_rows(source, LEAD_COLUMNS), True
+    present = table_columns('public.leads')
+    columns = [c for c in LEAD_COLUMNS if c in present]
+    where = f"updated_at > '{watermark}'" if watermark else None
+    return db_rows('public.leads', columns, where), watermark is None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--leads', help="'db' or a leads snapshot to refresh from (default: state only)")
+    parser.add_argument('--as-of', type=date.fromisoformat, default=date.today(), help='day to build lists for')
+    parser.add_argument('--owner', help='only this owner_id (or unassigned)')
+    parser.add_argument('--limit', type=int, help='tasks per owner')
+    parser.add_argument('--state-dir', default=STATE_DIR)
+    args = parser.parse_args()
+
+    followups = FollowUps(args.state_dir)
+    if args.leads:
+        rows, complete = lead_rows(args.leads, followups.watermark)
+        changed, removed = followups.fold(rows, complete)
+        if args.leads == 'db' and not complete:
+            # incremental reads cannot see deletes; diff the id list instead
+            live = {r[0] for r in psql_rows('SELECT id FROM public.leads;')}
+            gone = [i for i in followups.leads if i not in live]
+            followups.drop(gone)
+            removed += len(gone)
+        print(f'{changed} leads refreshed, {removed} removed, {followups.pushed} tasks queued '
+              f'({len(followups.leads)} tracked)', file=sys.stderr)
+    if followups.compact():
+        print(f'heap compacted to {len(followups.heap)} tasks', file=sys.stderr)
+
+    lists = followups.worklists(args.as_of, args.owner, args.limit)
+    followups.save()
+    name = args.as_of.isoformat()
+    if args.owner or args.limit:
+        # a filtered list never replaces the day's full one
+        name += f'-{args.owner or "all"}' + (f'-top{args.limit}' if args.limit else '')
+    path = os.path.join(args.state_dir, f'{name}.csv')
+    with open(path + '.tmp', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(WORKLIST_HEADER)
+        for rows in lists.values():
+            writer.writerows(rows)
+    os.replace(path + '.tmp', path)
+
+    for owner, rows in lists.items():
+        print(f'\n{owner} ({len(rows)})')
+        for r in rows:
+            overdue = f'{r[7]}d overdue' if r[7] else 'due today'
+            print(f'{r[1]:>3}. {r[5]:11} {r[3][:28]:28} {r[4]:14} {r[8]:>10}  {overdue:14} {r[9]}')
+    print(f'{sum(len(r) for r in lists.values())} tasks for {len(lists)} owners -> {path}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
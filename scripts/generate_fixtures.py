@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""Generate referentially consistent load-test fixtures as COPY streams.
+
+Produces auth.users, users, companies, cohorts, cohort_memberships, sessions,
+assignments, submissions, chat_rooms, chat_room_members and chat_messages at
+any scale (10k-1M users). Output is deterministic for a given --seed: ids are
+derived from (seed, table, index) rather than stored, so memory stays flat
+no matter how many users are generated.
+
+The stream disables triggers/FK checks for the load (session_replication_role
+= replica) because the generator guarantees consistency itself and the
+handle_new_user trigger would otherwise create a second users row.
+
+Usage:
+    python scripts/generate_fixtures.py --users 100000 > /tmp/fixtures.sql
+    python scripts/generate_fixtures.py --users 100000 --load   # into DATABASE_URL
+"""
+import argparse
+import hashlib
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+from pg_local import copy_header, copy_escape, psql_stream
+
+# Same mock bcrypt hash for 'password' as archive/sql/seed_finasi.sql
+MOCK_PASSWORD_HASH = '$2a$10$vN0wDk.Bv0ZqXW.G9jB8uO4U2A7y8uD2bQ8/x1S8vV3Q.XvR6i8hK'
+INSTANCE_ID = '00000000-0000-0000-0000-000000000000'
+APP_META = '{"provider":"email","providers":["email"]}'
+
+FIRST_NAMES = ['Raya', 'Aleksandra', 'Nisreen', 'Aleena', 'Akshay', 'Logan', 'Nancy', 'Sultan',
+               'Majd', 'Diala', 'Jerome', 'Mohammed', 'Khaled', 'Lina', 'Omar', 'Sara']
+LAST_NAMES = ['Al Shallah', 'Mojse', 'Kayyali', 'Sababan', 'Haddad', 'Khoury', 'Nasser',
+              'Saleh', 'Farah', 'Mansour', 'Aziz', 'Hamdan']
+INDUSTRIES = ['Interior Design', 'Architecture', 'Landscape', 'Product Design', 'Engineering']
+USER_TYPES = ['team', 'management', 'sprint_member']
+OFFERINGS = ['master_class', 'sprint_workshop']
+MESSAGE_WORDS = ['render', 'moodboard', 'client', 'prompt', 'midjourney', 'revision', 'concept',
+                 'lighting', 'facade', 'layout', 'deadline', 'feedback', 'session', 'workflow']
+
+BASE_TIME = datetime(2025, 6, 1, tzinfo=timezone.utc)
+
+
+class Scale:
+    """Row counts derived from the number of users."""
+
+    def __init__(self, users, users_per_company=25, companies_per_cohort=8,
+                 sessions_per_cohort=8, submit_rate=0.6, messages_per_user=3.0):
+        self.users = users
+        self.users_per_company = users_per_company
+        self.companies = max(1, -(-users // users_per_company))
+        self.cohorts = max(1, -(-self.companies // companies_per_cohort))
+        self.sessions_per_cohort = sessions_per_cohort
+        self.submit_rate = submit_rate
+        self.messages = int(users * messages_per_user)
+        # owners/admins sit in company 0 (without a company_id) ahead of its executive
+        self.admins = max(2, min(users // 5000, users_per_company - 1))
+
+
+class Ids:
+    """Deterministic UUIDs keyed by (seed, kind, index)."""
+
+    # low-cardinality kinds are referenced from every row, so memoize them
+    CACHED = {'cohort', 'company', 'room', 'session', 'assignment'}
+
+    def __init__(self, seed):
+        self.prefix = f'{seed}:'.encode()
+        self.cache = {}
+
+    def __call__(self, kind, i):
+        if kind in self.CACHED:
+            key = (kind, i)
+            if key not in self.cache:
+                self.cache[key] = self.make(kind, i)
+            return self.cache[key]
+        return self.make(kind, i)
+
+    def make(self, kind, i):
+        h = hashlib.blake2b(self.prefix + kind.encode() + b':%d' % i, digest_size=16).hexdigest()
+        # stamp version 4 / RFC 4122 variant bits so the ids look like gen_random_uuid()
+        return f'{h[:8]}-{h[8:12]}-4{h[13:16]}-{"89ab"[int(h[16], 16) & 3]}{h[17:20]}-{h[20:]}'
+
+
+def ts(seconds):
+    return (BASE_TIME + timedelta(seconds=seconds)).isoformat()
+
+
+def line(values):
+    return '\t'.join(copy_escape(v) for v in values) + '\n'
+
+
+def company_of(user, scale):
+    return user // scale.users_per_company
+
+
+def cohort_of_company(company, scale):
+    return company % scale.cohorts
+
+
+def executive_of(company, scale):
+    return max(company * scale.users_per_company, scale.admins)
+
+
+def user_role(user, scale):
+    if user == 0:
+        return 'owner'
+    if user < scale.admins:
+        return 'admin'
+    if user == executive_of(company_of(user, scale), scale):
+        return 'executive'
+    return 'participant'
+
+
+def full_name(user):
+    return f'{FIRST_NAMES[user % len(FIRST_NAMES)]} {LAST_NAMES[(user // 7) % len(LAST_NAMES)]} {user}'
+
+
+def email(user, scale):
+    return f'user{user}@studio{company_of(user, scale)}.fixture.test'
+
+
+def extra_cohort(user, scale, rng):
+    """~10% of users also join a second cohort."""
+    if scale.cohorts < 2 or rng.random() >= 0.1:
+        return None
+    home = cohort_of_company(company_of(user, scale), scale)
+    return (home + 1 + rng.randrange(scale.cohorts - 1)) % scale.cohorts
+
+
+def gen_cohorts(ids, scale, rng):
+    yield copy_header('public.cohorts', ['id', 'name', 'start_date', 'end_date', 'status', 'offering_type'])
+    for c in range(scale.cohorts):
+        start = BASE_TIME.date() + timedelta(days=14 * c)
+        status = 'completed' if c < scale.cohorts // 2 else 'active'
+        yield line([ids('cohort', c), f'Fixture Cohort {c}', start.isoformat(),
+                    (start + timedelta(days=30)).isoformat(), status, OFFERINGS[c % 2]])
+    yield '\\.\n'
+
+
+def gen_companies(ids, scale, rng):
+    yield copy_header('public.companies', ['id', 'name', 'industry', 'cohort_id', 'executive_user_id', 'team_size'])
+    for c in range(scale.companies):
+        exec_user = executive_of(c, scale)
+        size = min(scale.users_per_company, scale.users - c * scale.users_per_company)
+        yield line([ids('company', c), f'Fixture Studio {c}', INDUSTRIES[c % len(INDUSTRIES)],
+                    ids('cohort', cohort_of_company(c, scale)), ids('user', exec_user), size])
+    yield '\\.\n'
+
+
+def gen_auth_users(ids, scale, rng):
+    yield copy_header('auth.users', ['id', 'instance_id', 'aud', 'role', 'email', 'encrypted_password',
+                                     'email_confirmed_at', 'created_at', 'updated_at',
+                                     'raw_app_meta_data', 'raw_user_meta_data', 'is_super_admin'])
+    for u in range(scale.users):
+        created = ts(u * 30)
+        yield line([ids('user', u), INSTANCE_ID, 'authenticated', 'authenticated', email(u, scale),
+                    MOCK_PASSWORD_HASH, created, created, created, APP_META, '{}', False])
+    yield '\\.\n'
+
+
+def gen_users(ids, scale, rng):
+    yield copy_header('public.users', ['id', 'email', 'full_name', 'role', 'user_type', 'company_id',
+                                       'onboarding_completed', 'ai_readiness_score', 'created_at'])
+    for u in range(scale.users):
+        role = user_role(u, scale)
+        user_type = 'management' if role == 'executive' else USER_TYPES[u % len(USER_TYPES)]
+        company = None if role in ('owner', 'admin') else ids('company', company_of(u, scale))
+        yield line([ids('user', u), email(u, scale), full_name(u), role, user_type, company,
+                    rng.random() < 0.8, rng.randrange(101), ts(u * 30)])
+    yield '\\.\n'
+
+
+def gen_memberships(ids, scale, rng):
+    yield copy_header('public.cohort_memberships', ['id', 'user_id', 'cohort_id', 'created_at'])
+    n = 0
+    for u in range(scale.admins, scale.users):
+        home = cohort_of_company(company_of(u, scale), scale)
+        for cohort in (home, extra_cohort(u, scale, rng)):
+            if cohort is None:
+                continue
+            yield line([ids('membership', n), ids('user', u), ids('cohort', cohort), ts(u * 30 + 60)])
+            n += 1
+    yield '\\.\n'
+
+
+def gen_sessions(ids, scale, rng):
+    yield copy_header('public.sessions', ['id', 'cohort_id', 'session_number', 'title',
+                                          'scheduled_date', 'session_date', 'status'])
+    for c in range(scale.cohorts):
+        for s in range(scale.sessions_per_cohort):
+            k = c * scale.sessions_per_cohort + s
+            when = ts((14 * c + 3 * s) * 86400)
+            status = 'completed' if c < scale.cohorts // 2 else 'scheduled'
+            yield line([ids('session', k), ids('cohort', c), s + 1, f'Session {s + 1}', when, when, status])
+    yield '\\.\n'
+
+
+def gen_assignments(ids, scale, rng):
+    yield copy_header('public.assignments', ['id', 'session_id', 'title', 'due_date', 'submission_format'])
+    for k in range(scale.cohorts * scale.sessions_per_cohort):
+        yield line([ids('assignment', k), ids('session', k), f'Assignment {k}',
+                    ts((14 * (k // scale.sessions_per_cohort) + 3 * (k % scale.sessions_per_cohort) + 7) * 86400),
+                    'any'])
+    yield '\\.\n'
+
+
+def gen_submissions(ids, scale, rng):
+    yield copy_header('public.submissions', ['id', 'assignment_id', 'user_id', 'content',
+                                             'submitted_at', 'status', 'score'])
+    n = 0
+    per = scale.sessions_per_cohort
+    for u in range(scale.admins, scale.users):
+        cohort = cohort_of_company(company_of(u, scale), scale)
+        for s in range(per):
+            if rng.random() >= scale.submit_rate:
+                continue
+            k = cohort * per + s
+            reviewed = rng.random() < 0.7
+            yield line([ids('submission', n), ids('assignment', k), ids('user', u),
+                        '{"type":"link","url":"https://example.com/%d"}' % n,
+                        ts((14 * cohort + 3 * s + 5) * 86400 + rng.randrange(86400)),
+                        'reviewed' if reviewed else 'pending',
+                        rng.randrange(40, 101) if reviewed else None])
+            n += 1
+    yield '\\.\n'
+
+
+def room_count(scale):
+    # one workspace room per cohort, one group room per company
+    return scale.cohorts + scale.companies
+
+
+def gen_rooms(ids, scale, rng):
+    yield copy_header('public.chat_rooms', ['id', 'company_id', 'cohort_id', 'name', 'type',
+                                            'created_by', 'created_at', 'updated_at'])
+    for c in range(scale.cohorts):
+        yield line([ids('room', c), None, ids('cohort', c), f'Fixture Cohort {c}', 'workspace',
+                    ids('user', 0), ts(0), ts(0)])
+    for c in range(scale.companies):
+        yield line([ids('room', scale.cohorts + c), ids('company', c), None, f'Fixture Studio {c}',
+                    'group', ids('user', executive_of(c, scale)), ts(0), ts(0)])
+    yield '\\.\n'
+
+
+def gen_room_members(ids, scale, rng):
+    yield copy_header('public.chat_room_members', ['id', 'room_id', 'user_id', 'role', 'joined_at'])
+    n = 0
+    for u in range(scale.users):
+        company = company_of(u, scale)
+        rooms = [scale.cohorts + company]
+        if u >= scale.admins:
+            rooms.append(cohort_of_company(company, scale))
+        role = 'admin' if user_role(u, scale) != 'participant' else 'member'
+        for r in rooms:
+            yield line([ids('room_member', n), ids('room', r), ids('user', u), role, ts(u * 30)])
+            n += 1
+    yield '\\.\n'
+
+
+def gen_messages(ids, scale, rng):
+    yield copy_header('public.chat_messages', ['id', 'room_id', 'sender_id', 'body', 'message_type',
+                                               'parent_id', 'forwarded_from', 'reactions',
+                                               'metadata', 'created_at'])
+    last_in_room = {}
+    span = 180 * 86400
+    step = span / max(1, scale.messages)
+    for m in range(scale.messages):
+        u = rng.randrange(scale.admins, scale.users) if scale.users > scale.admins else 0
+        company = company_of(u, scale)
+        room = scale.cohorts + company if rng.random() < 0.6 else cohort_of_company(company, scale)
+        parent = last_in_room.get(room) if rng.random() < 0.15 else None
+        body = ' '.join(rng.choice(MESSAGE_WORDS) for _ in range(rng.randrange(3, 15)))
+        yield line([ids('message', m), ids('room', room), ids('user', u), body, 'text',
+                    ids('message', parent) if parent is not None else None, None,
+                    '{}', '{}', ts(int(m * step))])
+        last_in_room[room] = m
+    yield '\\.\n'
+
+
+GENERATORS = [
+    ('cohorts', gen_cohorts),
+    ('companies', gen_companies),
+    ('auth_users', gen_auth_users),
+    ('users', gen_users),
+    ('cohort_memberships', gen_memberships),
+    ('sessions', gen_sessions),
+    ('assignments', gen_assignments),
+    ('submissions', gen_submissions),
+    ('chat_rooms', gen_rooms),
+    ('chat_room_members', gen_room_members),
+    ('chat_messages', gen_messages),
+]
+
+
+def generate(scale, seed=42, tables=None):
+    """Yield the complete fixture script as text chunks."""
+    ids = Ids(seed)
+    yield 'BEGIN;\nSET LOCAL session_replication_role = replica;\n'
+    for name, gen in GENERATORS:
+        if tables and name not in tables:
+            continue
+        # each table gets its own RNG so selecting a subset doesn't change the rest
+        yield from gen(ids, scale, random.Random(f'{seed}:{name}'))
+    yield 'COMMIT;\nANALYZE;\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--users-per-company', type=int, default=25)
+    parser.add_argument('--messages-per-user', type=float, default=3.0)
+    parser.add_argument('--tables', help='comma-separated subset of ' + ', '.join(n for n, _ in GENERATORS))
+    parser.add_argument('--load', action='store_true', help='stream straight into DATABASE_URL')
+    args = parser.parse_args()
+
+    scale = Scale(args.users, users_per_company=args.users_per_company,
+                  messages_per_user=args.messages_per_user)
+    tables = set(args.tables.split(',')) if args.tables else None
+    chunks = generate(scale, args.seed, tables)
+    if args.load:
+        psql_stream(chunks)
+        print(f'Loaded {scale.users} users, {scale.companies} companies, {scale.cohorts} cohorts, '
+              f'{scale.messages} messages', file=sys.stderr)
+    else:
+        out = sys.stdout
+        for chunk in chunks:
+            out.write(chunk)
+
+
+if __name__ == '__main__':
+    main()
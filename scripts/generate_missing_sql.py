@@ -2,6 +2,8 @@ import csv
 import json
 import re
 
+from generate_seed_sql import COL_MAP, ColumnTypes, clean, custom_fields_sql, lead_columns_sql, unmapped_columns
+
 # Key mapping from original script
 key_map = {
     'Entry ID': 'id',
@@ -102,9 +104,12 @@ def sql_val(col, val):
     return f"'{val}'"
 
 rows_processed = []
+types = ColumnTypes()
 
 with open(csv_path, 'r') as f:
     reader = csv.DictReader(f)
+    # columns neither map knows go to custom_fields instead of being dropped
+    custom = unmapped_columns(reader.fieldnames, known=set(COL_MAP) | set(key_map))
     for row in reader:
         eid = row.get('Entry ID')
         if eid in missing_ids_list:
@@ -112,6 +117,14 @@ with open(csv_path, 'r') as f:
             for csv_key, db_key in key_map.items():
                 val = row.get(csv_key)
                 new_row[db_key] = val
+            extras = {}
+            for i, _, key in custom:
+                val = clean(row.get(reader.fieldnames[i]) or '')
+                if val is not None:
+                    extras[key] = val
+                    types.observe(key, val)
+            if extras:
+                new_row['custom_fields'] = extras
             rows_processed.append(new_row)
 
 print(f"Generating SQL for {len(rows_processed)} missing rows...")
@@ -126,10 +139,13 @@ if rows_processed:
 
     rows_sql = []
     for row in rows_processed:
-        vals = [sql_val(c, row.get(c)) for c in cols]
+        vals = [custom_fields_sql(row.get(c, {}), types) if c == 'custom_fields' else sql_val(c, row.get(c))
+                for c in cols]
         rows_sql.append('(' + ', '.join(vals) + ')')
 
     sql = 'INSERT INTO public.leads (' + ', '.join(cols) + ') VALUES ' + ', '.join(rows_sql) + ';'
+    if custom:
+        sql = lead_columns_sql(custom, types) + '\n' + sql
     
     with open('/tmp/leads_missing_fix.sql', 'w') as f:
         f.write(sql)
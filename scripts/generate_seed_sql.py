@@ -1,7 +1,16 @@
 #!/usr/bin/env python3
-"""Generate SQL INSERT statements from the Leads CSV file."""
+"""Generate SQL INSERT statements from the Leads CSV file.
+
+Columns not in COL_MAP are not dropped: each one is registered as a custom
+lead_columns row (type inferred from a sample of its values) and every row's
+extra values are packed into leads.custom_fields, in the same pass over the
+CSV as the core fields.
+"""
 import csv
+import json
 import os
+import re
+from datetime import date
 
 CSV_PATH = os.path.join(os.path.dirname(__file__), '..', 'src', 'assets', 'All Leads Master Sheet.csv')
 
@@ -59,6 +68,12 @@ DATE_COLS = {
     'support_date_booked',
 }
 TS_COLS = {'priority_changed_at'}
+ARRAY_COLS = {'priority_previous_values'}  # the sheet writes text[] cells as 'LAVA,HOT'
+
+# custom columns: keys are derived from the header so re-imports land on the same lead_columns row
+CUSTOM_PREFIX = 'custom_'
+TYPE_SAMPLE = 200
+BOOL_VALUES = {'yes': True, 'no': False, 'true': True, 'false': False, 'y': True, 'n': False}
 
 
 def clean(val):
@@ -89,34 +104,135 @@ def sql_val(col, val):
         return 'TRUE' if val.lower() in ('yes', 'true') else 'FALSE'
     if col in TS_COLS:
         return "'" + val.replace("'", "''") + "'"
+    if col in ARRAY_COLS:
+        items = [v.strip().strip('"') for v in val.strip('{}').split(',') if v.strip()]
+        return "'{" + ','.join('"' + v.replace('\\', '\\\\').replace('"', '\\"').replace("'", "''") + '"'
+                               for v in items) + "}'"
     return "'" + val.replace("'", "''") + "'"
 
 
-def main():
-    with open(CSV_PATH, 'r') as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
+def custom_key(header):
+    return CUSTOM_PREFIX + (re.sub(r'[^a-z0-9]+', '_', header.strip().lower()).strip('_') or 'column')
+
+
+def unmapped_columns(headers, known=COL_MAP):
+    """(index, label, key) for every header that has no leads column."""
+    out = []
+    keys = set()
+    for i, h in enumerate(headers):
+        if h in known or h.strip() in ('', 'Balance'):
+            continue
+        key = custom_key(h)
+        if key in keys:
+            key = f'{key}_{i}'
+        keys.add(key)
+        out.append((i, h.strip(), key))
+    return out
+
+
+def number(val):
+    return float(val.replace('$', '').replace(',', '').replace('%', ''))
+
+
+def is_date(val):
+    try:
+        date.fromisoformat(val[:10])
+        return True
+    except ValueError:
+        return False
+
+
+class ColumnTypes:
+    """Narrow each custom column to boolean / number / date / text from its first values."""
+
+    CHECKS = {
+        'boolean': lambda v: v.lower() in BOOL_VALUES,
+        'number': lambda v: bool(re.fullmatch(r'[$]?-?[\d,]*\.?\d+%?', v)),
+        'date': is_date,
+    }
+
+    def __init__(self):
+        self.candidates = {}
+        self.seen = {}
 
+    def observe(self, key, val):
+        if self.seen.get(key, 0) >= TYPE_SAMPLE:
+            return
+        self.seen[key] = self.seen.get(key, 0) + 1
+        left = self.candidates.setdefault(key, list(self.CHECKS))
+        left[:] = [t for t in left if self.CHECKS[t](val)]
+
+    def type(self, key):
+        left = self.candidates.get(key)
+        return left[0] if left else 'text'
+
+
+def coerce(col_type, val):
+    """JSON value for custom_fields; values the sample did not anticipate stay strings."""
+    try:
+        if col_type == 'boolean':
+            return BOOL_VALUES[val.lower()]
+        if col_type == 'number':
+            n = number(val)
+            return int(n) if n.is_integer() else n
+        if col_type == 'date' and is_date(val):
+            return val[:10]
+    except (KeyError, ValueError):
+        pass
+    return val
+
+
+def custom_fields_sql(extras, types):
+    fields = {k: coerce(types.type(k), v) for k, v in extras.items()}
+    return "'" + json.dumps(fields, ensure_ascii=False).replace("'", "''") + "'::jsonb"
+
+
+def lead_columns_sql(columns, types):
+    """Register all custom columns in one statement, appended after the existing ones."""
+    values = ', '.join(
+        "('" + key + "', '" + label.replace("'", "''") + "', '" + types.type(key) + "', " + str(n) + ')'
+        for n, (_, label, key) in enumerate(columns)
+    )
+    return ('INSERT INTO public.lead_columns (key, label, type, is_custom, visible, order_index) '
+            'SELECT v.key, v.label, v.type, true, true, '
+            '(SELECT COALESCE(MAX(order_index), -1) + 1 FROM public.lead_columns) + v.n '
+            f'FROM (VALUES {values}) AS v(key, label, type, n) '
+            'ON CONFLICT (key) DO NOTHING;')
+
+
+def main():
+    types = ColumnTypes()
     all_processed = []
-    for row in rows:
-        rec = {}
-        for csv_col, db_col in COL_MAP.items():
-            v = clean(row.get(csv_col, ''))
-            if v is not None:
-                rec[db_col] = v
-
-        headers = list(row.keys())
-        balance_indices = [i for i, h in enumerate(headers) if h.strip() == 'Balance']
-        if len(balance_indices) >= 1:
-            v = clean(list(row.values())[balance_indices[0]])
-            if v:
-                rec['balance'] = v
-        if len(balance_indices) >= 2:
-            v = clean(list(row.values())[balance_indices[1]])
-            if v:
-                rec['balance_2'] = v
-
-        all_processed.append(rec)
+    with open(CSV_PATH, newline='') as f:
+        reader = csv.reader(f)
+        headers = next(reader)
+        mapped = [(i, COL_MAP[h]) for i, h in enumerate(headers) if h in COL_MAP]
+        # the sheet has two 'Balance ' columns: balance, then balance_2
+        balances = [i for i, h in enumerate(headers) if h.strip() == 'Balance']
+        custom = unmapped_columns(headers)
+        for row in reader:
+            if not any(row):
+                continue
+            rec = {}
+            for i, db_col in mapped + list(zip(balances, ('balance', 'balance_2'))):
+                v = clean(row[i]) if i < len(row) else None
+                if v is not None:
+                    rec[db_col] = v
+            extras = {}
+            for i, _, key in custom:
+                v = clean(row[i]) if i < len(row) else None
+                if v is not None:
+                    extras[key] = v
+                    types.observe(key, v)
+            if extras:
+                rec['custom_fields'] = extras
+            all_processed.append(rec)
+
+    if custom:
+        with open('/tmp/leads_b5_columns.sql', 'w') as f:
+            f.write(lead_columns_sql(custom, types))
+        print(f'{len(custom)} unmapped columns registered in /tmp/leads_b5_columns.sql (run it first): '
+              + ', '.join(f'{label} ({types.type(key)})' for _, label, key in custom))
 
     # Collect all existing columns from all rows
     all_cols = set()
@@ -134,7 +250,8 @@ def main():
 
         rows_sql = []
         for row in batch:
-            vals = [sql_val(c, row.get(c)) for c in cols]
+            vals = [custom_fields_sql(row.get(c, {}), types) if c == 'custom_fields' else sql_val(c, row.get(c))
+                    for c in cols]
             rows_sql.append('(' + ', '.join(vals) + ')')
 
         sql = 'INSERT INTO public.leads (' + ', '.join(cols) + ') VALUES ' + ', '.join(rows_sql) + ' ON CONFLICT (id) DO NOTHING;'
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""Ranked fuzzy search over lead names, emails, companies, notes and descriptions.
+
+leads only has btree indexes, so searching notes ("paid her 1st installment",
+coupon codes, ...) is a substring scan. This keeps an inverted index next to a
+leads snapshot:
+
+  * token postings: token -> (doc, weight) pairs, delta + varint encoded and
+    decoded only when a query touches the token;
+  * vocabulary trigrams: trigram -> token ids, so a misspelt or partial query
+    term expands to similar tokens (pg_trgm similarity, default 0.3) without
+    looking at any document.
+
+Updates are incremental: each lead's text is hashed, a changed lead gets a new
+doc number and its old one is tombstoned. Once tombstones pass 25% of the docs,
+postings are rewritten without them (no source text needed).
+
+State lives in --state-dir (default .cache/lead-search):
+    index.bin   zlib-compressed header (docs, vocab, trigrams), then an
+                uncompressed offset table and the postings and trigram lists
+                zlib-compressed BLOCK_KEYS at a time. A query maps the file
+                and decompresses only the blocks holding the lists it reads.
+
+Usage:
+    python scripts/lead_search.py build db:public.leads      # or a CSV/JSON snapshot
+    python scripts/lead_search.py query 'instalment coupon' -k 20
+    python scripts/lead_search.py stats
+"""
+import argparse
+import hashlib
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+import unicodedata
+import zlib
+
+from snapshots import read_rows
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+STATE_DIR = os.path.join(ROOT, '.cache', 'lead-search')
+
+MAGIC = b'LIDX2\n'
+LAYOUT = struct.Struct('>III')         # header bytes, blobs, blocks
+BLOCK_OFFSET = struct.Struct('>Q')     # file offset of each block, plus the end of the last
+KEY_END = struct.Struct('>I')          # end of each blob within its decompressed block
+BLOCK_KEYS = 64
+FIELD_WEIGHTS = {'full_name': 3, 'company_name': 2, 'email': 2, 'notes': 1, 'description': 1}
+SIMILARITY = 0.3
+MAX_EXPANSIONS = 16
+COMPACT_RATIO = 0.25
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', text.lower())
+    return TOKEN_RE.findall(text.encode('ascii', 'ignore').decode())
+
+
+def trigrams(token):
+    # same padding as pg_trgm: two blanks in front, one behind
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def encode(pairs):
+    """Varint-encode (delta doc, weight) pairs; docs must be ascending."""
+    out = bytearray()
+    prev = 0
+    for doc, weight in pairs:
+        for v in (doc - prev, weight):
+            while v >= 0x80:
+                out.append((v & 0x7f) | 0x80)
+                v >>= 7
+            out.append(v)
+        prev = doc
+    return bytes(out)
+
+
+def decode(data):
+    values = []
+    v = shift = 0
+    for b in data:
+        v |= (b & 0x7f) << shift
+        if b & 0x80:
+            shift += 7
+        else:
+            values.append(v)
+            v = shift = 0
+    pairs = []
+    doc = 0
+    for i in range(0, len(values), 2):
+        doc += values[i]
+        pairs.append((doc, values[i + 1]))
+    return pairs
+
+
+def encode_ids(ids):
+    return encode((i, 0) for i in ids)
+
+
+def decode_ids(data):
+    return [doc for doc, _ in decode(data)]
+
+
+def lead_terms(row):
+    """Token -> summed field weight for one lead."""
+    terms = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(row.get(field)):
+            terms[token] = terms.get(token, 0) + weight
+    return terms
+
+
+def lead_hash(row):
+    return hashlib.blake2b('\x1f'.join(row.get(f) or '' for f in FIELD_WEIGHTS).encode(),
+                           digest_size=8).hexdigest()
+
+
+class Postings:
+    """Encoded blobs from disk plus decoded, mutable lists for touched keys."""
+
+    def __init__(self, blobs=None, pair_codec=True):
+        self.blobs = blobs or {}
+        self.live = {}
+        self.pair_codec = pair_codec
+
+    def get(self, key):
+        if key in self.live:
+            return self.live[key]
+        blob = self.blobs.get(key)
+        if blob is None:
+            return []
+        return decode(blob) if self.pair_codec else decode_ids(blob)
+
+    def append(self, key, item):
+        if key not in self.live:
+            self.live[key] = self.get(key)
+            self.blobs.pop(key, None)
+        self.live[key].append(item)
+
+    def __contains__(self, key):
+        return key in self.live or key in self.blobs
+
+    def keys(self):
+        return self.blobs.keys() | self.live.keys()
+
+    def blob(self, key):
+        if key in self.live:
+            items = self.live[key]
+            return encode(items) if self.pair_codec else encode_ids(items)
+        return self.blobs[key]
+
+    def size(self, key):
+        if key in self.live:
+            return len(self.live[key])
+        blob = self.blobs.get(key)
+        return 0 if blob is None else sum(1 for b in blob if not b & 0x80) // 2
+
+
+class LeadIndex:
+    def __init__(self):
+        self.docs = []          # doc -> [lead_id, hash, title]
+        self.by_lead = {}       # lead_id -> doc
+        self.deleted = set()
+        self.vocab = []         # token id -> token
+        self.token_ids = {}
+        self.postings = Postings()                     # token id -> [(doc, weight)]
+        self.grams = Postings(pair_codec=False)        # trigram -> [token id]
+        self.gram_counts = {}
+
+    # -- building -----------------------------------------------------------
+
+    def token_id(self, token):
+        tid = self.token_ids.get(token)
+        if tid is None:
+            tid = self.token_ids[token] = len(self.vocab)
+            self.vocab.append(token)
+            for gram in trigrams(token):
+                self.grams.append(gram, tid)
+        return tid
+
+    def add(self, row):
+        doc = len(self.docs)
+        self.docs.append([row['id'], lead_hash(row), row.get('full_name') or ''])
+        self.by_lead[row['id']] = doc
+        for token, weight in lead_terms(row).items():
+            self.postings.append(self.token_id(token), (doc, weight))
+
+    def remove(self, lead_id):
+        doc = self.by_lead.pop(lead_id, None)
+        if doc is not None:
+            self.deleted.add(doc)
+
+    def update(self, rows, complete=False):
+        seen = set()
+        added = 0
+        for row in rows:
+            lead_id = row.get('id')
+            if not lead_id:
+                continue
+            seen.add(lead_id)
+            doc = self.by_lead.get(lead_id)
+            if doc is not None and self.docs[doc][1] == lead_hash(row):
+                continue
+            self.remove(lead_id)
+            self.add(row)
+            added += 1
+        removed = 0
+        if complete:
+            for lead_id in [i for i in self.by_lead if i not in seen]:
+                self.remove(lead_id)
+                removed += 1
+        if self.docs and len(self.deleted) > COMPACT_RATIO * len(self.docs):
+            self.compact()
+        return added, removed
+
+    def compact(self):
+        """Drop tombstoned docs and renumber the survivors."""
+        remap = {}
+        docs = []
+        for doc, meta in enumerate(self.docs):
+            if doc not in self.deleted:
+                remap[doc] = len(docs)
+                docs.append(meta)
+        postings = Postings()
+        for tid in self.postings.keys():
+            kept = [(remap[d], w) for d, w in self.postings.get(tid) if d in remap]
+            if kept:
+                postings.blobs[tid] = encode(kept)
+        self.docs = docs
+        self.by_lead = {meta[0]: doc for doc, meta in enumerate(docs)}
+        self.deleted = set()
+        self.postings = postings
+
+    # -- querying -----------------------------------------------------------
+
+    def gram_count(self, tid):
+        count = self.gram_counts.get(tid)
+        if count is None:
+            count = self.gram_counts[tid] = len(trigrams(self.vocab[tid]))
+        return count
+
+    def expand(self, token):
+        """Vocabulary tokens similar to `token`, as (token id, similarity)."""
+        grams = trigrams(token)
+        shared = {}
+        for gram in grams:
+            for tid in self.grams.get(gram):
+                shared[tid] = shared.get(tid, 0) + 1
+        out = []
+        for tid, n in shared.items():
+            sim = n / (len(grams) + self.gram_count(tid) - n)
+            if sim >= SIMILARITY:
+                out.append((tid, sim))
+        exact = self.token_ids.get(token)
+        if exact is not None and all(t != exact for t, _ in out):
+            out.append((exact, 1.0))
+        out.sort(key=lambda x: -x[1])
+        return out[:MAX_EXPANSIONS]
+
+    def search(self, query, k=10):
+        live_docs = max(1, len(self.docs) - len(self.deleted))
+        scores = {}
+        matched = {}
+        terms = tokenize(query)
+        for qi, token in enumerate(terms):
+            best = {}
+            for tid, sim in self.expand(token):
+                idf = math.log(1 + live_docs / (1 + self.postings.size(tid)))
+                for doc, weight in self.postings.get(tid):
+                    if doc in self.deleted:
+                        continue
+                    s = sim * idf * (1 + math.log(weight))
+                    if s > best.get(doc, 0):
+                        best[doc] = s
+            for doc, s in best.items():
+                scores[doc] = scores.get(doc, 0) + s
+                matched[doc] = matched.get(doc, 0) + 1
+        # docs matching more of the query terms always rank first
+        ranked = sorted(scores, key=lambda d: (-matched[d], -scores[d]))[:k]
+        return [(self.docs[d][0], self.docs[d][2], round(scores[d], 3), matched[d], len(terms))
+                for d in ranked]
+
+    # -- persistence --------------------------------------------------------
+
+    def save(self, path):
+        keys = [self.postings.blob(tid) if tid in self.postings else b'' for tid in range(len(self.vocab))]
+        grams = sorted(self.grams.keys())
+        keys += [self.grams.blob(gram) for gram in grams]
+        header = zlib.compress(json.dumps({
+            'docs': self.docs, 'deleted': sorted(self.deleted), 'vocab': self.vocab, 'grams': grams,
+        }, separators=(',', ':')).encode(), 6)
+        blocks, ends = [], []
+        for i in range(0, len(keys), BLOCK_KEYS):
+            chunk = keys[i:i + BLOCK_KEYS]
+            end = 0
+            for blob in chunk:
+                end += len(blob)
+                ends.append(end)
+            blocks.append(zlib.compress(b''.join(chunk), 6))
+        pos = len(MAGIC) + LAYOUT.size + len(header) + BLOCK_OFFSET.size * (len(blocks) + 1) + KEY_END.size * len(keys)
+        offsets = [pos]
+        for block in blocks:
+            offsets.append(offsets[-1] + len(block))
+        with open(path + '.tmp', 'wb') as f:
+            f.write(MAGIC)
+            f.write(LAYOUT.pack(len(header), len(keys), len(blocks)))
+            f.write(header)
+            f.write(b''.join(BLOCK_OFFSET.pack(o) for o in offsets))
+            f.write(b''.join(KEY_END.pack(e) for e in ends))
+            for block in blocks:
+                f.write(block)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        pack = IndexFile(path)
+        header = pack.header
+        index = cls()
+        index.docs = header['docs']
+        index.deleted = set(header['deleted'])
+        index.vocab = header['vocab']
+        index.token_ids = {t: i for i, t in enumerate(index.vocab)}
+        index.by_lead = {meta[0]: doc for doc, meta in enumerate(index.docs) if doc not in index.deleted}
+        index.postings.blobs = PackedBlobs(pack, {tid: tid for tid in range(len(index.vocab))})
+        index.grams.blobs = PackedBlobs(pack, {gram: len(index.vocab) + i for i, gram in enumerate(header['grams'])})
+        return index
+
+
+class IndexFile:
+    """index.bin mapped read-only; a block of blobs is decompressed the first time one of them is read."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a lead search index (rebuild with `build --full`)')
+        header_size, self.keys, blocks = LAYOUT.unpack_from(self.data, len(MAGIC))
+        pos = len(MAGIC) + LAYOUT.size
+        self.header = json.loads(zlib.decompress(self.data[pos:pos + header_size]))
+        self.block_table = pos + header_size
+        self.key_table = self.block_table + BLOCK_OFFSET.size * (blocks + 1)
+        self.blocks = {}
+
+    def block(self, n):
+        data = self.blocks.get(n)
+        if data is None:
+            start, = BLOCK_OFFSET.unpack_from(self.data, self.block_table + BLOCK_OFFSET.size * n)
+            end, = BLOCK_OFFSET.unpack_from(self.data, self.block_table + BLOCK_OFFSET.size * (n + 1))
+            data = self.blocks[n] = zlib.decompress(self.data[start:end])
+        return data
+
+    def blob(self, i):
+        end, = KEY_END.unpack_from(self.data, self.key_table + KEY_END.size * i)
+        start = KEY_END.unpack_from(self.data, self.key_table + KEY_END.size * (i - 1))[0] if i % BLOCK_KEYS else 0
+        return self.block(i // BLOCK_KEYS)[start:end]
+
+
+class PackedBlobs:
+    """The blobs dict of a loaded Postings: key -> blob read from the IndexFile on demand."""
+
+    def __init__(self, pack, positions):
+        self.pack = pack
+        self.positions = positions   # key -> blob number in the file
+        self.added = {}
+
+    def get(self, key, default=None):
+        if key in self.added:
+            return self.added[key]
+        i = self.positions.get(key)
+        return default if i is None else self.pack.blob(i)
+
+    def __getitem__(self, key):
+        blob = self.get(key)
+        if blob is None:
+            raise KeyError(key)
+        return blob
+
+    def __setitem__(self, key, blob):
+        self.added[key] = blob
+
+    def pop(self, key, default=None):
+        blob = self.get(key, default)
+        self.added.pop(key, None)
+        self.positions.pop(key, None)
+        return blob
+
+    def __contains__(self, key):
+        return key in self.added or key in self.positions
+
+    def keys(self):
+        return self.positions.keys() | self.added.keys()
+
+
+def open_index(state_dir, fresh=False):
+    path = os.path.join(state_dir, 'index.bin')
+    return (LeadIndex.load(path) if os.path.exists(path) and not fresh else LeadIndex()), path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['build', 'query', 'stats'])
+    parser.add_argument('arg', nargs='?', help='snapshot for `build`, text for `query`')
+    parser.add_argument('--state-dir', default=STATE_DIR)
+    parser.add_argument('--full', action='store_true', help='rebuild from scratch')
+    parser.add_argument('--partial', action='store_true',
+                        help='snapshot holds only changed leads (do not drop missing ones)')
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'build':
+        os.makedirs(args.state_dir, exist_ok=True)
+        index, path = open_index(args.state_dir, fresh=args.full)
+        added, removed = index.update(read_rows(args.arg), complete=not args.partial)
+        index.save(path)
+        print(f'{added} leads indexed, {removed} removed; {len(index.by_lead)} live docs, '
+              f'{len(index.vocab)} tokens ({time.perf_counter() - start:.2f}s)', file=sys.stderr)
+        return
+
+    index, path = open_index(args.state_dir)
+    if args.command == 'stats':
+        print(json.dumps({'docs': len(index.docs), 'live': len(index.by_lead), 'deleted': len(index.deleted),
+                          'tokens': len(index.vocab), 'trigrams': len(index.grams.keys()),
+                          'bytes': os.path.getsize(path) if os.path.exists(path) else 0}))
+        return
+    loaded = time.perf_counter()
+    for lead_id, name, score, matched, total in index.search(args.arg or '', args.k):
+        print(f'{lead_id}\t{score}\t{matched}/{total}\t{name}')
+    print(f'load {1000 * (loaded - start):.1f}ms, query {1000 * (time.perf_counter() - loaded):.1f}ms',
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
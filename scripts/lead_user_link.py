@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Bulk-import leads without the per-row leads <-> users sync, then reconcile once.
+
+tr_sync_lead_to_user / tr_sync_user_to_lead (20260524_sync_leads_and_users.sql)
+run a correlated UPDATE ... WHERE email = ... for every changed row, so a lead
+import pays one extra statement per row. This loads the import in a single
+transaction with `app.skip_lead_user_sync` set (honoured by the trigger
+functions since 20261019130000) and then, before COMMIT:
+
+  1. upserts the rows into leads (COALESCE: blank import cells keep the stored value),
+  2. hash-joins the imported leads to users on lower(trim(email)), keeping the
+     most recently updated lead per user,
+  3. applies one UPDATE to users and one to leads for the synced fields
+     (full_name, job_title -> position, country -> nationality).
+
+A field conflicts when the import changed it and the user's value had
+diverged from the lead's pre-import value as well. --prefer decides who wins
+(leads by default, which is what the row triggers would have done).
+Conflicts are written to <state-dir>/conflicts.csv. Lead email changes are
+reported but never copied to users.email, since that is the login identity.
+
+Rows go through the same value conversion as generate_seed_sql.py; cells it
+cannot parse ('TBA' in a number column) are imported as NULL and counted per
+column on stderr. Rows without an id attach to the existing lead with the
+same record_id, else the same normalized email; a lead listed twice keeps
+its last row.
+
+Usage:
+    python scripts/lead_user_link.py "src/assets/All Leads Master Sheet.csv"
+    python scripts/lead_user_link.py "docs/business/AI Masterclass.xlsx" --prefer users
+    python scripts/lead_user_link.py leads.jsonl --dry-run        # reconcile, report, roll back
+"""
+import argparse
+import csv
+import os
+import sys
+from collections import Counter
+from itertools import chain
+
+from generate_seed_sql import BOOL_VALUES, clean, sql_val
+from pg_local import copy_block, pg_array, psql_rows, psql_stream
+from snapshots import read_rows, table_columns
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+STATE_DIR = os.path.join(ROOT, '.cache', 'lead-user-link')
+
+# lead column -> users column kept in sync by the row triggers
+FIELDS = [('full_name', 'full_name'), ('job_title', 'position'), ('country', 'nationality')]
+NORM = 'lower(trim({0}))'
+
+
+def copy_value(col, val, booleans=()):
+    """COPY text for one import cell, converted exactly like the seed SQL generator."""
+    if col == 'priority_previous_values':
+        return pg_array([v.strip() for v in val.split(',') if v.strip()]) if val else None
+    lit = sql_val(col, val)
+    if lit == 'NULL':
+        return None
+    if lit in ('TRUE', 'FALSE'):
+        return lit == 'TRUE'
+    if col in booleans:  # sql_val only knows paid_deposit and paid_full
+        return BOOL_VALUES.get(val.strip().lower())
+    if lit.startswith("'"):
+        return lit[1:-1].replace("''", "'")
+    return lit
+
+
+def plan_sql(prefer):
+    """lead_user_plan: one row per linked user with per-field changed/conflict flags."""
+    cols = ['p.*']
+    for lead_col, _ in FIELDS:
+        lead, base, user = f'p.lead_{lead_col}', f'p.base_{lead_col}', f'p.user_{lead_col}'
+        changed = f'({lead} IS NOT NULL AND {lead} IS DISTINCT FROM {base})'
+        conflict = (f'({changed} AND {user} IS NOT NULL AND {user} IS DISTINCT FROM {base} '
+                    f'AND {user} IS DISTINCT FROM {lead})')
+        lead_wins = f'{changed} AND NOT {conflict}' if prefer == 'users' else changed
+        cols += [f'{conflict} AS conflict_{lead_col}',
+                 f'CASE WHEN {lead_wins} THEN {lead} ELSE {user} END AS new_user_{lead_col}',
+                 f'CASE WHEN {lead} IS NULL THEN {user} '
+                 + (f'WHEN {conflict} THEN {user} ' if prefer == 'users' else '')
+                 + f'ELSE {lead} END AS new_lead_{lead_col}']
+    cols.append(f"(p.base_email IS NOT NULL AND {NORM.format('p.base_email')} "
+                f"IS DISTINCT FROM {NORM.format('p.lead_email')}) AS conflict_email")
+    return f'CREATE TEMP TABLE lead_user_plan ON COMMIT DROP AS SELECT {", ".join(cols)} FROM lead_user_pairs p;\n'
+
+
+def link_script(columns, rows, prefer, conflicts_path, summary_path, dry_run):
+    set_cols = [c for c in columns if c != 'id']
+    pair_cols = ['u.id AS user_id', 'l.id AS lead_id', 'b.id IS NULL AS is_new',
+                 'b.email AS base_email', 'l.email AS lead_email', 'u.email AS user_email']
+    for lead_col, user_col in FIELDS:
+        pair_cols += [f'b.{lead_col} AS base_{lead_col}', f'l.{lead_col} AS lead_{lead_col}',
+                      f'u.{user_col} AS user_{lead_col}']
+
+    yield ("BEGIN;\nSET LOCAL app.skip_lead_user_sync = 'on';\n"
+           'CREATE TEMP TABLE lead_import ON COMMIT DROP AS SELECT * FROM public.leads WITH NO DATA;\n'
+           'ALTER TABLE lead_import ADD COLUMN import_row bigint;\n')
+    yield from copy_block('lead_import', columns + ['import_row'], (values + [n] for n, values in enumerate(rows)))
+    yield (
+        '-- rows without an id attach to the lead with their sheet record_id, else the newest with the same email\n'
+        'UPDATE lead_import i SET id = l.id FROM public.leads l WHERE i.id IS NULL AND l.record_id = i.record_id;\n'
+        'UPDATE lead_import i SET id = l.id FROM ('
+        f"SELECT DISTINCT ON ({NORM.format('email')}) id, {NORM.format('email')} AS norm_email "
+        f"FROM public.leads WHERE email IS NOT NULL ORDER BY {NORM.format('email')}, updated_at DESC NULLS LAST"
+        f") l WHERE i.id IS NULL AND {NORM.format('i.email')} = l.norm_email;\n"
+        'UPDATE lead_import SET id = gen_random_uuid() WHERE id IS NULL;\n'
+        '-- a lead listed twice keeps its last row (ON CONFLICT cannot touch a row twice)\n'
+        'DELETE FROM lead_import a USING lead_import b WHERE a.id = b.id AND a.import_row < b.import_row;\n'
+        'CREATE TEMP TABLE lead_base ON COMMIT DROP AS SELECT l.id, l.email, '
+        + ', '.join(f'l.{c}' for c, _ in FIELDS) + ' FROM public.leads l JOIN lead_import i USING (id);\n'
+        f'INSERT INTO public.leads (id, {", ".join(set_cols)}) SELECT id, {", ".join(set_cols)} FROM lead_import\n'
+        'ON CONFLICT (id) DO UPDATE SET '
+        + ', '.join(f'{c} = COALESCE(EXCLUDED.{c}, leads.{c})' for c in set_cols) + ';\n'
+        # one hash join on the normalized email; the newest lead wins when several share it
+        f'CREATE TEMP TABLE lead_user_pairs ON COMMIT DROP AS SELECT DISTINCT ON (u.id) {", ".join(pair_cols)}\n'
+        'FROM lead_import i JOIN public.leads l ON l.id = i.id LEFT JOIN lead_base b ON b.id = i.id\n'
+        f"JOIN public.users u ON {NORM.format('u.email')} = {NORM.format('COALESCE(b.email, l.email)')}\n"
+        'ORDER BY u.id, l.updated_at DESC NULLS LAST, l.id;\n'
+    )
+    yield plan_sql(prefer)
+    user_sets = ', '.join(f'{user_col} = p.new_user_{lead_col}' for lead_col, user_col in FIELDS)
+    user_diff = ' OR '.join(f'u.{user_col} IS DISTINCT FROM p.new_user_{lead_col}' for lead_col, user_col in FIELDS)
+    lead_sets = ', '.join(f'{lead_col} = p.new_lead_{lead_col}' for lead_col, _ in FIELDS)
+    lead_diff = ' OR '.join(f'l.{lead_col} IS DISTINCT FROM p.new_lead_{lead_col}' for lead_col, _ in FIELDS)
+    yield (f'UPDATE public.users u SET {user_sets} FROM lead_user_plan p WHERE u.id = p.user_id AND ({user_diff});\n'
+           f'UPDATE public.leads l SET {lead_sets} FROM lead_user_plan p WHERE l.id = p.lead_id AND ({lead_diff});\n')
+
+    resolved = 'lead' if prefer == 'leads' else 'user'
+    report = ' UNION ALL '.join(
+        f"SELECT user_id, lead_id, '{lead_col}' AS field, base_{lead_col} AS before, lead_{lead_col} AS lead_value, "
+        f"user_{lead_col} AS user_value, '{resolved}' AS kept FROM lead_user_plan WHERE conflict_{lead_col}"
+        for lead_col, _ in FIELDS
+    ) + (" UNION ALL SELECT user_id, lead_id, 'email', base_email, lead_email, user_email, 'user' "
+         'FROM lead_user_plan WHERE conflict_email')
+    yield f"\\copy ({report} ORDER BY 1, 3) TO '{conflicts_path}' WITH (FORMAT csv, HEADER)\n"
+    yield ('\\copy (SELECT (SELECT count(*) FROM lead_import), (SELECT count(*) FROM lead_base), '
+           '(SELECT count(*) FROM lead_user_plan), '
+           f"(SELECT count(*) FROM lead_user_plan WHERE is_new)) TO '{summary_path}'\n")
+    yield 'ROLLBACK;\n' if dry_run else 'COMMIT;\n'
+
+
+def import_rows(source, unparsed):
+    """(columns, COPY rows); `unparsed` counts, per column, cells that convert to NULL as they stream."""
+    rows = iter(read_rows(source))
+    first = next(rows, None)
+    if first is None:
+        sys.exit(f'{source}: no rows')
+    present = set(table_columns('public.leads'))
+    booleans = {r[0] for r in psql_rows("SELECT column_name FROM information_schema.columns WHERE table_schema = 'public' "
+                                        "AND table_name = 'leads' AND data_type = 'boolean';")}
+    columns = [c for c in first if c in present]
+    if 'id' not in columns:
+        columns.insert(0, 'id')
+    dropped = sorted(set(first) - present)
+    if dropped:
+        print(f'Not in public.leads, skipped: {", ".join(dropped)}', file=sys.stderr)
+
+    def convert(row):
+        values = []
+        for c in columns:
+            value = copy_value(c, row.get(c), booleans)
+            if value is None and row.get(c) is not None and clean(str(row.get(c))) is not None:
+                unparsed[c] += 1
+            values.append(value)
+        return values
+
+    return columns, (convert(r) for r in chain([first], rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help='leads snapshot: master-sheet CSV, .xlsx, JSON/JSONL')
+    parser.add_argument('--prefer', choices=['leads', 'users'], default='leads',
+                        help='which side wins a field both sides changed (default: leads, like the triggers)')
+    parser.add_argument('--state-dir', default=STATE_DIR)
+    parser.add_argument('--dry-run', action='store_true', help='reconcile and report, then roll back')
+    args = parser.parse_args()
+
+    os.makedirs(args.state_dir, exist_ok=True)
+    conflicts_path = os.path.abspath(os.path.join(args.state_dir, 'conflicts.csv'))
+    summary_path = os.path.abspath(os.path.join(args.state_dir, 'summary.tsv'))
+    unparsed = Counter()
+    columns, rows = import_rows(args.source, unparsed)
+    psql_stream(link_script(columns, rows, args.prefer, conflicts_path, summary_path, args.dry_run))
+
+    if unparsed:
+        print('Could not parse, imported as NULL: '
+              + ', '.join(f'{c} ({n})' for c, n in sorted(unparsed.items())), file=sys.stderr)
+    with open(summary_path) as f:
+        imported, existing, linked, new_linked = f.read().split()
+    with open(conflicts_path, newline='') as f:
+        conflicts = list(csv.DictReader(f))
+    by_field = {}
+    for c in conflicts:
+        by_field[c['field']] = by_field.get(c['field'], 0) + 1
+    print(f'{imported} leads imported ({existing} existing), {linked} linked to users '
+          f'({new_linked} via new leads); {len(conflicts)} conflicts'
+          + (f' ({", ".join(f"{k}: {v}" for k, v in sorted(by_field.items()))}) -> {conflicts_path}'
+             if conflicts else '')
+          + (' [rolled back]' if args.dry_run else ''), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""Revenue, receivables and cost ledger over leads and costs.
+
+Payments are spread over wide leads columns (amount_paid / date_of_payment in
+three slots, balance, balance_2, balance_dop, coupon_percent) and every finance
+view re-derives them row by row. This unpivots each lead once into payment
+events (month, amount), an open receivable and a coupon leakage figure, all in
+integer cents, and keeps those per-lead contributions next to month ×
+offering_type rollups. A refresh re-reads only leads whose financial columns
+changed (by updated_at against DATABASE_URL, by content hash for a snapshot
+file), subtracts their old contribution and adds the new one.
+
+Derived figures:
+  cash_in          sum of amount_paid{,_2,_3} in the month of its payment date
+  receivable       balance + balance_2 (or payment_amount - paid when both are
+                   empty) for leads with a payment and not paid_full, aged
+                   against balance_dop (or the last payment date)
+  coupon_leakage   list price - payment_amount, with payment_amount taken as
+                   the discounted price: amount * pct / (100 - pct)
+  allocated_costs  costs of the month spread by each offering's cash-in share;
+                   active costs recur monthly from payment_date, like CostsPage
+  net              cash_in - allocated_costs
+
+State lives in --state-dir (default .cache/ledger):
+    state.json      per-lead hash + contribution (rollups are rebuilt from
+                    these on load), cost months, watermark, months changed
+                    since the last successful --load
+
+Usage:
+    python scripts/ledger.py --leads db --costs db --load   # read/write DATABASE_URL
+    python scripts/ledger.py --leads leads.csv --costs costs.json --report
+    python scripts/ledger.py --aging --as-of 2026-10-01
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+from datetime import date, datetime
+
+from pg_local import copy_block, psql_rows, psql_stream
+from snapshots import db_rows, read_rows, table_columns
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+STATE_DIR = os.path.join(ROOT, '.cache', 'ledger')
+
+PAYMENT_SLOTS = [('amount_paid', 'date_of_payment'), ('amount_paid_2', 'date_of_payment_2'),
+                 ('amount_paid_3', 'date_of_payment_3')]
+LEAD_COLUMNS = ['id', 'priority', 'offering_type', 'payment_amount', 'coupon_percent', 'paid_full',
+                'balance', 'balance_2', 'balance_dop', 'payment_plan', 'discovery_call_date',
+                'amount_paid', 'date_of_payment', 'amount_paid_2', 'date_of_payment_2',
+                'amount_paid_3', 'date_of_payment_3', 'updated_at']
+COST_COLUMNS = ['id', 'category', 'total_amount', 'invoice_date', 'payment_date', 'created_at']
+ROLLUP_COLUMNS = ['month', 'offering_type', 'cash_in', 'payments', 'coupon_leakage',
+                  'allocated_costs', 'net']
+
+AGING_BUCKETS = [(0, 'not_due'), (30, '0-30'), (60, '31-60'), (90, '61-90'), (None, '90+')]
+UNALLOCATED = 'unallocated'
+
+
+def cents(value):
+    """Parse a money cell ('1,200', '$950.5', 1200) to integer cents, None if empty."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return round(value * 100)
+    value = value.replace(',', '').replace('$', '').replace('AED', '').strip()
+    try:
+        return round(float(value) * 100)
+    except ValueError:
+        return None
+
+
+def percent(value):
+    try:
+        return int(float(str(value).replace('%', '').strip()))
+    except ValueError:
+        return 0
+
+
+def parse_day(value):
+    if not value or len(value) < 10 or value[4] != '-':
+        return None
+    return value[:10]
+
+
+def month_of(day):
+    return day[:7] + '-01' if day else None
+
+
+def truthy(value):
+    return value is not None and str(value).strip().lower() in ('t', 'true', 'yes', '1')
+
+
+def offering_key(value):
+    value = (value or '').strip().lower().replace('-', ' ')
+    return '_'.join(value.split()) or 'unassigned'
+
+
+def lead_hash(row):
+    return hashlib.blake2b('\x1f'.join(str(row.get(c) or '') for c in LEAD_COLUMNS[:-1]).encode(),
+                           digest_size=8).hexdigest()
+
+
+def contributions(rows):
+    """Unpivot a batch of leads column-wise into per-lead contribution dicts."""
+    ids = [r['id'] for r in rows]
+    offering = [offering_key(r.get('offering_type')) for r in rows]
+    price = [cents(r.get('payment_amount')) for r in rows]
+    coupon = [percent(r.get('coupon_percent')) for r in rows]
+    paid_full = [truthy(r.get('paid_full')) for r in rows]
+    fallback_day = [parse_day(r.get('discovery_call_date')) for r in rows]
+
+    # one (amount, day) column pair per payment slot -> event lists per lead
+    slots = [([cents(r.get(a)) for r in rows], [parse_day(r.get(d)) for r in rows]) for a, d in PAYMENT_SLOTS]
+    events = [[] for _ in rows]
+    paid = [0] * len(rows)
+    last_day = [None] * len(rows)
+    for amounts, days in slots:
+        for i, (amount, day) in enumerate(zip(amounts, days)):
+            if amount:
+                events[i].append([month_of(day), amount])
+                paid[i] += amount
+                if day and (last_day[i] is None or day > last_day[i]):
+                    last_day[i] = day
+
+    balance = [(cents(r.get('balance')) or 0) + (cents(r.get('balance_2')) or 0) for r in rows]
+    due = [parse_day(r.get('balance_dop')) for r in rows]
+    out = {}
+    for i, lead_id in enumerate(ids):
+        open_amount = balance[i] or max((price[i] or 0) - paid[i], 0)
+        receivable = None
+        if events[i] and not paid_full[i] and open_amount > 0:
+            receivable = [open_amount, due[i] or last_day[i]]
+        leak = None
+        pct = coupon[i]
+        if price[i] and 0 < pct < 100:
+            first = min((e[0] for e in events[i] if e[0]), default=None) or month_of(fallback_day[i])
+            leak = [first, price[i] * pct // (100 - pct)]
+        out[lead_id] = {'o': offering[i], 'cash': events[i], 'ar': receivable, 'leak': leak}
+    return out
+
+
+def cost_months(rows, through):
+    """Cost cents per month; active costs recur monthly from their payment_date."""
+    by_month = {}
+    for r in rows:
+        amount = cents(r.get('total_amount')) or 0
+        if not amount:
+            continue
+        start = parse_day(r.get('payment_date'))
+        if truthy(r.get('is_active')) and start:
+            y, m = int(start[:4]), int(start[5:7])
+            while f'{y:04d}-{m:02d}-01' <= through:
+                key = f'{y:04d}-{m:02d}-01'
+                by_month[key] = by_month.get(key, 0) + amount
+                y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+            continue
+        key = month_of(start or parse_day(r.get('invoice_date')) or parse_day(r.get('created_at')))
+        if key:
+            by_month[key] = by_month.get(key, 0) + amount
+    return by_month
+
+
+class Ledger:
+    def __init__(self, state_dir=STATE_DIR):
+        self.state_dir = state_dir
+        self.leads = {}
+        self.cash = {}
+        self.leakage = {}
+        self.costs = {}
+        self.costs_fp = None
+        self.watermark = None
+        self.touched = set()
+        self.load()
+
+    def load(self):
+        path = os.path.join(self.state_dir, 'state.json')
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            state = json.load(f)
+        self.leads = state['leads']
+        self.costs = state['costs']
+        self.costs_fp = state['costs_fp']
+        self.watermark = state['watermark']
+        for lead in self.leads.values():
+            self.apply(lead[1], 1)
+        # kept until a load succeeds, so a failed or skipped --load is retried next run
+        self.touched = set(state.get('unloaded', []))
+
+    def save(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = os.path.join(self.state_dir, 'state.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'leads': self.leads, 'costs': self.costs, 'costs_fp': self.costs_fp,
+                       'watermark': self.watermark, 'unloaded': sorted(self.touched)}, f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+
+    def apply(self, contrib, sign):
+        offering = contrib['o']
+        for month, amount in contrib['cash']:
+            key = (month or 'undated', offering)
+            acc = self.cash.setdefault(key, [0, 0])
+            acc[0] += sign * amount
+            acc[1] += sign
+            if not acc[1]:
+                del self.cash[key]
+            self.touched.add(key[0])
+        if contrib['leak'] and contrib['leak'][0]:
+            key = (contrib['leak'][0], offering)
+            self.leakage[key] = self.leakage.get(key, 0) + sign * contrib['leak'][1]
+            if not self.leakage[key]:
+                del self.leakage[key]
+            self.touched.add(key[0])
+
+    def fold(self, rows, complete=False):
+        """Fold changed leads; with complete=True, leads missing from `rows` are dropped."""
+        changed = []
+        seen = set()
+        for row in rows:
+            seen.add(row['id'])
+            h = lead_hash(row)
+            prev = self.leads.get(row['id'])
+            if prev is None or prev[0] != h:
+                changed.append(row)
+            stamp = row.get('updated_at')
+            if stamp and (self.watermark is None or stamp > self.watermark):
+                self.watermark = stamp
+        removed = [i for i in self.leads if i not in seen] if complete else []
+        self.drop(removed)
+        for lead_id, contrib in contributions(changed).items():
+            prev = self.leads.get(lead_id)
+            if prev is not None:
+                self.apply(prev[1], -1)
+            self.apply(contrib, 1)
+            self.leads[lead_id] = [None, contrib]
+        for row in changed:
+            self.leads[row['id']][0] = lead_hash(row)
+        return len(changed), len(removed)
+
+    def drop(self, ids):
+        for lead_id in ids:
+            if lead_id in self.leads:
+                self.apply(self.leads.pop(lead_id)[1], -1)
+
+    def set_costs(self, rows, through):
+        rows = list(rows)
+        fp = hashlib.blake2b(json.dumps(sorted(rows, key=lambda r: r['id']), sort_keys=True,
+                                        default=str).encode() + through.encode(), digest_size=8).hexdigest()
+        if fp == self.costs_fp:
+            return False
+        new = cost_months(rows, through)
+        self.touched.update(m for m in set(new) | set(self.costs) if new.get(m) != self.costs.get(m))
+        self.costs, self.costs_fp = new, fp
+        return True
+
+    def month_rows(self, month):
+        offerings = {o for (m, o) in self.cash if m == month} | {o for (m, o) in self.leakage if m == month}
+        cash = {o: self.cash.get((month, o), [0, 0]) for o in offerings}
+        total_cash = sum(c[0] for c in cash.values())
+        cost = self.costs.get(month, 0)
+        rows = []
+        allocated_sum = 0
+        for o in sorted(offerings):
+            share = cost * cash[o][0] // total_cash if total_cash > 0 else 0
+            allocated_sum += share
+            rows.append([month, o, cash[o][0], cash[o][1], self.leakage.get((month, o), 0), share])
+        if cost - allocated_sum:
+            # no cash-in that month (or rounding remainder): keep costs visible
+            if total_cash > 0 and rows:
+                rows[-1][5] += cost - allocated_sum
+            else:
+                rows.append([month, UNALLOCATED, 0, 0, 0, cost])
+        return [r + [r[2] - r[5]] for r in rows]
+
+    def rows(self, months=None):
+        months = months if months is not None else (
+            {m for m, _ in self.cash} | {m for m, _ in self.leakage} | set(self.costs))
+        for month in sorted(m for m in months if m != 'undated'):
+            yield from self.month_rows(month)
+
+    def aging(self, as_of):
+        buckets = {}
+        for _, contrib in self.leads.values():
+            if not contrib['ar']:
+                continue
+            amount, due = contrib['ar']
+            if due is None:
+                label = 'no_due_date'
+            else:
+                days = (as_of - date.fromisoformat(due)).days
+                label = next(name for limit, name in AGING_BUCKETS if limit is None or days <= limit)
+            acc = buckets.setdefault(contrib['o'], {})
+            acc[label] = acc.get(label, 0) + amount
+        return buckets
+
+
+def money(c):
+    return f'{c / 100:.2f}'
+
+
+def load_script(ledger, months):
+    """Replace the rollup rows of touched months in one transaction."""
+    months = sorted(m for m in months if m != 'undated')
+    yield ('BEGIN;\nCREATE TEMP TABLE ledger_in (LIKE public.ledger_monthly INCLUDING DEFAULTS) '
+           'ON COMMIT DROP;\n')
+    yield from copy_block('ledger_in', ROLLUP_COLUMNS, (
+        [r[0], r[1], money(r[2]), r[3], money(r[4]), money(r[5]), money(r[6])] for r in ledger.rows(months)
+    ))
+    yield (f"DELETE FROM public.ledger_monthly WHERE month = ANY('{{{','.join(months)}}}'::date[]);\n"
+           f'INSERT INTO public.ledger_monthly ({", ".join(ROLLUP_COLUMNS)}) '
+           f'SELECT {", ".join(ROLLUP_COLUMNS)} FROM ledger_in;\n'
+           'COMMIT;\n')
+
+
+def lead_rows(source, watermark):
+    if source != 'db':
+        return read_rows(source), True
+    present = table_columns('public.leads')
+    columns = [c for c in LEAD_COLUMNS if c in present]
+    where = f"updated_at > '{watermark}'" if watermark else None
+    return db_rows('public.leads', columns, where), watermark is None
+
+
+def cost_rows(source):
+    if source != 'db':
+        return read_rows(source)
+    present = table_columns('public.costs')
+    # is_active is managed by CostsPage but not created by any migration in this tree
+    return db_rows('public.costs', COST_COLUMNS + (['is_active'] if 'is_active' in present else []))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--leads', help="'db' or a leads snapshot (csv/json/jsonl)")
+    parser.add_argument('--costs', help="'db' or a costs snapshot")
+    parser.add_argument('--state-dir', default=STATE_DIR)
+    parser.add_argument('--as-of', default=date.today().isoformat(), help='aging / cost recurrence date')
+    parser.add_argument('--load', action='store_true', help='write months changed since the last load to public.ledger_monthly')
+    parser.add_argument('--report', action='store_true', help='print the monthly rollups')
+    parser.add_argument('--aging', action='store_true', help='print receivables aging per offering')
+    args = parser.parse_args()
+
+    ledger = Ledger(args.state_dir)
+    if args.leads:
+        rows, complete = lead_rows(args.leads, ledger.watermark)
+        changed, removed = ledger.fold(rows, complete)
+        if args.leads == 'db' and not complete:
+            # incremental reads cannot see deletes; diff the id list instead
+            live = {r[0] for r in psql_rows('SELECT id FROM public.leads;')}
+            gone = [i for i in ledger.leads if i not in live]
+            ledger.drop(gone)
+            removed += len(gone)
+        print(f'{changed} leads refolded, {removed} removed ({len(ledger.leads)} tracked)', file=sys.stderr)
+    if args.costs:
+        through = month_of(args.as_of)
+        if ledger.set_costs(cost_rows(args.costs), through):
+            print(f'Costs changed; {len(ledger.costs)} cost months', file=sys.stderr)
+    if args.leads or args.costs:
+        ledger.save()
+        print(f'{len(ledger.touched)} months to load', file=sys.stderr)
+        if args.load and ledger.touched:
+            psql_stream(load_script(ledger, ledger.touched))
+            ledger.touched.clear()
+            ledger.save()
+
+    if args.report:
+        print('month\toffering_type\tcash_in\tpayments\tcoupon_leakage\tallocated_costs\tnet')
+        for r in ledger.rows():
+            print('\t'.join([r[0], r[1], money(r[2]), str(r[3]), money(r[4]), money(r[5]), money(r[6])]))
+    if args.aging:
+        as_of = datetime.fromisoformat(args.as_of).date()
+        for offering, buckets in sorted(ledger.aging(as_of).items()):
+            cells = ' '.join(f'{k}={money(v)}' for k, v in buckets.items())
+            print(f'{offering}: {cells}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""Stream leads back out in the sales team's master-sheet CSV layout.
+
+The inverse of generate_seed_sql.COL_MAP (and snapshots.master_sheet_rows):
+columns come out under the sheet's own headers, in the sheet's order, with
+its quirks kept - the two `Balance ` columns (balance, then balance_2), the
+trailing spaces in `Priority `, `Offering Type ` and `Payment `, and the
+`"Priority " Changed At` / `"Priority " Previous Values` headers. Cells are
+written the way the sheet's exporter writes them: every non-empty cell
+quoted, empty cells bare (except Previous Values, which is always `""`),
+`\\n` between lines and no newline after the last one.
+
+Values get the typed formatting the import understands:
+
+  dates                   YYYY-MM-DD
+  priority_changed_at     UTC, 2025-12-28T14:49:36Z
+  previous values         LAVA,HOT,COLD (oldest first)
+  money                   4900 / 5145.5 (no trailing zeros)
+  coupon_percent          20%
+  paid_deposit/paid_full  Yes / No
+  booked_support          Yes / No
+
+Any source is normalized through these, so exporting a snapshot, importing
+the result and exporting again produces the same bytes. Placeholders the
+import reads as empty ("-", "N/A") come back as empty cells, and Paid Full
+"NOT YET" and Booked Support "Not Yet" as "No", because the database keeps
+neither.
+
+With --header-from, the header row of that sheet is used instead of the
+default layout; headers without a leads column are filled from
+custom_fields under the key generate_seed_sql registered them with.
+
+Rows are streamed from the source to the output one at a time (for db:
+ORDER BY created_at, id), so memory stays flat at any size.
+
+Usage:
+    python scripts/master_sheet_export.py db -o "All Leads Master Sheet.csv"
+    python scripts/master_sheet_export.py leads.jsonl -o sheet.csv --header-from "src/assets/All Leads Master Sheet.csv"
+    python scripts/master_sheet_export.py "src/assets/All Leads Master Sheet.csv" -o /tmp/sheet.csv --check
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+from datetime import timezone
+from decimal import Decimal, InvalidOperation
+
+from generate_seed_sql import COL_MAP, DATE_COLS, custom_key
+from pg_local import copy_out
+from priority_funnel import parse_previous, parse_ts
+from snapshots import read_rows, table_columns
+
+MASTER_HEADERS = [
+    'Entry ID', 'Record ID', 'Record', 'Priority ', '"Priority " Changed At', '"Priority " Previous Values',
+    'Company name', 'Parent Record > Email addresses', 'Parent Record > Phone numbers', 'Parent Record > Instagram',
+    'Parent Record > Description', 'Parent Record > Primary location > Country',
+    'Parent Record > Primary location > City', 'Parent Record > Job title', 'Discovery Call Date',
+    'Offering Type ', 'Session Type', 'Payment ', 'Seats', 'Balance ', 'Coupon %', 'Coupon Code', 'Paid Desposit',
+    'Amount Paid 2', 'DOP', 'Payment Plan', 'Amount Paid', 'DOP 2', 'Balance ', 'Balance DOP', 'Paid Full',
+    'DOP 3', 'Day Slot', 'Time Slot', 'START DATE', 'END DATE', 'Sessions Done', 'Booked Support',
+    'Support Date Booked', 'Notes',
+]
+BALANCE_COLUMNS = ('balance', 'balance_2')
+MONEY_COLS = {'payment_amount', 'amount_paid', 'amount_paid_2', 'amount_paid_3', 'balance', 'balance_2'}
+COUNT_COLS = {'seats', 'sessions_done'}
+BOOL_COLS = {'paid_deposit', 'paid_full', 'booked_support'}
+ALWAYS_QUOTED = {'"Priority " Previous Values'}
+PLACEHOLDERS = {'', '-', 'N/A', 'n/a'}
+
+
+def sheet_columns(headers):
+    """Per header: ('col', leads column) or ('custom', custom_fields key)."""
+    out = []
+    balances = iter(BALANCE_COLUMNS)
+    for h in headers:
+        if h in COL_MAP:
+            out.append(('col', COL_MAP[h]))
+        elif h.strip() == 'Balance':
+            out.append(('col', next(balances, None)))
+        else:
+            out.append(('custom', custom_key(h)))
+    return out
+
+
+def money(val):
+    try:
+        n = Decimal(str(val).replace(',', '').replace('$', '').strip())
+    except InvalidOperation:
+        return ''
+    n = n.normalize()
+    return str(n.quantize(1)) if n == n.to_integral_value() else format(n, 'f')
+
+
+def count(val, suffix=''):
+    try:
+        n = Decimal(str(val).replace('%', '').strip())
+    except InvalidOperation:
+        return ''
+    # 20, "20" and a snapshot's 20.0 are the same count; 2.5 seats is not one
+    return str(int(n)) + suffix if n.is_finite() and n == n.to_integral_value() else ''
+
+
+def timestamp(val):
+    try:
+        stamp = parse_ts(str(val))
+    except ValueError:
+        return ''
+    fmt = '%Y-%m-%dT%H:%M:%S.%fZ' if stamp.microsecond else '%Y-%m-%dT%H:%M:%SZ'
+    return stamp.astimezone(timezone.utc).strftime(fmt)
+
+
+def text(val):
+    val = str(val).strip()
+    return '' if val in PLACEHOLDERS else val
+
+
+def typed(fmt):
+    def format_cell(val):
+        val = text(val)
+        return fmt(val) if val else ''
+    return format_cell
+
+
+def boolean(val):
+    if isinstance(val, bool):
+        return 'Yes' if val else 'No'
+    val = text(val)
+    return ('Yes' if val.lower() in ('yes', 'true', 't') else 'No') if val else ''
+
+
+def formatter(col):
+    """Formatter turning one non-NULL value of `col` (from the db, a snapshot or the sheet) into sheet text."""
+    if col == 'priority_previous_values':
+        return lambda val: ','.join(parse_previous(val))
+    if col in MONEY_COLS:
+        return typed(money)
+    if col in COUNT_COLS:
+        return typed(count)
+    if col == 'coupon_percent':
+        return typed(lambda val: count(val, '%'))
+    if col in DATE_COLS:
+        return typed(lambda val: val[:10] if len(val) >= 10 and val[4] == '-' else '')
+    if col in BOOL_COLS:
+        return boolean
+    if col == 'priority_changed_at':
+        return typed(timestamp)
+    return text
+
+
+def custom_cell(val):
+    if val is None:
+        return ''
+    if isinstance(val, bool):
+        return 'Yes' if val else 'No'
+    return str(val)
+
+
+def quote(text, always=False):
+    return '"' + text.replace('"', '""') + '"' if text or always else ''
+
+
+def sheet_lines(rows, headers=MASTER_HEADERS):
+    """Yield the header and one line per row, without line terminators."""
+    columns = [(kind, key, formatter(key) if kind == 'col' else custom_cell, h in ALWAYS_QUOTED)
+               for (kind, key), h in zip(sheet_columns(headers), headers)]
+    yield ','.join(quote(h) for h in headers)
+    for row in rows:
+        custom = row.get('custom_fields') or {}
+        if isinstance(custom, str):
+            custom = json.loads(custom)
+        cells = []
+        for kind, key, fmt, always in columns:
+            val = row.get(key) if kind == 'col' else custom.get(key)
+            val = fmt(val) if val is not None and key is not None else ''
+            cells.append('"' + val.replace('"', '""') + '"' if val or always else '')
+        yield ','.join(cells)
+
+
+def lead_rows(source, headers):
+    if source != 'db':
+        return read_rows(source)
+    present = set(table_columns('public.leads'))
+    wanted = {key for kind, key in sheet_columns(headers) if kind == 'col' and key}
+    if any(kind == 'custom' for kind, _ in sheet_columns(headers)):
+        wanted.add('custom_fields')
+    columns = sorted(wanted & present)
+    query = f'SELECT {", ".join(columns)} FROM public.leads ORDER BY created_at, id'
+    return (dict(zip(columns, values)) for values in copy_out(query))
+
+
+def write(lines, out):
+    """Write lines joined by '\\n' (none after the last); return (rows, sha256)."""
+    h = hashlib.sha256()
+    n = -1
+    for n, line in enumerate(lines):
+        chunk = ('\n' if n else '') + line
+        out.write(chunk)
+        h.update(chunk.encode())
+    return n, h.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help="'db' or a leads snapshot (master-sheet CSV, CSV/JSON/JSONL export, .colz)")
+    parser.add_argument('-o', '--output', default='-', help="output CSV (default '-': stdout)")
+    parser.add_argument('--header-from', help='use the header row of this master-sheet CSV')
+    parser.add_argument('--check', action='store_true',
+                        help='re-import the written file and verify a second export is byte-identical')
+    args = parser.parse_args()
+
+    headers = MASTER_HEADERS
+    if args.header_from:
+        with open(args.header_from, newline='') as f:
+            headers = next(csv.reader(f))
+
+    if args.output == '-':
+        if args.check:
+            sys.exit('--check needs -o')
+        write(sheet_lines(lead_rows(args.source, headers), headers), sys.stdout)
+        return
+    with open(args.output + '.tmp', 'w', newline='') as f:
+        rows, digest = write(sheet_lines(lead_rows(args.source, headers), headers), f)
+    os.replace(args.output + '.tmp', args.output)
+    print(f'{rows} leads -> {args.output}', file=sys.stderr)
+
+    if args.check:
+        # the written sheet read back through the importer's mapping must export to itself
+        with open(os.devnull, 'w') as f:
+            again, digest_again = write(sheet_lines(read_rows(args.output), headers), f)
+        if (again, digest_again) != (rows, digest):
+            sys.exit(f'round trip differs: {rows} rows {digest[:12]} vs {again} rows {digest_again[:12]}')
+        print(f'round trip stable ({digest[:12]})', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""Query-plan regression benchmarks for the app's query shapes at a chosen scale.
+
+Seeds a bench database (migrations via bootstrap_local_db, users/cohorts/chat
+via generate_fixtures, then leads, email_queue and audit_logs generated
+server-side with generate_series), ANALYZEs it, and runs every entry of
+CATALOGUE with EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON). Each query is run
+once to warm the cache and then --repeat times; the median execution time,
+the shared buffer hits/reads and the plan shape (node types, relations and
+indexes, nested) are recorded.
+
+A run is written to <state-dir>/runs/<timestamp>.json and compared with
+<state-dir>/baseline.json. It flags:
+  * sequential scans on tables with more than --seq-scan-rows rows (unless the
+    entry lists the table in allow_seq),
+  * plan shapes that differ from the baseline,
+  * median time or buffers above --tolerance × the baseline.
+The exit status is 1 when anything is flagged, so the suite can gate a new
+migration. --save-baseline accepts the current run.
+
+Usage:
+    python scripts/plan_bench.py --seed --users 20000 --leads 100000 --save-baseline
+    python scripts/plan_bench.py                  # after adding a migration: --seed again, compare
+    python scripts/plan_bench.py --only leads_filtered,chat_room_history --repeat 9
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from bootstrap_local_db import bootstrap, fingerprint_chain, migration_order
+from generate_fixtures import Scale, generate
+from pg_local import database_url, psql, psql_rows, psql_stream, sql_literal
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+STATE_DIR = os.path.join(ROOT, '.cache', 'plan-bench')
+BENCH_DB = 'zkandar_bench'
+
+PRIORITIES = ['ACTIVE', 'HOT', 'LAVA', 'COLD', 'COMPLETED', 'NOT INTERESTED']
+OFFERINGS = ['Sprint Workshop', '5-Week Masterclass', 'TBA', 'Data Analytics', 'World Tour']
+
+SEED_SQL = """
+BEGIN;
+SET LOCAL session_replication_role = replica;
+SELECT setseed(0.42);
+INSERT INTO public.leads (full_name, email, priority, priority_changed_at, offering_type, company_name,
+                          discovery_call_date, seats, payment_amount, notes, created_at, updated_at)
+SELECT 'Lead ' || g, 'lead' || g || '@example.com',
+       (ARRAY{priorities})[1 + (random() * 5)::int], ts + interval '3 days',
+       (ARRAY{offerings})[1 + (random() * 4)::int], 'Company ' || (g % {companies}),
+       (ts + interval '1 day')::date, 1 + (random() * 4)::int, (random() * 20000)::numeric(10,2),
+       'follow up ' || g, ts, ts + (random() * 60) * interval '1 day'
+FROM (SELECT g, timestamptz '2025-01-01' + g * interval '5 minutes' AS ts
+      FROM generate_series(1, {leads}) g) s;
+
+INSERT INTO public.email_campaigns (subject, audience, recipient_count)
+SELECT 'Campaign ' || g, 'all', {queue} / {campaigns} FROM generate_series(1, {campaigns}) g;
+
+INSERT INTO public.email_queue (campaign_id, recipient_email, recipient_name, subject, html_body, status,
+                                attempts, send_after, created_at, updated_at)
+SELECT c.id, 'r' || g || '@example.com', 'Recipient ' || g, c.subject, '<p>Hello</p>',
+       CASE WHEN r < 0.90 THEN 'sent' WHEN r < 0.95 THEN 'pending' WHEN r < 0.98 THEN 'failed' ELSE 'skipped' END,
+       (r * 3)::int, ts + (r * 2) * interval '1 day', ts, ts
+FROM (SELECT g, random() AS r, now() - interval '180 days' + g * (interval '180 days' / {queue}) AS ts,
+             1 + g % {campaigns} AS cn
+      FROM generate_series(1, {queue}) g) s
+JOIN (SELECT id, subject, row_number() OVER (ORDER BY subject) AS cn FROM public.email_campaigns) c USING (cn);
+
+INSERT INTO public.audit_logs (action, entity_type, entity_id, metadata, created_at)
+SELECT (ARRAY['lead.update', 'lead.create', 'lead.delete', 'user.update'])[1 + (random() * 3)::int],
+       'lead', l.id::text, jsonb_build_object('priority', l.priority),
+       now() - interval '365 days' + g * (interval '365 days' / {audit})
+FROM generate_series(1, {audit}) g
+JOIN (SELECT id, priority, row_number() OVER (ORDER BY id) AS rn FROM public.leads) l
+  ON l.rn = 1 + (g * 7919) % {leads};
+COMMIT;
+ANALYZE;
+"""
+
+# name -> sql with {placeholders}, params: query yielding their values, allow_seq: tables a seq scan is fine on
+CATALOGUE = {
+    'leads_list': {
+        # LeadsPage: select('*').order('updated_at', desc)
+        'sql': 'SELECT * FROM public.leads ORDER BY updated_at DESC LIMIT 100',
+    },
+    'leads_filtered': {
+        'sql': ("SELECT * FROM public.leads WHERE priority = 'HOT' AND offering_type = 'Sprint Workshop' "
+                'ORDER BY updated_at DESC LIMIT 50'),
+    },
+    'leads_by_email': {
+        'sql': 'SELECT * FROM public.leads WHERE email = {email}',
+        'params': 'SELECT email FROM public.leads ORDER BY updated_at DESC LIMIT 1',
+    },
+    'leads_by_company': {
+        'sql': 'SELECT id, full_name, priority, seats FROM public.leads WHERE company_name = {company}',
+        'params': 'SELECT company_name FROM public.leads WHERE company_name IS NOT NULL LIMIT 1',
+    },
+    'chat_room_history': {
+        # useChat: chat_messages + sender:users(...) for one room, newest page
+        'sql': ('SELECT m.*, u.full_name, u.role FROM public.chat_messages m '
+                'LEFT JOIN public.users u ON u.id = m.sender_id WHERE m.room_id = {room} '
+                'ORDER BY m.created_at DESC LIMIT 50'),
+        'params': 'SELECT room_id FROM public.chat_messages GROUP BY room_id ORDER BY count(*) DESC LIMIT 1',
+    },
+    'chat_room_history_before': {
+        'sql': ('SELECT * FROM public.chat_messages WHERE room_id = {room} AND created_at < {before} '
+                'ORDER BY created_at DESC LIMIT 50'),
+        'params': ('SELECT room_id, percentile_disc(0.5) WITHIN GROUP (ORDER BY created_at) '
+                   'FROM public.chat_messages GROUP BY room_id ORDER BY count(*) DESC LIMIT 1'),
+    },
+    'email_queue_due': {
+        # send-campaign-email: pending rows, oldest first, 200 per batch
+        'sql': ("SELECT * FROM public.email_queue WHERE status = 'pending' "
+                'AND (send_after IS NULL OR send_after <= now()) ORDER BY created_at LIMIT 200'),
+    },
+    'email_queue_campaign_pending': {
+        'sql': "SELECT id FROM public.email_queue WHERE campaign_id = {campaign} AND status = 'pending'",
+        'params': 'SELECT id FROM public.email_campaigns LIMIT 1',
+    },
+    'audit_entity_history': {
+        'sql': ("SELECT * FROM public.audit_logs WHERE entity_type = 'lead' AND entity_id = {entity} "
+                'ORDER BY created_at DESC'),
+        'params': 'SELECT entity_id FROM public.audit_logs LIMIT 1',
+    },
+    'audit_recent': {
+        'sql': 'SELECT * FROM public.audit_logs ORDER BY created_at DESC LIMIT 100',
+    },
+    'user_submissions': {
+        'sql': 'SELECT * FROM public.submissions WHERE user_id = {user}',
+        'params': 'SELECT user_id FROM public.submissions LIMIT 1',
+    },
+    'company_members': {
+        'sql': 'SELECT id, full_name, role FROM public.users WHERE company_id = {company_id}',
+        'params': 'SELECT id FROM public.companies LIMIT 1',
+    },
+}
+
+
+def seed(args):
+    url = bootstrap(args.db)
+    psql_stream(generate(Scale(args.users), seed=args.fixture_seed), url)
+    psql(SEED_SQL.format(priorities=sql_array(PRIORITIES), offerings=sql_array(OFFERINGS),
+                         leads=args.leads, companies=max(1, args.leads // 20), queue=args.queue,
+                         campaigns=max(1, args.queue // 2000), audit=args.audit), url)
+    return url
+
+
+def sql_array(values):
+    return '[' + ', '.join(sql_literal(v) for v in values) + ']'
+
+
+def resolve(entry, url):
+    """The entry's SQL with placeholders filled in from its params query."""
+    if 'params' not in entry:
+        return entry['sql']
+    rows = psql_rows(entry['params'] + ';', url)
+    if not rows:
+        return None
+    names = [n.split('}')[0] for n in entry['sql'].split('{')[1:]]
+    values = dict(zip(dict.fromkeys(names), rows[0]))
+    return entry['sql'].format(**{k: sql_literal(v) for k, v in values.items()})
+
+
+def explain(sql, url):
+    out = psql(f'BEGIN;\nEXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql};\nROLLBACK;\n', url)
+    return json.loads(out[out.index('['):])[0]
+
+
+def walk(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from walk(child)
+
+
+def shape(node):
+    """Plan shape without costs: 'Limit(Index Scan[idx_leads_updated_at:leads])'."""
+    label = node['Node Type']
+    target = ':'.join(x for x in (node.get('Index Name'), node.get('Relation Name')) if x)
+    if target:
+        label += f'[{target}]'
+    children = [shape(c) for c in node.get('Plans', ())]
+    return label + (f'({", ".join(children)})' if children else '')
+
+
+def table_rows(url):
+    return {name: float(n) for name, n in psql_rows(
+        "SELECT relname, reltuples FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname IN ('public', 'auth') AND c.relkind = 'r';", url)}
+
+
+def run_entry(name, entry, url, repeat):
+    sql = resolve(entry, url)
+    if sql is None:
+        return {'skipped': 'no parameter rows'}
+    explain(sql, url)  # warm-up
+    runs = [explain(sql, url) for _ in range(repeat)]
+    plan = runs[-1]['Plan']
+    return {
+        'sql': sql,
+        'execution_ms': round(statistics.median(r['Execution Time'] for r in runs), 3),
+        'planning_ms': round(statistics.median(r['Planning Time'] for r in runs), 3),
+        'shared_hit': plan.get('Shared Hit Blocks', 0),
+        'shared_read': plan.get('Shared Read Blocks', 0),
+        'rows': plan.get('Actual Rows'),
+        'shape': shape(plan),
+        'seq_scans': sorted({n['Relation Name'] for n in walk(plan) if n['Node Type'] == 'Seq Scan'}),
+        'indexes': sorted({n['Index Name'] for n in walk(plan) if n.get('Index Name')}),
+    }
+
+
+def flags(name, result, base, rows, args):
+    out = []
+    allowed = set(CATALOGUE[name].get('allow_seq', ()))
+    for rel in result.get('seq_scans', ()):
+        if rel not in allowed and rows.get(rel, 0) > args.seq_scan_rows:
+            out.append(f'seq scan on {rel} ({int(rows[rel])} rows)')
+    if not base or 'shape' not in base or 'shape' not in result:
+        return out
+    if result['shape'] != base['shape']:
+        out.append(f'plan changed: {base["shape"]} -> {result["shape"]}')
+    if result['execution_ms'] > base['execution_ms'] * args.tolerance and \
+            result['execution_ms'] - base['execution_ms'] > args.min_delta_ms:
+        out.append(f'slower: {base["execution_ms"]}ms -> {result["execution_ms"]}ms')
+    buffers, base_buffers = result['shared_hit'] + result['shared_read'], base['shared_hit'] + base['shared_read']
+    if base_buffers and buffers > base_buffers * args.tolerance:
+        out.append(f'buffers: {base_buffers} -> {buffers}')
+    return out
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=BENCH_DB, help='bench database name')
+    parser.add_argument('--seed', action='store_true', help='rebuild the bench database and load data first')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--leads', type=int, default=50000)
+    parser.add_argument('--queue', type=int, default=200000, help='email_queue rows')
+    parser.add_argument('--audit', type=int, default=500000, help='audit_logs rows')
+    parser.add_argument('--fixture-seed', type=int, default=42)
+    parser.add_argument('--only', help='comma-separated catalogue entries')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=2.0, help='flag time/buffers above this × baseline')
+    parser.add_argument('--min-delta-ms', type=float, default=1.0, help='ignore slowdowns smaller than this')
+    parser.add_argument('--seq-scan-rows', type=int, default=1000)
+    parser.add_argument('--state-dir', default=STATE_DIR)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    if args.seed:
+        t0 = time.time()
+        url = seed(args)
+        print(f'Seeded {args.db} in {time.time() - t0:.1f}s', file=sys.stderr)
+    else:
+        url = database_url(args.db)
+    names = args.only.split(',') if args.only else list(CATALOGUE)
+    unknown = set(names) - set(CATALOGUE)
+    if unknown:
+        sys.exit(f'unknown catalogue entries: {", ".join(sorted(unknown))}')
+
+    baseline_path = os.path.join(args.state_dir, 'baseline.json')
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    migrations = migration_order()
+    rows = table_rows(url)
+    run = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'migration': migrations[-1],
+        'migration_fingerprint': fingerprint_chain(migrations)[-1][1],
+        'rows': {t: int(rows.get(t, 0)) for t in ('leads', 'chat_messages', 'email_queue', 'audit_logs', 'users')},
+        'queries': {},
+    }
+    if baseline and baseline.get('rows') != run['rows']:
+        print(f'warning: baseline was recorded at a different scale {baseline.get("rows")}', file=sys.stderr)
+
+    flagged = 0
+    for name in names:
+        result = run_entry(name, CATALOGUE[name], url, args.repeat)
+        result['flags'] = flags(name, result, baseline.get('queries', {}).get(name), rows, args)
+        run['queries'][name] = result
+        flagged += bool(result['flags'])
+        if 'skipped' in result:
+            print(f'{name:30} skipped ({result["skipped"]})')
+            continue
+        print(f'{name:30} {result["execution_ms"]:9.3f}ms  hit {result["shared_hit"]:>7} read {result["shared_read"]:>6}  '
+              f'{", ".join(result["indexes"]) or "-"}')
+        for flag in result['flags']:
+            print(f'    ! {flag}')
+
+    write_json(os.path.join(args.state_dir, 'runs', run['created_at'].replace(':', '') + '.json'), run)
+    if args.save_baseline:
+        write_json(baseline_path, run)
+        print(f'Baseline saved to {baseline_path}', file=sys.stderr)
+    print(f'{len(names)} queries, {flagged} flagged', file=sys.stderr)
+    sys.exit(1 if flagged and not args.save_baseline else 0)
+
+
+if __name__ == '__main__':
+    main()
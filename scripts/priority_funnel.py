@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""Priority funnel metrics: stage transitions, time in stage and conversion.
+
+Every lead carries its current priority, priority_changed_at and
+priority_previous_values (oldest first, undated). Appending the current value
+to the previous ones gives the lead's stage sequence; consecutive repeats are
+collapsed. From all sequences this computes:
+
+  * the transition matrix (from-stage × to-stage counts and row shares),
+  * how many leads ever reached each stage,
+  * time in stage: days since priority_changed_at for the current stage, and,
+    with --audit-index, the dwell between dated `lead.priority` events that
+    audit_index.py recorded on earlier runs,
+  * conversion (reached COMPLETED / NOT INTERESTED) by offering_type and by
+    discovery-call month.
+
+Stages are integer-coded once and transitions counted as from*S+to codes in a
+single pass, so a report over the whole lead base is one scan of three columns.
+Results are cached in <cache-dir>/<key>.json, keyed on the snapshot's content
+fingerprint (for db: row count and the latest updated_at / priority_changed_at),
+the --as-of date and the audit index watermark; an unchanged snapshot is
+answered from the cache without reading it.
+
+Usage:
+    python scripts/priority_funnel.py db
+    python scripts/priority_funnel.py "src/assets/All Leads Master Sheet.csv" --as-of 2026-02-01
+    python scripts/priority_funnel.py leads.colz --audit-index .cache/audit-index --format json
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from collections import Counter, defaultdict
+from datetime import date, datetime, timezone
+
+from pg_local import psql_rows
+from snapshots import db_rows, file_fingerprint, read_rows
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+CACHE_DIR = os.path.join(ROOT, '.cache', 'priority-funnel')
+CACHE_VERSION = 1
+
+# leads.priority CHECK constraint, in LeadsTable's display order
+STAGES = ['ACTIVE', 'HOT', 'LAVA', 'COLD', 'COMPLETED', 'NOT INTERESTED']
+STAGE_CODE = {s: i for i, s in enumerate(STAGES)}
+OUTCOMES = ['COMPLETED', 'NOT INTERESTED']
+COLUMNS = ['id', 'priority', 'priority_changed_at', 'priority_previous_values',
+           'offering_type', 'discovery_call_date']
+UTC_TS = "to_char({0} AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS.US\"Z\"')"
+PERCENTILES = [25, 50, 75, 90]
+
+
+def parse_previous(value):
+    """priority_previous_values from a pg array literal, sheet CSV cell or JSON list."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [v.strip().strip('"') for v in value.strip('{}').split(',')]
+    return [v.strip().upper() for v in value if v and v.strip()]
+
+
+def stage_codes(current, previous):
+    """Integer stage sequence, oldest first, unknown values dropped and repeats collapsed."""
+    codes = []
+    for value in parse_previous(previous) + ([current.strip().upper()] if current else []):
+        code = STAGE_CODE.get(value)
+        if code is not None and (not codes or codes[-1] != code):
+            codes.append(code)
+    return codes
+
+
+def parse_ts(value):
+    if not value:
+        return None
+    value = value.strip().replace(' ', 'T', 1)
+    if len(value) == 10:
+        value += 'T00:00:00'
+    stamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return stamp if stamp.tzinfo else stamp.replace(tzinfo=timezone.utc)
+
+
+def distribution(days):
+    if not days:
+        return {'n': 0}
+    days = sorted(days)
+    out = {'n': len(days), 'mean': round(sum(days) / len(days), 2)}
+    for p in PERCENTILES:
+        out[f'p{p}'] = round(days[min(len(days) - 1, len(days) * p // 100)], 2)
+    out['max'] = round(days[-1], 2)
+    return out
+
+
+def dated_dwell(index_dir):
+    """Days spent in each stage between consecutive dated lead.priority events."""
+    db = sqlite3.connect(os.path.join(index_dir, 'index.sqlite'))
+    dwell = defaultdict(list)
+    last = {}
+    for entity_id, created_at, metadata in db.execute(
+            "SELECT entity_id, created_at, metadata FROM entity_events "
+            "WHERE entity_type = 'lead' AND action = 'lead.priority' ORDER BY entity_id, created_at"):
+        stage = (json.loads(metadata or '{}').get('priority') or '').upper()
+        at = parse_ts(created_at)
+        prev = last.get(entity_id)
+        if prev and prev[0] != stage and prev[0] in STAGE_CODE:
+            dwell[prev[0]].append((at - prev[1]).total_seconds() / 86400)
+        if not prev or prev[0] != stage:
+            last[entity_id] = (stage, at)
+    db.close()
+    return dwell
+
+
+def index_watermark(index_dir):
+    path = os.path.join(index_dir, 'index.sqlite')
+    if not os.path.exists(path):
+        return None
+    db = sqlite3.connect(path)
+    row = db.execute("SELECT max(created_at) FROM entity_events WHERE action = 'lead.priority'").fetchone()
+    db.close()
+    return row[0]
+
+
+def lead_rows(source):
+    if source == 'db':
+        query = ('SELECT id, priority, ' + UTC_TS.format('priority_changed_at') + ' AS priority_changed_at, '
+                 'priority_previous_values, offering_type, discovery_call_date FROM public.leads')
+        return db_rows(f'({query}) AS l', COLUMNS)
+    return read_rows(source, COLUMNS)
+
+
+def source_fingerprint(source):
+    if source == 'db':
+        (row,) = psql_rows('SELECT count(*), max(updated_at), max(priority_changed_at) FROM public.leads;')
+        return 'db:' + '|'.join(row)
+    return file_fingerprint(source)
+
+
+def funnel(rows, as_of, dwell=None):
+    n = len(STAGES)
+    transitions = Counter()
+    reached = Counter()
+    current = Counter()
+    age = defaultdict(list)
+    groups = {'offering_type': defaultdict(Counter), 'discovery_month': defaultdict(Counter)}
+    leads = 0
+    for row in rows:
+        codes = stage_codes(row.get('priority'), row.get('priority_previous_values'))
+        if not codes:
+            continue
+        leads += 1
+        transitions.update(a * n + b for a, b in zip(codes, codes[1:]))
+        seen = set(codes)
+        reached.update(seen)
+        current[codes[-1]] += 1
+        changed = parse_ts(row.get('priority_changed_at'))
+        if changed and changed.date() <= as_of:
+            age[STAGES[codes[-1]]].append((as_of - changed.date()).days)
+        keys = {'offering_type': (row.get('offering_type') or '').strip() or '(none)',
+                'discovery_month': (row.get('discovery_call_date') or '')[:7] or '(none)'}
+        for group, key in keys.items():
+            counts = groups[group][key]
+            counts['leads'] += 1
+            counts.update(STAGES[c] for c in seen if STAGES[c] in OUTCOMES)
+
+    matrix = [[transitions[a * n + b] for b in range(n)] for a in range(n)]
+    shares = [[round(c / sum(r), 4) if sum(r) else 0.0 for c in r] for r in matrix]
+    conversion = {}
+    for group, buckets in groups.items():
+        conversion[group] = {
+            key: {'leads': c['leads'],
+                  **{f'{o.lower().replace(" ", "_")}_rate': round(c[o] / c['leads'], 4) for o in OUTCOMES},
+                  **{o: c[o] for o in OUTCOMES}}
+            for key, c in sorted(buckets.items())
+        }
+    return {
+        'as_of': as_of.isoformat(),
+        'leads': leads,
+        'stages': STAGES,
+        'current': {STAGES[c]: current[c] for c in range(n)},
+        'reached': {STAGES[c]: reached[c] for c in range(n)},
+        'transitions': matrix,
+        'transition_shares': shares,
+        'days_in_current_stage': {s: distribution(age[s]) for s in STAGES},
+        'days_in_stage_dated': {s: distribution((dwell or {}).get(s, [])) for s in STAGES} if dwell is not None else None,
+        'conversion': conversion,
+    }
+
+
+def print_report(report, out=sys.stdout):
+    stages = report['stages']
+    width = max(len(s) for s in stages)
+    print(f"{report['leads']} leads as of {report['as_of']}\n", file=out)
+    print('stage'.ljust(width), 'current', 'reached', file=out)
+    for s in stages:
+        print(s.ljust(width), str(report['current'][s]).rjust(7), str(report['reached'][s]).rjust(7), file=out)
+    print('\ntransitions (row = from, column = to)', file=out)
+    print(''.ljust(width), ' '.join(s[:6].rjust(6) for s in stages), file=out)
+    for s, row in zip(stages, report['transitions']):
+        print(s.ljust(width), ' '.join(str(c).rjust(6) for c in row), file=out)
+    for title, key in (('days in current stage', 'days_in_current_stage'),
+                       ('days in stage (dated history)', 'days_in_stage_dated')):
+        if not report.get(key):
+            continue
+        print(f'\n{title}', file=out)
+        for s, d in report[key].items():
+            if d['n']:
+                print(s.ljust(width), f"n={d['n']} p50={d['p50']} p90={d['p90']} max={d['max']}", file=out)
+    for group, buckets in report['conversion'].items():
+        print(f'\nconversion by {group}', file=out)
+        for key, c in buckets.items():
+            print(f"{key[:40]:40} {c['leads']:5}  completed {c['completed_rate']:.0%}  "
+                  f"not interested {c['not_interested_rate']:.0%}", file=out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', help="'db' or a leads snapshot (master-sheet CSV, JSON/JSONL, .colz, .xlsx)")
+    parser.add_argument('--as-of', type=date.fromisoformat, default=datetime.now(timezone.utc).date(),
+                        help='reference date for days in current stage (default: today, UTC)')
+    parser.add_argument('--audit-index', help='audit_index.py index dir with recorded lead.priority events')
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--no-cache', action='store_true', help='recompute even if a cached report exists')
+    parser.add_argument('--format', choices=['text', 'json'], default='text')
+    args = parser.parse_args()
+
+    key_parts = [str(CACHE_VERSION), source_fingerprint(args.source), args.as_of.isoformat(),
+                 str(index_watermark(args.audit_index)) if args.audit_index else '-']
+    key = hashlib.sha256('\n'.join(key_parts).encode()).hexdigest()[:32]
+    path = os.path.join(args.cache_dir, f'{key}.json')
+    if not args.no_cache and os.path.exists(path):
+        with open(path) as f:
+            report = json.load(f)
+        print(f'cached report {path}', file=sys.stderr)
+    else:
+        dwell = dated_dwell(args.audit_index) if args.audit_index else None
+        report = funnel(lead_rows(args.source), args.as_of, dwell)
+        os.makedirs(args.cache_dir, exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(report, f)
+        os.replace(path + '.tmp', path)
+        print(f'{report["leads"]} leads -> {path}', file=sys.stderr)
+
+    if args.format == 'json':
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""Measure what each table's RLS policies cost per row, and rank them.
+
+Most admin policies look up the caller's role with
+`EXISTS (SELECT 1 FROM public.users u WHERE u.id = auth.uid() AND u.role IN (...))`
+or `auth.uid() IN (SELECT id FROM public.users ...)`; whether Postgres runs that
+once per query (InitPlan) or once per row (SubPlan) decides how it scales.
+
+`list` replays every CREATE POLICY / DROP POLICY in supabase/migrations (in
+bootstrap_local_db order) and prints the policies in force, classified by shape:
+
+    role_exists     EXISTS (... users ... auth.uid() ...) role lookup
+    uid_in_users    auth.uid() IN (SELECT ... users ...)
+    helper          calls a public.is_* helper (is_room_member, ...)
+    owner           compares a column with auth.uid()
+    constant        true / false
+    other
+
+and whether auth.uid() is called bare (re-evaluated per row) rather than as
+`(SELECT auth.uid())`.
+
+`profile` runs against a populated database (the plan_bench.py bench database
+by default, which has auth.uid() from the pg_local shim) and measures each
+SELECT policy that applies to `authenticated` on its own, as found in
+pg_policies. It counts the first N rows (each of --rows) with EXPLAIN ANALYZE
+as the superuser (RLS bypassed), then per policy as `authenticated` with
+request.jwt.claim.sub set to an owner/admin (or --as member), inside a
+transaction that grants SELECT to authenticated and drops the table's other
+policies (a restrictive policy keeps a permissive `true` companion), and is
+rolled back. The difference per row is the policy overhead; SubPlan loop
+counts in the RLS plan show which lookups ran per row. Policies are ranked by
+overhead at the largest N; results go to <state-dir>/<timestamp>.json.
+
+Usage:
+    python scripts/rls_profile.py list [--table leads]
+    python scripts/plan_bench.py --seed --leads 200000 && python scripts/rls_profile.py profile
+    python scripts/rls_profile.py profile --rows 1000,10000,100000 --table audit_logs,email_queue
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+
+from bootstrap_local_db import MIGRATIONS_DIR, migration_order
+from pg_local import copy_out, database_url, psql, psql_rows
+from plan_bench import BENCH_DB, walk
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+STATE_DIR = os.path.join(ROOT, '.cache', 'rls-profile')
+
+CREATE_POLICY = re.compile(
+    r'CREATE\s+POLICY\s+("[^"]+"|\w+)\s+ON\s+([\w."]+)(?:\s+AS\s+(PERMISSIVE|RESTRICTIVE))?'
+    r'(?:\s+FOR\s+(ALL|SELECT|INSERT|UPDATE|DELETE))?(?:\s+TO\s+([\w\s,]+?))?(?=\s+USING|\s+WITH\s+CHECK|\s*;)',
+    re.I)
+DROP_POLICY = re.compile(r'DROP\s+POLICY\s+(?:IF\s+EXISTS\s+)?("[^"]+"|\w+)\s+ON\s+([\w."]+)', re.I)
+CLAUSE = re.compile(r'\s*(USING|WITH\s+CHECK)\s*\(', re.I)
+
+SHAPES = [
+    ('role_exists', re.compile(r'EXISTS\s*\(\s*SELECT.*?\busers\b.*?auth\.uid\(\)', re.I | re.S)),
+    ('uid_in_users', re.compile(r'auth\.uid\(\)\s+IN\s*\(\s*SELECT.*?\busers\b', re.I | re.S)),
+    ('helper', re.compile(r'\bis_\w+\s*\(', re.I)),
+    ('owner', re.compile(r'\w+\s*=\s*\(?\s*(?:SELECT\s+)?auth\.uid\(\)|auth\.uid\(\)\s*=\s*\w+', re.I)),
+    ('constant', re.compile(r'^\s*\(?\s*(true|false)\s*\)?\s*$', re.I)),
+]
+BARE_UID = re.compile(r'(?<!SELECT )auth\.uid\(\)', re.I)
+DEFAULT_ROWS = [1000, 10000, 100000]
+
+
+def strip_comments(sql):
+    return re.sub(r'--[^\n]*', '', sql)
+
+
+def balanced(sql, start):
+    """Index just past the ')' closing the '(' at sql[start - 1]."""
+    depth, i, quote = 1, start, None
+    while i < len(sql) and depth:
+        ch = sql[i]
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in '\'"':
+            quote = ch
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        i += 1
+    return i
+
+
+def table_name(name):
+    """'public.leads' -> 'leads'; other schemas stay qualified ('storage.objects')."""
+    name = name.replace('"', '')
+    return name[len('public.'):] if name.startswith('public.') else name
+
+
+def qualified(table):
+    return table if '.' in table else f'public.{table}'
+
+
+def parse_policies(migrations_dir=MIGRATIONS_DIR):
+    """{(table, policy): policy dict} in force after replaying every migration."""
+    policies = {}
+    for migration in migration_order(migrations_dir):
+        with open(os.path.join(migrations_dir, migration)) as f:
+            sql = strip_comments(f.read())
+        events = [(m.start(), 'drop', m) for m in DROP_POLICY.finditer(sql)]
+        events += [(m.start(), 'create', m) for m in CREATE_POLICY.finditer(sql)]
+        for _, kind, m in sorted(events, key=lambda e: e[0]):
+            key = (table_name(m.group(2)), m.group(1).strip('"'))
+            if kind == 'drop':
+                policies.pop(key, None)
+                continue
+            policy = {'table': key[0], 'name': key[1], 'migration': migration,
+                      'permissive': (m.group(3) or 'PERMISSIVE').upper() == 'PERMISSIVE',
+                      'command': (m.group(4) or 'ALL').upper(),
+                      'roles': [r.strip() for r in (m.group(5) or 'public').split(',')],
+                      'using': None, 'check': None}
+            pos = m.end()
+            while True:
+                clause = CLAUSE.match(sql, pos)
+                if not clause:
+                    break
+                end = balanced(sql, clause.end())
+                policy['using' if clause.group(1).upper() == 'USING' else 'check'] = \
+                    ' '.join(sql[clause.end():end - 1].split())
+                pos = end
+            policies[key] = policy
+    return policies
+
+
+def classify(expr):
+    if not expr:
+        return None, False
+    shape = next((name for name, pattern in SHAPES if pattern.search(expr)), 'other')
+    return shape, bool(BARE_UID.search(expr))
+
+
+def explain_ms(sql, url, setup, repeat):
+    runs = []
+    for i in range(repeat + 1):
+        out = psql(f'BEGIN;\n{setup}EXPLAIN (ANALYZE, FORMAT JSON) {sql};\nROLLBACK;\n', url)
+        runs.append(json.loads(out[out.index('['):])[0])
+    runs = runs[1:]  # first run warms the cache
+    subplans = {}
+    for node in walk(runs[-1]['Plan']):
+        if node.get('Parent Relationship') in ('SubPlan', 'InitPlan'):
+            label = f"{node.get('Subplan Name', node['Parent Relationship'])}: {node['Node Type']}"
+            subplans[label] = node.get('Actual Loops', 0)
+    return statistics.median(r['Execution Time'] for r in runs), subplans
+
+
+def quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def db_select_policies(url, tables=None):
+    """table -> SELECT policies applying to authenticated, from pg_policies."""
+    out = {}
+    for schema, table, name, mode, roles, cmd, qual in copy_out(
+            'SELECT schemaname, tablename, policyname, permissive, roles::text, cmd, qual FROM pg_policies '
+            'ORDER BY 1, 2, 3', url):
+        table = table_name(f'{schema}.{table}')
+        out.setdefault(table, {'all': [], 'select': []})['all'].append(name)
+        if tables and table not in tables:
+            continue
+        applies = {'authenticated', 'public'} & set(roles.strip('{}').split(','))
+        if cmd in ('ALL', 'SELECT') and qual and applies:
+            out[table]['select'].append({'name': name, 'permissive': mode == 'PERMISSIVE', 'using': qual})
+    return {table: t for table, t in out.items() if t['select']}
+
+
+def isolate_policy(table, policy, names):
+    """SQL run before SET ROLE: only `policy` is left on `table` (rolled back with the rest)."""
+    sql = ''.join(f'DROP POLICY {quote_ident(name)} ON {qualified(table)};\n'
+                  for name in names if name != policy['name'])
+    if not policy['permissive']:
+        sql += f'CREATE POLICY rls_profile_all ON {qualified(table)} FOR SELECT USING (true);\n'
+    return sql
+
+
+def profile_table(table, url, rows_list, setup, repeat, table_policies):
+    """(total rows, {policy name: results}) measuring each SELECT policy alone."""
+    (total,) = psql_rows(f'SELECT count(*) FROM {qualified(table)};', url)[0]
+    rows_list = [n for n in rows_list if n <= int(total)]
+    off = {}
+    for n in rows_list:
+        off[n], _ = explain_ms(f'SELECT count(*) FROM (SELECT * FROM {qualified(table)} LIMIT {n}) s', url, '', repeat)
+    results = {}
+    for policy in table_policies['select']:
+        isolate = isolate_policy(table, policy, table_policies['all'])
+        results[policy['name']] = []
+        for n in rows_list:
+            sql = f'SELECT count(*) FROM (SELECT * FROM {qualified(table)} LIMIT {n}) s'
+            on, subplans = explain_ms(sql, url, isolate + setup, repeat)
+            results[policy['name']].append({
+                'rows': n, 'rls_off_ms': round(off[n], 3), 'rls_on_ms': round(on, 3),
+                'overhead_us_per_row': round((on - off[n]) * 1000 / n, 3), 'subplans': subplans})
+    return int(total), results
+
+
+def caller_setup(url, as_role):
+    where = "role IN ('owner', 'admin')" if as_role == 'admin' else "role NOT IN ('owner', 'admin')"
+    rows = psql_rows(f'SELECT id FROM public.users WHERE {where} LIMIT 1;', url)
+    if not rows:
+        sys.exit(f'no {as_role} user in public.users; seed with plan_bench.py --seed first')
+    # the grant lives in each measurement's transaction and is rolled back with it
+    return ('GRANT SELECT ON ALL TABLES IN SCHEMA public TO authenticated;\n'
+            f"SET LOCAL ROLE authenticated;\nSET LOCAL request.jwt.claim.sub = '{rows[0][0]}';\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['list', 'profile'])
+    parser.add_argument('--table', help='comma-separated tables (default: all with SELECT policies)')
+    parser.add_argument('--db', default=BENCH_DB, help='populated database to profile')
+    parser.add_argument('--rows', default=','.join(map(str, DEFAULT_ROWS)), help='row counts to measure at')
+    parser.add_argument('--as', dest='as_role', choices=['admin', 'member'], default='admin')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--state-dir', default=STATE_DIR)
+    args = parser.parse_args()
+
+    tables = set(args.table.split(',')) if args.table else None
+    policies = parse_policies()
+
+    if args.command == 'list':
+        for (table, name), p in sorted(policies.items()):
+            if tables and table not in tables:
+                continue
+            for clause in ('using', 'check'):
+                shape, bare = classify(p[clause])
+                if shape:
+                    print(f'{table:32} {p["command"]:6} {clause:5} {shape:12} {"bare-uid" if bare else "":8} '
+                          f'{name}  ({p["migration"]})')
+        return
+
+    url = database_url(args.db)
+    setup = caller_setup(url, args.as_role)
+    rows_list = sorted(int(n) for n in args.rows.split(','))
+    report = {'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), 'as': args.as_role, 'tables': {}}
+    for table, table_policies in sorted(db_select_policies(url, tables).items()):
+        try:
+            total, results = profile_table(table, url, rows_list, setup, args.repeat, table_policies)
+        except RuntimeError as e:
+            print(f'{table}: skipped ({str(e).splitlines()[0]})', file=sys.stderr)
+            continue
+        if not any(results.values()):
+            print(f'{table}: fewer than {rows_list[0]} rows, skipped', file=sys.stderr)
+            continue
+        migrations = {p['name']: p['migration'] for (t, _), p in policies.items() if t == table}
+        report['tables'][table] = {
+            'total_rows': total,
+            'policies': [{'name': p['name'], 'shape': classify(p['using'])[0], 'bare_uid': classify(p['using'])[1],
+                          'permissive': p['permissive'], 'migration': migrations.get(p['name']),
+                          'using': p['using'], 'results': results[p['name']]} for p in table_policies['select']],
+        }
+        for p in report['tables'][table]['policies']:
+            last = p['results'][-1]
+            print(f'{table:32} {p["name"][:40]:40} {last["rows"]:>7} rows  off {last["rls_off_ms"]:9.3f}ms  '
+                  f'on {last["rls_on_ms"]:9.3f}ms  {last["overhead_us_per_row"]:8.3f}us/row', file=sys.stderr)
+
+    ranked = sorted(((table, p) for table, t in report['tables'].items() for p in t['policies']),
+                    key=lambda tp: -tp[1]['results'][-1]['overhead_us_per_row'])
+    print(f'\n{"table":32} {"us/row":>9} {"rows":>8}  policy [shape] (per-row subplans)')
+    for table, p in ranked:
+        last = p['results'][-1]
+        per_row = [f'{k} x{v}' for k, v in last['subplans'].items() if v >= last['rows']]
+        print(f'{table:32} {last["overhead_us_per_row"]:9.3f} {last["rows"]:>8}  '
+              f'{p["name"]} [{p["shape"]}{", bare uid" if p["bare_uid"] else ""}'
+              f'{"" if p["permissive"] else ", restrictive"}]'
+              + (f'\n{"":52}per row: {"; ".join(per_row)}' if per_row else ''))
+
+    os.makedirs(args.state_dir, exist_ok=True)
+    path = os.path.join(args.state_dir, report['created_at'].replace(':', '') + '.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(path + '.tmp', path)
+    print(f'{len(ranked)} policies on {len(report["tables"])} tables profiled -> {path}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""Small mergeable sketches for rollup jobs (no third-party dependencies).
+
+DurationSketch: log-bucketed histogram with bounded relative error (the
+DDSketch idea). Buckets are plain counts, so sketches merge by addition and a
+value can be removed again, which heartbeat updates need.
+
+SessionCounter: HyperLogLog distinct counter. Registers merge with max(), so
+per-key counters can be rolled up to any coarser grouping.
+"""
+import base64
+import hashlib
+import math
+
+
+class DurationSketch:
+    def __init__(self, relative_accuracy=0.02, buckets=None, zeros=0):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets = buckets or {}
+        self.zeros = zeros
+
+    @property
+    def count(self):
+        return self.zeros + sum(self.buckets.values())
+
+    def key(self, value):
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def add(self, value, n=1):
+        if value <= 0:
+            self.zeros += n
+            return
+        k = self.key(value)
+        c = self.buckets.get(k, 0) + n
+        if c:
+            self.buckets[k] = c
+        else:
+            del self.buckets[k]
+
+    def remove(self, value):
+        self.add(value, -1)
+
+    def merge(self, other):
+        self.zeros += other.zeros
+        for k, c in other.buckets.items():
+            self.buckets[k] = self.buckets.get(k, 0) + c
+        return self
+
+    def quantile(self, q):
+        total = self.count
+        if total <= 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if rank < seen:
+                # midpoint of the bucket in log space keeps the error symmetric
+                return 2 * self.gamma ** k / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+    def to_dict(self):
+        return {'a': self.relative_accuracy, 'z': self.zeros,
+                'b': {str(k): c for k, c in sorted(self.buckets.items())}}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['a'], {int(k): c for k, c in data['b'].items()}, data['z'])
+
+
+class SessionCounter:
+    def __init__(self, precision=10, registers=None):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.m)
+
+    def add(self, item):
+        h = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), 'big')
+        idx = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other):
+        for i, r in enumerate(other.registers):
+            if r > self.registers[i]:
+                self.registers[i] = r
+        return self
+
+    def estimate(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        empty = self.registers.count(0)
+        if raw <= 2.5 * m and empty:
+            return round(m * math.log(m / empty))
+        return round(raw)
+
+    def to_str(self):
+        return base64.b64encode(bytes(self.registers)).decode()
+
+    @classmethod
+    def from_str(cls, data, precision=10):
+        return cls(precision, bytearray(base64.b64decode(data)))
@@ -0,0 +1,129 @@
+"""Read table snapshots (CSV / JSON / JSONL exports or a live database) as dicts.
+
+Every batch tool in this folder works off "a snapshot" of one or more tables.
+A snapshot can be:
+  * a CSV export with database column names as headers,
+  * the sales team's master-sheet CSV (detected by its `Entry ID` header and
+    mapped through generate_seed_sql.COL_MAP, same as the SQL generator),
+  * a JSON array or JSON-lines file of row objects,
+  * a columnar .colz / .parquet snapshot written by columnar.py (only the
+    requested columns are read),
+  * an .xlsx workbook, streamed by xlsx_reader (the masterclass workbook's
+    header row is mapped to leads columns, like the master-sheet CSV),
+  * `db:<table>` to stream the table out of DATABASE_URL with COPY.
+"""
+import csv
+import hashlib
+import json
+import os
+
+from generate_seed_sql import COL_MAP, clean, unmapped_columns
+from pg_local import copy_out, psql_rows
+from xlsx_reader import xlsx_rows
+
+MASTER_ID_HEADER = 'Entry ID'
+
+
+def normalize_email(email):
+    if not email:
+        return None
+    email = email.strip().lower()
+    return email if '@' in email else None
+
+
+def master_sheet_rows(path):
+    """Yield leads rows from the master-sheet CSV, keyed by database column."""
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        headers = next(reader)
+        mapped = [(i, COL_MAP[h]) for i, h in enumerate(headers) if h in COL_MAP]
+        # the sheet has two 'Balance ' columns: balance, then balance_2
+        balances = [i for i, h in enumerate(headers) if h.strip() == 'Balance']
+        custom = unmapped_columns(headers)
+        for row in reader:
+            if not any(row):
+                continue
+            rec = {}
+            for i, col in mapped:
+                rec[col] = clean(row[i]) if i < len(row) else None
+            for col, i in zip(('balance', 'balance_2'), balances):
+                rec[col] = clean(row[i]) if i < len(row) else None
+            # other columns go to custom_fields under generate_seed_sql's keys (values uncoerced)
+            extras = {key: clean(row[i]) for i, _, key in custom if i < len(row) and clean(row[i]) is not None}
+            if extras:
+                rec['custom_fields'] = extras
+            yield rec
+
+
+def csv_rows(path):
+    with open(path, newline='') as f:
+        sample = f.readline()
+    if MASTER_ID_HEADER in sample:
+        yield from master_sheet_rows(path)
+        return
+    delimiter = ';' if sample.count(';') > sample.count(',') else ','
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f, delimiter=delimiter):
+            yield {k: (v if v != '' else None) for k, v in row.items()}
+
+
+def json_rows(path):
+    with open(path) as f:
+        first = f.read(1)
+        f.seek(0)
+        if first == '[':
+            yield from json.load(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def table_columns(table, url=None):
+    schema, _, name = table.rpartition('.')
+    rows = psql_rows(
+        "SELECT column_name FROM information_schema.columns "
+        f"WHERE table_schema = '{schema or 'public'}' AND table_name = '{name}' ORDER BY ordinal_position;",
+        url,
+    )
+    return [r[0] for r in rows]
+
+
+def db_rows(table, columns=None, where=None, url=None):
+    """Stream rows of `table` from the database as dicts (all values as text)."""
+    columns = columns or table_columns(table, url)
+    query = f'SELECT {", ".join(columns)} FROM {table}'
+    if where:
+        query += f' WHERE {where}'
+    for values in copy_out(query, url):
+        yield dict(zip(columns, values))
+
+
+def read_rows(source, columns=None):
+    """Yield row dicts from a snapshot path or `db:<table>`."""
+    if source.startswith('db:'):
+        yield from db_rows(source[3:], columns)
+        return
+    ext = os.path.splitext(source)[1].lower()
+    if ext == '.csv':
+        yield from csv_rows(source)
+    elif ext in ('.json', '.jsonl', '.ndjson'):
+        yield from json_rows(source)
+    elif ext == '.xlsx':
+        yield from xlsx_rows(source)
+    elif ext in ('.colz', '.parquet'):
+        from columnar import snapshot_rows  # columnar imports this module
+        yield from snapshot_rows(source, columns)
+    else:
+        raise ValueError(f'Unsupported snapshot format: {source}')
+
+
+def file_fingerprint(*paths):
+    """Content hash over one or more snapshot files (order-sensitive)."""
+    h = hashlib.sha256()
+    for path in paths:
+        h.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    return h.hexdigest()
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""Replay exported Stripe events and reconcile purchases in bulk.
+
+The stripe-webhook edge function handles one event per request with a chain of
+lookups and writes (webinar_purchases, leads, webinar_leads, users,
+cohort_memberships). After an outage, or to re-derive state, this replays an
+exported event stream instead: events are deduped by id against a persistent
+idempotency store, ordered by `created`, folded into one final state per
+checkout session and applied as a handful of set-based statements in a
+single transaction.
+
+Effects mirror the webhook:
+  checkout.session.completed  purchase upsert; paid sprint/test purchases set
+                              leads to COMPLETED and move existing participants
+                              to sprint_member + the sprint cohort; paid
+                              webinar purchases mark webinar_leads paid and
+                              move participants to webinar_member
+  checkout.session.expired    purchase -> expired, pending webinar_leads -> unpaid
+  charge.refunded             purchase -> refunded, webinar_leads -> refunded
+
+Creating auth users and sending credential emails stay with the webhook;
+buyers without a public.users row are listed in the report instead.
+
+State lives in --state-dir (default .cache/stripe-replay):
+    events.sqlite   ids of events already applied
+
+Usage:
+    python scripts/stripe_replay.py events.jsonl --dry-run   # report only
+    python scripts/stripe_replay.py events.jsonl             # apply to DATABASE_URL
+    python scripts/stripe_replay.py events.jsonl --sql out.sql
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from datetime import datetime, timezone
+
+from pg_local import copy_block, pg_array, psql_rows, psql_stream, sql_literal
+from snapshots import json_rows, normalize_email
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+STATE_DIR = os.path.join(ROOT, '.cache', 'stripe-replay')
+
+HANDLED = ('checkout.session.completed', 'checkout.session.expired', 'charge.refunded')
+
+# Keep in sync with supabase/functions/stripe-webhook/index.ts
+SPRINT_FALLBACK_COHORT_ID = '813335a5-3d30-497c-a27d-f2702020f6b2'
+WEBINAR_COHORT_ID = '773335a5-3d30-497c-a27d-f2702020e9a9'
+SPRINT_PRODUCTS = {'sprint', 'test'}
+SPRINT_DEFAULT_AMOUNT = 12500
+
+# a purchase only moves forward; a redelivered event never undoes a later one
+STATUS_RANK = {'pending': 0, 'expired': 1, 'completed': 2, 'refunded': 3}
+# STATUS_RANK as SQL, to compare replayed and stored statuses (unknown ones rank lowest)
+RANK_SQL = '(CASE {} ' + ' '.join(f"WHEN '{s}' THEN {r}" for s, r in STATUS_RANK.items()) + ' ELSE -1 END)'
+
+PURCHASE_COLUMNS = ['stripe_session_id', 'has_checkout', 'customer_email', 'customer_name',
+                    'stripe_payment_intent_id', 'stripe_customer_id', 'products', 'amount_total',
+                    'currency', 'status', 'completed_at', 'metadata']
+REFUND_COLUMNS = ['stripe_payment_intent_id', 'event_id']
+BUYER_COLUMNS = ['email', 'full_name', 'kind', 'amount_total', 'products', 'paid_at', 'refunded', 'expired']
+
+
+class Purchase:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.has_checkout = False
+        self.email = None
+        self.name = None
+        self.payment_intent = None
+        self.customer = None
+        self.products = []
+        self.amount_total = 0
+        self.currency = 'usd'
+        self.status = None
+        self.paid_at = None
+        self.metadata = {}
+        self.events = 0
+
+    @property
+    def kind(self):
+        return 'sprint' if SPRINT_PRODUCTS & set(self.products) else 'webinar'
+
+    def set_status(self, status):
+        if self.status is None or STATUS_RANK[status] >= STATUS_RANK[self.status]:
+            self.status = status
+
+    def completed(self, event, session):
+        meta = session.get('metadata') or {}
+        self.has_checkout = True
+        self.email = normalize_email(session.get('customer_email') or meta.get('customer_email')) or self.email
+        self.name = meta.get('customer_name') or self.name or ''
+        self.products = json.loads(meta['products']) if meta.get('products') else self.products
+        self.payment_intent = session.get('payment_intent') or self.payment_intent
+        self.customer = session.get('customer') or self.customer
+        self.amount_total = session.get('amount_total') or 0
+        self.currency = session.get('currency') or 'usd'
+        paid = session.get('payment_status') == 'paid'
+        if paid and self.paid_at is None:
+            self.paid_at = event_time(event)
+        self.metadata.update(payment_status=session.get('payment_status'), stripe_event_id=event['id'])
+        self.set_status('completed' if paid else 'pending')
+
+    def expired(self, event, session):
+        meta = session.get('metadata') or {}
+        self.email = self.email or normalize_email(session.get('customer_email') or meta.get('customer_email'))
+        self.set_status('expired')
+
+    def refunded(self, event):
+        self.metadata['refund_event_id'] = event['id']
+        self.set_status('refunded')
+
+    def row(self):
+        return [self.session_id, self.has_checkout, self.email, self.name, self.payment_intent,
+                self.customer, pg_array(self.products), self.amount_total, self.currency,
+                self.status, self.paid_at, json.dumps(self.metadata)]
+
+    def buyer_row(self):
+        return [self.email, self.name, self.kind, self.amount_total, ', '.join(self.products),
+                self.paid_at, self.status == 'refunded', self.status == 'expired']
+
+
+def event_time(event):
+    return datetime.fromtimestamp(int(event.get('created') or 0), timezone.utc).isoformat()
+
+
+class EventStore:
+    """sqlite set of applied event ids; only written after a successful apply."""
+
+    def __init__(self, state_dir=STATE_DIR):
+        os.makedirs(state_dir, exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(state_dir, 'events.sqlite'))
+        self.db.execute('CREATE TABLE IF NOT EXISTS applied '
+                        '(event_id TEXT PRIMARY KEY, type TEXT, created INTEGER, applied_at TEXT)')
+
+    def seen(self, ids, chunk=500):
+        found = set()
+        for i in range(0, len(ids), chunk):
+            part = ids[i:i + chunk]
+            marks = ','.join('?' * len(part))
+            found.update(r[0] for r in self.db.execute(
+                f'SELECT event_id FROM applied WHERE event_id IN ({marks})', part))
+        return found
+
+    def mark(self, events):
+        now = datetime.now(timezone.utc).isoformat()
+        with self.db:
+            self.db.executemany('INSERT OR IGNORE INTO applied VALUES (?, ?, ?, ?)',
+                                [(e['id'], e['type'], e.get('created'), now) for e in events])
+
+
+def new_events(path, store):
+    """Handled events not applied before, deduped and in replay order."""
+    by_id = {}
+    for event in json_rows(path):
+        if event.get('type') in HANDLED and event.get('id'):
+            by_id.setdefault(event['id'], event)
+    seen = store.seen(list(by_id))
+    events = [e for i, e in by_id.items() if i not in seen]
+    events.sort(key=lambda e: (int(e.get('created') or 0), e['id']))
+    return events, len(seen)
+
+
+def fold(events):
+    """Fold ordered events into per-session purchases plus refunds for unknown sessions."""
+    purchases = {}
+    by_intent = {}
+    refunds = {}
+    for event in events:
+        obj = event['data']['object']
+        if event['type'] == 'charge.refunded':
+            intent = obj.get('payment_intent')
+            session_id = by_intent.get(intent)
+            if session_id:
+                purchases[session_id].refunded(event)
+                purchases[session_id].events += 1
+            elif intent:
+                # purchase was completed before this export; match it in SQL
+                refunds[intent] = event['id']
+            continue
+        purchase = purchases.get(obj['id'])
+        if purchase is None:
+            purchase = purchases[obj['id']] = Purchase(obj['id'])
+        if event['type'] == 'checkout.session.completed':
+            purchase.completed(event, obj)
+            if purchase.payment_intent:
+                by_intent[purchase.payment_intent] = purchase.session_id
+        else:
+            purchase.expired(event, obj)
+        purchase.events += 1
+    return purchases, refunds
+
+
+def current_state(purchases, refunds, url=None):
+    """Fetch the rows the replay would touch, for the diff report."""
+    sessions = pg_array(sorted(purchases))
+    existing = {}
+    for sid, status, amount, intent in psql_rows(
+            'SELECT stripe_session_id, status, amount_total, coalesce(stripe_payment_intent_id, \'\') '
+            f'FROM public.webinar_purchases WHERE stripe_session_id = ANY({sql_literal(sessions)}::text[]);', url):
+        existing[sid] = (status, int(amount or 0), intent or None)
+    refunded = {r[0]: r[1] for r in psql_rows(
+        'SELECT stripe_payment_intent_id, status FROM public.webinar_purchases '
+        f'WHERE stripe_payment_intent_id = ANY({sql_literal(pg_array(sorted(refunds)))}::text[]);', url)}
+    emails = pg_array(sorted({p.email for p in purchases.values() if p.email}))
+    users = {r[0]: r[1] for r in psql_rows(
+        'SELECT lower(email), role FROM public.users '
+        f'WHERE lower(email) = ANY({sql_literal(emails)}::text[]);', url)}
+    leads = {r[0] for r in psql_rows(
+        'SELECT DISTINCT lower(email) FROM public.leads '
+        f'WHERE lower(email) = ANY({sql_literal(emails)}::text[]);', url)}
+    return existing, refunded, users, leads
+
+
+def outranks(status, stored):
+    """Whether a replayed status may replace the stored one (never moves a purchase backwards)."""
+    return STATUS_RANK[status] >= STATUS_RANK.get(stored, -1)
+
+
+def diff_report(purchases, refunds, current):
+    existing, refunded, users, leads = current
+    report = {'purchases': {'new': 0, 'changed': 0, 'unchanged': 0, 'missing': 0},
+              'refunds_by_intent': {'matched': 0, 'already_refunded': 0, 'missing': 0},
+              'leads': {'insert': 0, 'update': 0},
+              'users_updated': 0, 'needs_provisioning': [], 'changes': []}
+    paid = set()
+    for p in purchases.values():
+        before = existing.get(p.session_id)
+        if before is None:
+            report['purchases']['new' if p.has_checkout else 'missing'] += 1
+            if p.has_checkout:
+                report['changes'].append({'session': p.session_id, 'status': [None, p.status]})
+        else:
+            status = p.status if outranks(p.status, before[0]) else before[0]
+            if before[0] != status or (p.has_checkout and before[1:] != (p.amount_total, p.payment_intent)):
+                report['purchases']['changed'] += 1
+                report['changes'].append({'session': p.session_id, 'status': [before[0], status],
+                                          'amount_total': [before[1], p.amount_total]})
+            else:
+                report['purchases']['unchanged'] += 1
+        if p.paid_at and p.email:
+            paid.add((p.email, p.kind))
+    for intent in refunds:
+        status = refunded.get(intent)
+        key = 'missing' if status is None else 'already_refunded' if status == 'refunded' else 'matched'
+        report['refunds_by_intent'][key] += 1
+    for email, kind in sorted(paid):
+        if kind == 'sprint':
+            report['leads']['update' if email in leads else 'insert'] += 1
+        if email not in users:
+            report['needs_provisioning'].append({'email': email, 'kind': kind})
+        elif users[email] == 'participant':
+            report['users_updated'] += 1
+    return report
+
+
+def apply_script(purchases, refunds):
+    """One transaction: COPY the folded state into temp tables, then set-based writes."""
+    replayed, stored = RANK_SQL.format('s.status'), RANK_SQL.format('wp.status')
+    yield ('BEGIN;\n'
+           'CREATE TEMP TABLE replay_purchases (stripe_session_id text PRIMARY KEY, has_checkout boolean, '
+           'customer_email text, customer_name text, stripe_payment_intent_id text, stripe_customer_id text, '
+           'products text[], amount_total integer, currency text, status text, completed_at timestamptz, '
+           'metadata jsonb) ON COMMIT DROP;\n'
+           'CREATE TEMP TABLE replay_refunds (stripe_payment_intent_id text PRIMARY KEY, event_id text) '
+           'ON COMMIT DROP;\n'
+           'CREATE TEMP TABLE replay_buyers (email text, full_name text, kind text, amount_total integer, '
+           'products text, paid_at timestamptz, refunded boolean, expired boolean) ON COMMIT DROP;\n')
+    yield from copy_block('replay_purchases', PURCHASE_COLUMNS, (p.row() for p in purchases.values()))
+    yield from copy_block('replay_refunds', REFUND_COLUMNS, refunds.items())
+    yield from copy_block('replay_buyers', BUYER_COLUMNS,
+                          (p.buyer_row() for p in purchases.values() if p.email))
+    yield f"""
+-- Purchases seen via checkout.session.completed: full update, insert when missing;
+-- the status only moves forward (a purchase refunded since the export stays refunded)
+UPDATE public.webinar_purchases wp SET
+    status = CASE WHEN {replayed} >= {stored} THEN s.status ELSE wp.status END,
+    stripe_payment_intent_id = s.stripe_payment_intent_id,
+    stripe_customer_id = s.stripe_customer_id, amount_total = s.amount_total, currency = s.currency,
+    completed_at = s.completed_at, metadata = s.metadata, updated_at = now()
+FROM replay_purchases s
+WHERE s.has_checkout AND wp.stripe_session_id = s.stripe_session_id;
+
+INSERT INTO public.webinar_purchases (customer_email, customer_name, stripe_session_id,
+    stripe_payment_intent_id, stripe_customer_id, products, amount_total, currency, status,
+    completed_at, metadata)
+SELECT s.customer_email, s.customer_name, s.stripe_session_id, s.stripe_payment_intent_id,
+    s.stripe_customer_id, s.products, s.amount_total, s.currency, s.status, s.completed_at,
+    s.metadata || '{{"created_via": "stripe_replay"}}'::jsonb
+FROM replay_purchases s
+WHERE s.has_checkout
+  AND NOT EXISTS (SELECT 1 FROM public.webinar_purchases wp WHERE wp.stripe_session_id = s.stripe_session_id);
+
+-- Sessions that only expired: status only, never inserted (same as the webhook)
+UPDATE public.webinar_purchases wp SET status = s.status, updated_at = now()
+FROM replay_purchases s
+WHERE NOT s.has_checkout AND wp.stripe_session_id = s.stripe_session_id
+  AND {replayed} >= {stored};
+
+-- Refunds for purchases completed before this export
+UPDATE public.webinar_purchases wp SET
+    status = 'refunded', metadata = wp.metadata || jsonb_build_object('refund_event_id', r.event_id),
+    updated_at = now()
+FROM replay_refunds r
+WHERE wp.stripe_payment_intent_id = r.stripe_payment_intent_id;
+
+INSERT INTO replay_buyers (email, refunded)
+SELECT DISTINCT lower(wp.customer_email), true
+FROM public.webinar_purchases wp JOIN replay_refunds r USING (stripe_payment_intent_id)
+WHERE wp.customer_email IS NOT NULL;
+
+-- Sprint/test buyers: leads -> COMPLETED (update by email, insert the rest)
+CREATE TEMP TABLE replay_sprint_leads ON COMMIT DROP AS
+SELECT DISTINCT ON (email) email, full_name, paid_at, products,
+    coalesce(nullif(amount_total, 0) / 100.0, {SPRINT_DEFAULT_AMOUNT}) AS amount
+FROM replay_buyers WHERE kind = 'sprint' AND paid_at IS NOT NULL
+ORDER BY email, paid_at DESC;
+
+UPDATE public.leads l SET
+    full_name = s.full_name, priority = 'COMPLETED', offering_type = 'sprint_workshop',
+    payment_amount = s.amount, amount_paid = s.amount, paid_full = true,
+    date_of_payment = s.paid_at::date,
+    notes = 'Automatically created via Stripe checkout completion. Product: ' || s.products,
+    updated_at = now()
+FROM replay_sprint_leads s
+WHERE lower(l.email) = s.email;
+
+INSERT INTO public.leads (full_name, email, priority, offering_type, payment_amount, amount_paid,
+    paid_full, date_of_payment, notes)
+SELECT s.full_name, s.email, 'COMPLETED', 'sprint_workshop', s.amount, s.amount, true, s.paid_at::date,
+    'Automatically created via Stripe checkout completion. Product: ' || s.products
+FROM replay_sprint_leads s
+WHERE NOT EXISTS (SELECT 1 FROM public.leads l WHERE lower(l.email) = s.email);
+
+-- webinar_leads: final payment state per email
+UPDATE public.webinar_leads wl SET
+    payment_status = 'paid', amount_paid = b.amount_total, status = 'registered', updated_at = now()
+FROM (SELECT DISTINCT ON (email) email, amount_total FROM replay_buyers
+      WHERE kind = 'webinar' AND paid_at IS NOT NULL AND NOT refunded ORDER BY email, paid_at DESC) b
+WHERE lower(wl.email) = b.email;
+
+UPDATE public.webinar_leads wl SET payment_status = 'refunded', amount_paid = 0
+FROM (SELECT DISTINCT email FROM replay_buyers WHERE refunded) b
+WHERE lower(wl.email) = b.email;
+
+UPDATE public.webinar_leads wl SET payment_status = 'unpaid'
+FROM (SELECT DISTINCT email FROM replay_buyers WHERE expired) b
+WHERE lower(wl.email) = b.email AND wl.payment_status = 'pending';
+
+-- Existing users: participants get the member type, everyone gets the cohort
+CREATE TEMP TABLE replay_members ON COMMIT DROP AS
+SELECT DISTINCT u.id AS user_id, u.role, b.kind,
+    CASE b.kind WHEN 'sprint' THEN coalesce(
+        (SELECT id FROM public.cohorts WHERE offering_type = 'sprint_workshop'
+            AND status IN ('upcoming', 'active') ORDER BY start_date ASC LIMIT 1),
+        (SELECT id FROM public.cohorts WHERE offering_type = 'sprint_workshop'
+            ORDER BY start_date DESC LIMIT 1),
+        '{SPRINT_FALLBACK_COHORT_ID}'::uuid)
+    ELSE '{WEBINAR_COHORT_ID}'::uuid END AS cohort_id
+FROM replay_buyers b JOIN public.users u ON lower(u.email) = b.email
+WHERE b.paid_at IS NOT NULL;
+
+UPDATE public.users u SET
+    user_type = (CASE m.kind WHEN 'sprint' THEN 'sprint_member' ELSE 'webinar_member' END)::user_type
+FROM replay_members m
+WHERE u.id = m.user_id AND m.role = 'participant';
+
+INSERT INTO public.cohort_memberships (user_id, cohort_id)
+SELECT user_id, cohort_id FROM replay_members
+ON CONFLICT (user_id, cohort_id) DO NOTHING;
+
+COMMIT;
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('events', help='Stripe event export (JSON array or JSONL)')
+    parser.add_argument('--state-dir', default=STATE_DIR)
+    parser.add_argument('--dry-run', action='store_true', help='report against DATABASE_URL, write nothing')
+    parser.add_argument('--sql', help='write the apply script here instead of running it')
+    parser.add_argument('--report', help='write the full diff report (JSON) here')
+    args = parser.parse_args()
+
+    store = EventStore(args.state_dir)
+    events, skipped = new_events(args.events, store)
+    purchases, refunds = fold(events)
+    print(f'{len(events)} new events ({skipped} already applied) -> '
+          f'{len(purchases)} purchases, {len(refunds)} refunds by payment intent', file=sys.stderr)
+    if not events:
+        return
+
+    if args.sql:
+        with open(args.sql, 'w') as f:
+            f.writelines(apply_script(purchases, refunds))
+        print(f'Wrote {args.sql} (events not marked as applied)', file=sys.stderr)
+        return
+
+    report = diff_report(purchases, refunds, current_state(purchases, refunds))
+    summary = {k: v for k, v in report.items() if k not in ('changes', 'needs_provisioning')}
+    print(json.dumps(summary), file=sys.stderr)
+    if report['needs_provisioning']:
+        print(f"{len(report['needs_provisioning'])} paid buyers have no public.users row "
+              '(create them through the webhook / admin flow)', file=sys.stderr)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.dry_run:
+        return
+
+    psql_stream(apply_script(purchases, refunds))
+    store.mark(events)
+    print(f'Applied and recorded {len(events)} events', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""Match pre/post survey responses per respondent and compute improvement per cohort.
+
+pre_completion_survey_responses and post_completion_survey_responses are
+anonymous inserts, so the only link between the two is who filled them in.
+Each post response is matched to one pre response of the same survey_type
+submitted before it:
+
+  1. hash join on the normalized email (latest earlier pre wins),
+  2. then a hash join on the normalized name (accents, case, punctuation and
+     token order folded away),
+  3. otherwise a fuzzy match on name (and company), compared only within
+     blocks that share a name token prefix or a company block key (as
+     company_resolver blocks names), so a typo in one token still shares a
+     block, and accepted at a combined similarity of --min-score.
+
+Every pre response is used at most once. Pairs are written to
+<state-dir>/matches.csv.
+
+The scale questions asked on both forms (PAIRED_QUESTIONS) become one delta
+column each (post - pre). Per group the columns are reduced to pairs, pre/post
+means, mean and sd of the delta, Cohen's d for paired samples and the share
+that improved. Groups are the cohort of the respondent's company (pre company_id,
+or the company name matched against companies.name), the company name when it
+has no cohort, and 'all'. --load replaces public.survey_impact.
+
+Usage:
+    python scripts/survey_impact.py --source db --load
+    python scripts/survey_impact.py --source exports/ --report     # <table>.csv/json/jsonl
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+from difflib import SequenceMatcher
+
+from company_resolver import BLOCK_PREFIX, block_keys, fold, normalize_company
+from pg_local import copy_block, psql_stream
+from snapshots import db_rows, normalize_email, read_rows
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+STATE_DIR = os.path.join(ROOT, '.cache', 'survey-impact')
+
+RESPONSE_COLUMNS = ['id', 'survey_type', 'respondent_name', 'respondent_email', 'company_name',
+                    'answers', 'submitted_at']
+TABLES = {
+    'pre_completion_survey_responses': RESPONSE_COLUMNS + ['company_id'],
+    'post_completion_survey_responses': RESPONSE_COLUMNS,
+    'companies': ['id', 'name', 'cohort_id'],
+}
+IMPACT_COLUMNS = ['group_key', 'cohort_id', 'survey_type', 'question', 'pairs', 'pre_mean', 'post_mean',
+                  'mean_delta', 'sd_delta', 'effect_size', 'improved_share']
+
+# survey_type -> [(question, pre answer key, post answer key)]; 1-5 scales on both forms
+PAIRED_QUESTIONS = {
+    'team': [
+        ('ai_confidence', 'ai_confidence', 'post_ai_confidence'),
+        ('ai_skill', 'ai_skill_level', 'post_ai_skill'),
+        ('quality_confidence', 'quality_confidence', 'quality_confidence'),
+        ('workflow_readiness', 'workflow_readiness', 'workflow_readiness'),
+    ],
+    'management': [
+        ('team_readiness', 'team_readiness', 'team_readiness_now'),
+        ('brand_confidence', 'brand_confidence', 'quality_confidence'),
+    ],
+}
+MIN_SCORE = 0.85
+
+
+def normalize_name(name):
+    return ' '.join(fold(name))
+
+
+def similarity(a, b, floor=0.0):
+    """SequenceMatcher ratio of two normalized strings, 0.0 if it cannot reach `floor`."""
+    if not a or not b:
+        return 0.0
+    m = SequenceMatcher(None, a, b)
+    if m.real_quick_ratio() < floor or m.quick_ratio() < floor:
+        return 0.0
+    return m.ratio()
+
+
+def load_tables(source):
+    tables = {}
+    for table, columns in TABLES.items():
+        if source == 'db':
+            tables[table] = list(db_rows(f'public.{table}', columns))
+            continue
+        for ext in ('.csv', '.jsonl', '.json'):
+            path = os.path.join(source, table + ext)
+            if os.path.exists(path):
+                tables[table] = list(read_rows(path))
+                break
+        else:
+            sys.exit(f'{source}: no export for {table}')
+    for table in ('pre_completion_survey_responses', 'post_completion_survey_responses'):
+        for r in tables[table]:
+            if isinstance(r.get('answers'), str):
+                r['answers'] = json.loads(r['answers'] or '{}')
+            r['email_key'] = normalize_email(r.get('respondent_email'))
+            # token order differs between forms ("Al Shallah Raya"), so keys are sorted
+            r['name_key'] = ' '.join(sorted(normalize_name(r.get('respondent_name')).split()))
+            r['company_key'] = normalize_company(r.get('company_name'))
+            r['submitted_at'] = r.get('submitted_at') or ''
+    return tables
+
+
+def response_blocks(r):
+    """Fuzzy-match blocks of a response: name token prefixes and company block keys."""
+    blocks = {('name', t[:BLOCK_PREFIX]) for t in r['name_key'].split()}
+    if r['company_key']:
+        blocks |= {('company', b) for b in block_keys(r['company_key'].replace(' ', ''), r['company_key'].split())}
+    return blocks
+
+
+def match_responses(pre, post, min_score=MIN_SCORE):
+    """[(post, pre, method, score)] with each pre response used at most once."""
+    by_email, by_name, blocks = {}, {}, {}
+    for r in sorted(pre, key=lambda r: r['submitted_at']):
+        if r['email_key']:
+            by_email.setdefault((r['survey_type'], r['email_key']), []).append(r)
+        if r['name_key']:
+            by_name.setdefault((r['survey_type'], r['name_key']), []).append(r)
+        for block in response_blocks(r):
+            blocks.setdefault((r['survey_type'], block), []).append(r)
+    used, pairs = set(), []
+
+    def hash_join(rows, index, key, method):
+        left = []
+        for p in rows:
+            candidates = [r for r in index.get((p['survey_type'], p[key]), ())
+                          if r['id'] not in used and r['submitted_at'] <= p['submitted_at']]
+            if candidates:
+                used.add(candidates[-1]['id'])
+                pairs.append((p, candidates[-1], method, 1.0))
+            else:
+                left.append(p)
+        return left
+
+    unmatched = hash_join(sorted(post, key=lambda r: r['submitted_at']), by_email, 'email_key', 'email')
+    unmatched = hash_join(unmatched, by_name, 'name_key', 'name')
+    for p in unmatched:
+        best, best_score = None, min_score
+        seen = set()
+        for block in sorted(response_blocks(p)):  # ties go to the same pre on every run
+            for r in blocks.get((p['survey_type'], block), ()):
+                if r['id'] in used or r['id'] in seen or r['submitted_at'] > p['submitted_at']:
+                    continue
+                seen.add(r['id'])
+                if p['company_key'] and r['company_key']:
+                    company = similarity(p['company_key'], r['company_key'])
+                    name = similarity(p['name_key'], r['name_key'], (best_score - 0.3 * company) / 0.7)
+                    score = 0.7 * name + 0.3 * company
+                else:
+                    score = similarity(p['name_key'], r['name_key'], best_score)
+                if score >= best_score:
+                    best, best_score = r, score
+        if best:
+            used.add(best['id'])
+            pairs.append((p, best, 'fuzzy', round(best_score, 3)))
+    return pairs
+
+
+def number(value):
+    if isinstance(value, bool) or value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def reduce_columns(pre_values, post_values):
+    """Paired stats over two aligned columns (None where either side is missing)."""
+    kept = [(a, b) for a, b in zip(pre_values, post_values) if a is not None and b is not None]
+    n = len(kept)
+    if not n:
+        return None
+    deltas = [b - a for a, b in kept]
+    mean = sum(deltas) / n
+    sd = math.sqrt(sum((d - mean) ** 2 for d in deltas) / (n - 1)) if n > 1 else None
+    return {
+        'pairs': n,
+        'pre_mean': round(sum(a for a, _ in kept) / n, 3),
+        'post_mean': round(sum(b for _, b in kept) / n, 3),
+        'mean_delta': round(mean, 3),
+        'sd_delta': round(sd, 3) if sd is not None else None,
+        'effect_size': round(mean / sd, 3) if sd else None,
+        'improved_share': round(sum(1 for d in deltas if d > 0) / n, 3),
+    }
+
+
+def impact(pairs, tables):
+    company_cohort = {c['id']: c.get('cohort_id') for c in tables['companies']}
+    name_cohort = {normalize_company(c['name']): c.get('cohort_id') for c in tables['companies']}
+
+    def group_of(post, pre):
+        cohort_id = company_cohort.get(pre.get('company_id')) or name_cohort.get(pre['company_key']) \
+            or name_cohort.get(post['company_key'])
+        if cohort_id:
+            return f'cohort:{cohort_id}', cohort_id
+        company = pre['company_key'] or post['company_key']
+        return (f'company:{company}', None) if company else (None, None)
+
+    # group -> survey_type -> question -> (pre column, post column)
+    columns = {}
+    cohorts = {'all': None}
+    for post, pre, _, _ in pairs:
+        key, cohort_id = group_of(post, pre)
+        for group in ('all', key) if key else ('all',):
+            cohorts[group] = cohort_id if group != 'all' else None
+            by_question = columns.setdefault(group, {}).setdefault(post['survey_type'], {})
+            for question, pre_key, post_key in PAIRED_QUESTIONS.get(post['survey_type'], ()):
+                pre_col, post_col = by_question.setdefault(question, ([], []))
+                pre_col.append(number(pre['answers'].get(pre_key)))
+                post_col.append(number(post['answers'].get(post_key)))
+    rows = []
+    for group, by_type in sorted(columns.items()):
+        for survey_type, by_question in sorted(by_type.items()):
+            for question, (pre_col, post_col) in by_question.items():
+                stats = reduce_columns(pre_col, post_col)
+                if stats:
+                    rows.append({'group_key': group, 'cohort_id': cohorts[group], 'survey_type': survey_type,
+                                 'question': question, **stats})
+    return rows
+
+
+def write_matches(path, pairs):
+    with open(path + '.tmp', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['post_id', 'pre_id', 'survey_type', 'method', 'score', 'post_name', 'pre_name'])
+        for post, pre, method, score in pairs:
+            writer.writerow([post['id'], pre['id'], post['survey_type'], method, score,
+                             post.get('respondent_name') or '', pre.get('respondent_name') or ''])
+    os.replace(path + '.tmp', path)
+
+
+def load_script(rows):
+    """Replace public.survey_impact in one transaction."""
+    yield 'BEGIN;\nCREATE TEMP TABLE survey_impact_in (LIKE public.survey_impact INCLUDING DEFAULTS) ON COMMIT DROP;\n'
+    yield from copy_block('survey_impact_in', IMPACT_COLUMNS, ([r[c] for c in IMPACT_COLUMNS] for r in rows))
+    yield (f'INSERT INTO public.survey_impact ({", ".join(IMPACT_COLUMNS)}) '
+           f'SELECT {", ".join(IMPACT_COLUMNS)} FROM survey_impact_in\n'
+           'ON CONFLICT (group_key, survey_type, question) DO UPDATE SET '
+           + ', '.join(f'{c} = EXCLUDED.{c}' for c in IMPACT_COLUMNS[4:]) + ', cohort_id = EXCLUDED.cohort_id, '
+           'updated_at = now();\n'
+           'DELETE FROM public.survey_impact s WHERE NOT EXISTS (SELECT 1 FROM survey_impact_in i '
+           'WHERE i.group_key = s.group_key AND i.survey_type = s.survey_type AND i.question = s.question);\n'
+           'COMMIT;\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', default='db', help="'db' or a directory of <table>.csv/json/jsonl exports")
+    parser.add_argument('--min-score', type=float, default=MIN_SCORE, help='fuzzy name/company match threshold')
+    parser.add_argument('--state-dir', default=STATE_DIR)
+    parser.add_argument('--load', action='store_true', help='replace public.survey_impact')
+    parser.add_argument('--report', action='store_true', help='print the impact rows')
+    args = parser.parse_args()
+
+    tables = load_tables(args.source)
+    pre = tables['pre_completion_survey_responses']
+    post = tables['post_completion_survey_responses']
+    pairs = match_responses(pre, post, args.min_score)
+    by_method = {}
+    for p in pairs:
+        by_method[p[2]] = by_method.get(p[2], 0) + 1
+    os.makedirs(args.state_dir, exist_ok=True)
+    matches_path = os.path.join(args.state_dir, 'matches.csv')
+    write_matches(matches_path, pairs)
+    rows = impact(pairs, tables)
+    print(f'{len(pre)} pre / {len(post)} post responses, {len(pairs)} matched '
+          f'({", ".join(f"{k}: {v}" for k, v in sorted(by_method.items()))}) -> {matches_path}; '
+          f'{len(rows)} impact rows', file=sys.stderr)
+
+    if args.load:
+        psql_stream(load_script(rows))
+        print(f'Loaded {len(rows)} rows into public.survey_impact', file=sys.stderr)
+    if args.report:
+        for r in rows:
+            print(f"{r['group_key'][:44]:44} {r['survey_type']:10} {r['question']:20} n={r['pairs']:<4} "
+                  f"{r['pre_mean']} -> {r['post_mean']} (delta {r['mean_delta']:+}, d={r['effect_size']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+"""Fixtures shared by the script tests: scripts/ on sys.path and a scratch database."""
+import os
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pg_local import psql, server_url  # noqa: E402
+
+TEST_DB = 'zkandar_test'
+
+
+@pytest.fixture(scope='session')
+def database():
+    """URL of a database bootstrapped from the migrations; DATABASE_URL points at it meanwhile."""
+    if not shutil.which('psql'):
+        pytest.skip('psql is not on PATH')
+    try:
+        psql('SELECT 1;')
+    except RuntimeError as e:
+        pytest.skip(f'no Postgres at {server_url()}: {e}')
+    from bootstrap_local_db import bootstrap
+    url = bootstrap(TEST_DB)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('DATABASE_URL', url)
+        yield url
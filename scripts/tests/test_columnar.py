@@ -0,0 +1,43 @@
+from columnar import ColzReader, ColzWriter
+
+
+def write_snapshot(path, rows, numeric=('seats',)):
+    writer = ColzWriter(str(path), ['id', 'priority', 'seats', 'phone'], chunk_rows=10, numeric=numeric)
+    for row in rows:
+        writer.write(row)
+    writer.close()
+    return ColzReader(str(path))
+
+
+ROWS = [{'id': str(n), 'priority': 'HOT' if n % 3 == 0 else 'COLD', 'seats': str(n), 'phone': f'+9715{n:07d}'}
+        for n in range(50)]
+
+
+def test_column_pruning(tmp_path):
+    reader = write_snapshot(tmp_path / 'leads.colz', ROWS)
+    assert reader.rows == 50
+    assert list(reader.read(['phone']))[:2] == [{'phone': '+97150000000'}, {'phone': '+97150000001'}]
+
+
+def test_numeric_predicates_skip_row_groups(tmp_path):
+    reader = write_snapshot(tmp_path / 'leads.colz', ROWS)
+    rows = list(reader.read(['id'], ['seats >= 35', 'priority = HOT']))
+    assert [r['id'] for r in rows] == ['36', '39', '42', '45', '48']
+    # seats 0-9, 10-19 and 20-29 cannot reach 35; 9 >= 35 would hold as text
+    assert (reader.chunks_read, reader.chunks_skipped) == (2, 3)
+
+
+def test_in_predicate_and_all_null_group(tmp_path):
+    rows = ROWS[:10] + [dict(r, priority=None) for r in ROWS[10:20]]
+    reader = write_snapshot(tmp_path / 'leads.colz', rows)
+    assert [r['id'] for r in reader.read(['id'], ['priority in HOT|LAVA'])] == ['0', '3', '6', '9']
+    assert reader.chunks_skipped == 1
+
+
+def test_non_numbers_fall_back_to_text(tmp_path):
+    rows = [dict(r, seats='TBA' if r['id'] == '7' else r['seats']) for r in ROWS[:20]]
+    reader = write_snapshot(tmp_path / 'leads.colz', rows)
+    assert reader.numeric == {}
+    assert [r['id'] for r in reader.read(['id'], ['seats = TBA'])] == ['7']
+    # phone numbers are never numeric, so the leading + and zeros survive
+    assert next(reader.read(['phone'], ['id = 3'])) == {'phone': '+97150000003'}
@@ -0,0 +1,21 @@
+import pytest
+
+from content_dedup import canonical_url
+
+
+@pytest.mark.parametrize('url, canonical', [
+    ('www.Example.com/path/?utm_source=x&b=2&a=1', 'https://example.com/path?a=1&b=2'),
+    ('http://example.com:80', 'https://example.com/'),
+    ('HTTPS://example.com:8080/a/', 'https://example.com:8080/a'),
+    ('https://example.com/a?fbclid=1#frag', 'https://example.com/a'),
+    ('https://youtu.be/abc?si=x&t=10', 'https://youtube.com/watch?v=abc'),
+    ('https://m.youtube.com/shorts/abc', 'https://youtube.com/watch?v=abc'),
+    ('https://www.youtube.com/watch?v=abc&feature=share&list=PL1&t=5', 'https://youtube.com/watch?list=PL1&v=abc'),
+])
+def test_canonical_url(url, canonical):
+    assert canonical_url(url) == canonical
+
+
+@pytest.mark.parametrize('url', [None, '', '   ', 'http://[::1', 'https://example.com:99999/'])
+def test_canonical_url_rejects(url):
+    assert canonical_url(url) is None
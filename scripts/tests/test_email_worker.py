@@ -0,0 +1,204 @@
+"""email_worker against a local Resend-style stub: rate limiting, retries, reclaims and write-back.
+
+The stub answers by recipient: `reject*@` gets a 422 (permanent), `flaky*@` a
+503 on its first attempt (transient), anything else 200, and timestamps every
+accepted send. The database tests need Postgres (see conftest.database).
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import email_worker
+from pg_local import psql, psql_rows, psql_stream, sql_literal
+
+CAMPAIGN = '00000000-0000-4000-8000-000000000001'
+
+
+class Stub:
+    """Resend-style endpoint on 127.0.0.1 recording what it accepted."""
+
+    def __init__(self):
+        self.sent = []     # (monotonic time, recipient)
+        self.seen = Counter()
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                to = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['to']
+                with stub.lock:
+                    stub.seen[to] += 1
+                    first = stub.seen[to] == 1
+                    code = 422 if to.startswith('reject') else 503 if to.startswith('flaky') and first else 200
+                    if code == 200:
+                        stub.sent.append((time.monotonic(), to))
+                self.send_response(code)
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/emails'
+
+    def close(self):
+        self.server.shutdown()
+
+
+@pytest.fixture
+def stub():
+    stub = Stub()
+    yield stub
+    stub.close()
+
+
+def worker_args(**overrides):
+    values = dict(batch=email_worker.BATCH, concurrency=email_worker.CONCURRENCY, rate=0, domain_rate=['100'],
+                  max_attempts=email_worker.MAX_ATTEMPTS, backoff=0, max_backoff=0, max_wait=0.5,
+                  lease=email_worker.LEASE, idle=0.1, once=True, campaign=None)
+    values.update(overrides)
+    return argparse.Namespace(**values)
+
+
+def peak_per_second(times):
+    times = sorted(times)
+    peak, lo = 0, 0
+    for hi, t in enumerate(times):
+        while t - times[lo] >= 1:
+            lo += 1
+        peak = max(peak, hi - lo + 1)
+    return peak
+
+
+async def drain(stub, rows, rate):
+    """Feed `rows` rows to one domain through deliver as claim would; return (elapsed, problems)."""
+    args = worker_args(domain_rate=[str(rate)])
+    transport = email_worker.HttpTransport(stub.url)
+    limits = email_worker.DomainLimits(*email_worker.parse_domain_rates(args.domain_rate))
+    global_limit = email_worker.RateLimiter(0)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    loop = asyncio.get_running_loop()
+    queue = [{'id': n, 'recipient_email': f'r{n}@example.com', 'recipient_name': None, 'subject': 's',
+              'html_body': '<p>hi</p>', 'attempts': 0, 'send_after': 0.0} for n in range(rows)]
+    started, problems = loop.time(), []
+    while queue and loop.time() - started < 3 * rows / rate + 10:
+        now = loop.time()
+        due = [row for row in queue if row['send_after'] <= now][:args.batch]
+        if not due:
+            await asyncio.sleep(min(row['send_after'] for row in queue) - now)
+            continue
+        results = await asyncio.gather(*(email_worker.deliver(row, transport, limits, global_limit, semaphore, args)
+                                         for row in due))
+        done = set()
+        for row, (status, _, retry_in) in zip(due, results):
+            if status == 'pending':
+                # a deferred row may wait at most for the rows queued before it
+                if retry_in > len(queue) / rate + args.max_wait:
+                    problems.append(f'row {row["id"]} deferred {retry_in:.1f}s with {len(queue)} rows queued')
+                row['send_after'] = now + retry_in
+            else:
+                if status != 'sent':
+                    problems.append(f'row {row["id"]}: {status}')
+                done.add(row['id'])
+        queue = [row for row in queue if row['id'] not in done]
+    return loop.time() - started, problems
+
+
+def test_rate_limiter_hands_out_spaced_slots():
+    limiter = email_worker.RateLimiter(10)
+    assert limiter.peek(0.0) == 0
+    limiter.take(0.0)
+    assert limiter.peek(0.0) == pytest.approx(0.1)
+    limiter.take(0.0)  # queued behind the first slot, not on top of it
+    assert limiter.peek(0.0) == pytest.approx(0.2)
+    assert limiter.peek(5.0) == 0  # idle time is not banked as a burst
+    limiter.take(5.0)
+    assert limiter.next == pytest.approx(5.1)
+
+    unlimited = email_worker.RateLimiter(0)
+    unlimited.take(1.0)
+    unlimited.take(1.0)
+    assert unlimited.peek(1.0) == 0
+
+
+def test_drain_keeps_the_domain_rate(stub):
+    rows, rate = 300, 100
+    elapsed, problems = asyncio.run(drain(stub, rows, rate))
+    assert problems == []
+    assert len(stub.sent) == rows
+    assert elapsed <= rows / rate * 1.25 + 1
+    assert peak_per_second([t for t, _ in stub.sent]) <= rate * 1.05 + 1  # arrival jitter at the stub
+
+
+SEED_SQL = """
+BEGIN;
+TRUNCATE public.email_queue, public.email_campaign_recipients, public.email_campaigns CASCADE;
+INSERT INTO public.email_campaigns (id, subject, audience, recipient_count, status)
+VALUES ({campaign}, 'Check', 'all', {total}, 'scheduled');
+INSERT INTO public.email_campaign_recipients (campaign_id, email)
+SELECT {campaign}, e FROM unnest({emails}::text[]) e WHERE e LIKE '%@%';
+-- orphan* and poison* were claimed a day ago by a worker that never wrote back
+INSERT INTO public.email_queue (campaign_id, recipient_email, subject, html_body, status, attempts, updated_at)
+SELECT {campaign}, e, 'Check', '<p>hi</p>',
+       CASE WHEN e LIKE 'orphan%' OR e LIKE 'poison%' THEN 'processing' ELSE 'pending' END,
+       CASE WHEN e LIKE 'poison%' THEN {max_attempts} - 1 ELSE 0 END,
+       CASE WHEN e LIKE 'orphan%' OR e LIKE 'poison%' THEN now() - interval '1 day' ELSE now() END
+FROM unnest({emails}::text[]) e;
+COMMIT;
+"""
+
+
+def seed(url, emails):
+    psql(SEED_SQL.format(campaign=sql_literal(CAMPAIGN), total=len(emails), max_attempts=email_worker.MAX_ATTEMPTS,
+                         emails=f'ARRAY[{", ".join(map(sql_literal, emails))}]'), url)
+
+
+def test_worker_drains_a_campaign(database, stub):
+    emails = ([f'ok{n}@example.com' for n in range(50)]
+              + ['reject@example.com', 'flaky@example.com', 'orphan@example.com', 'poison@example.com', 'no-address'])
+    seed(database, emails)
+    transport = email_worker.HttpTransport(stub.url)
+    started = time.monotonic()
+    while psql_rows("SELECT 1 FROM public.email_queue WHERE status IN ('pending', 'processing') LIMIT 1;", database):
+        assert time.monotonic() - started < 30, 'queue not drained'
+        asyncio.run(email_worker.run(worker_args(), transport))
+
+    expected = {f'ok{n}@example.com': ('sent', 1) for n in range(50)}
+    expected.update({
+        'reject@example.com': ('failed', 1),
+        'flaky@example.com': ('sent', 2),
+        'orphan@example.com': ('sent', 2),     # the expired claim counts as an attempt
+        'poison@example.com': ('failed', email_worker.MAX_ATTEMPTS),
+        'no-address': ('skipped', 0),
+    })
+    queue = {email: (status, int(attempts)) for email, status, attempts in psql_rows(
+        'SELECT recipient_email, status, attempts FROM public.email_queue;', database)}
+    assert queue == expected
+    recipients = dict(psql_rows('SELECT email, status FROM public.email_campaign_recipients;', database))
+    assert recipients == {email: status for email, (status, _) in expected.items() if '@' in email}
+    assert psql_rows('SELECT status, sent_at IS NOT NULL FROM public.email_campaigns;', database) == [['sent', 't']]
+    assert sorted(to for _, to in stub.sent) == sorted(e for e, (s, _) in expected.items() if s == 'sent')
+
+
+def test_reclaim_increments_attempts(database):
+    seed(database, ['orphan@example.com', 'pending@example.com'])
+    rows = {row['recipient_email']: row['attempts'] for row in email_worker.claim(10, email_worker.LEASE)}
+    assert rows == {'orphan@example.com': 1, 'pending@example.com': 0}
+
+
+def test_stale_write_back_is_ignored(database):
+    seed(database, ['ok0@example.com'])
+    rows = email_worker.claim(1, email_worker.LEASE)
+    assert [r['recipient_email'] for r in rows] == ['ok0@example.com']
+    # another worker's claim overtakes this one before it writes back
+    psql("UPDATE public.email_queue SET updated_at = now() + interval '1 second';", database)
+    psql_stream(email_worker.writeback_script(rows, [('failed', 9, None)]), database)
+    assert psql_rows('SELECT status, attempts FROM public.email_queue;', database) == [['processing', '0']]
@@ -0,0 +1,65 @@
+from datetime import date
+
+from follow_up import FollowUps, tasks_for
+
+LEAD = {'id': 'l1', 'full_name': 'Lina', 'owner_id': 'o1', 'priority': 'HOT',
+        'priority_changed_at': '2026-01-01T10:00:00Z', 'payment_amount': '4900',
+        'amount_paid': '1000', 'date_of_payment': '2026-01-05', 'date_of_payment_2': '2026-02-01',
+        'support_date_booked': '2026-03-10', 'start_date': '2026-04-01'}
+
+
+def test_tasks_for():
+    assert tasks_for(LEAD) == {
+        'stale': ['2026-01-08', None, 490000],            # HOT unmoved for 7 days
+        'installment': ['2026-01-29', None, 390000],      # 3 days before the unpaid DOP 2
+        'support': ['2026-03-09', '2026-03-10', 490000],
+        'start': ['2026-03-29', '2026-04-01', 490000],
+    }
+
+
+def test_tasks_for_paid_full_and_not_interested():
+    lead = dict(LEAD, paid_full='Yes', priority='NOT INTERESTED')
+    assert tasks_for(lead) == {}
+
+
+def kinds(due):
+    return sorted((lead_id, kind) for _, _, lead_id, kind, _ in due)
+
+
+def test_due_keeps_open_tasks_and_retires_expired_ones(tmp_path):
+    queue = FollowUps(str(tmp_path))
+    queue.fold([LEAD])
+    today = date(2026, 3, 9)
+    assert kinds(queue.due(today, today)) == [('l1', 'installment'), ('l1', 'stale'), ('l1', 'support')]
+    # open tasks come back the next day; support expires after 2026-03-10
+    assert kinds(queue.due(date(2026, 3, 10), date(2026, 3, 10))) == [
+        ('l1', 'installment'), ('l1', 'stale'), ('l1', 'support')]
+    assert kinds(queue.due(date(2026, 3, 11), date(2026, 3, 11))) == [('l1', 'installment'), ('l1', 'stale')]
+    assert 'support' not in queue.leads['l1'][1]['tasks']
+
+
+def test_look_ahead_skips_but_keeps_tasks(tmp_path):
+    queue = FollowUps(str(tmp_path))
+    queue.fold([LEAD])
+    today = date(2026, 3, 9)
+    # a run for a later date leaves out tasks expired by then without deleting them
+    assert ('l1', 'support') not in kinds(queue.due(date(2026, 3, 20), today))
+    assert ('l1', 'support') in kinds(queue.due(today, today))
+
+
+def test_changed_lead_replaces_its_tasks(tmp_path):
+    queue = FollowUps(str(tmp_path))
+    queue.fold([LEAD])
+    assert queue.fold([dict(LEAD, priority='COLD', paid_full='Yes')]) == (1, 0)
+    assert kinds(queue.due(date(2026, 3, 9), date(2026, 3, 9))) == [('l1', 'support')]
+    assert queue.fold([], complete=True) == (0, 1)
+    assert queue.due(date(2026, 3, 9), date(2026, 3, 9)) == []
+
+
+def test_worklists_rank_and_limit(tmp_path):
+    queue = FollowUps(str(tmp_path))
+    queue.fold([LEAD, dict(LEAD, id='l2', priority='LAVA', owner_id=None)])
+    lists = queue.worklists(date(2026, 3, 9), limit=2, today=date(2026, 3, 9))
+    assert sorted(lists) == ['o1', 'unassigned']
+    assert [row[1] for row in lists['o1']] == [1, 2]
+    assert lists['o1'][0][5] == 'installment'
@@ -0,0 +1,19 @@
+from priority_funnel import STAGE_CODE, stage_codes
+
+
+def codes(*stages):
+    return [STAGE_CODE[s] for s in stages]
+
+
+def test_stage_codes_oldest_first_with_current_last():
+    assert stage_codes('HOT', '{COLD,"LAVA"}') == codes('COLD', 'LAVA', 'HOT')
+
+
+def test_stage_codes_collapse_repeats_and_drop_unknown():
+    assert stage_codes('LAVA', '{COLD,COLD,WARM,LAVA}') == codes('COLD', 'LAVA')
+
+
+def test_stage_codes_sheet_and_list_values():
+    assert stage_codes('hot ', 'lava, cold') == codes('LAVA', 'COLD', 'HOT')
+    assert stage_codes(None, ['ACTIVE', 'NOT INTERESTED']) == codes('ACTIVE', 'NOT INTERESTED')
+    assert stage_codes(None, None) == []
@@ -0,0 +1,43 @@
+from survey_impact import match_responses, normalize_company, normalize_email, normalize_name
+
+
+def response(id, name, company=None, email=None, submitted_at='2026-01-01', survey_type='team'):
+    # the keys load_tables derives
+    return {'id': id, 'survey_type': survey_type, 'email_key': normalize_email(email),
+            'name_key': ' '.join(sorted(normalize_name(name).split())),
+            'company_key': normalize_company(company), 'submitted_at': submitted_at}
+
+
+def matched(pairs):
+    return {post['id']: (pre['id'], method) for post, pre, method, _ in pairs}
+
+
+def test_email_then_name_then_fuzzy():
+    pre = [response('a', 'Sara Ali', email='Sara@Example.com'),
+           response('b', 'Al Shallah Raya', 'Raya Studio'),
+           response('c', 'Mariam Khan', 'Zeta Studio')]
+    post = [response('x', 'S. Ali', email='sara@example.com ', submitted_at='2026-02-01'),
+            response('y', 'Raya Al Shallah', submitted_at='2026-02-01'),
+            response('z', 'Mariam Kahn', 'Zeta Studios', submitted_at='2026-02-01')]
+    assert matched(match_responses(pre, post)) == {'x': ('a', 'email'), 'y': ('b', 'name'), 'z': ('c', 'fuzzy')}
+
+
+def test_fuzzy_match_across_a_typo_in_the_first_name_token():
+    pre = [response('a', 'Mariam Khan', 'Zeta Studio'), response('b', 'Omar Haddad', 'Acme')]
+    post = [response('x', 'Mariam Kahn', 'Zeta Studios', submitted_at='2026-02-01')]
+    ((_, pre_match, method, score),) = match_responses(pre, post)
+    assert (pre_match['id'], method) == ('a', 'fuzzy') and score >= 0.85
+
+
+def test_each_pre_used_once_and_only_before_the_post():
+    pre = [response('a', 'Lina Haddad', email='lina@example.com', submitted_at='2026-01-01'),
+           response('late', 'Lina Haddad', email='lina@example.com', submitted_at='2026-03-01')]
+    post = [response('x', 'Lina Haddad', email='lina@example.com', submitted_at='2026-02-01'),
+            response('y', 'Lina Haddad', email='lina@example.com', submitted_at='2026-02-02')]
+    assert matched(match_responses(pre, post)) == {'x': ('a', 'email')}
+
+
+def test_survey_types_do_not_mix():
+    pre = [response('a', 'Mariam Khan', 'Zeta Studio', survey_type='management')]
+    post = [response('x', 'Mariam Khan', 'Zeta Studio', submitted_at='2026-02-01')]
+    assert match_responses(pre, post) == []
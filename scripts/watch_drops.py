@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""Watch an export folder and turn each new lead / survey drop into SQL for the rows that changed.
+
+Exports are saved into src/assets/ under whatever name the browser picks
+("All Leads Master Sheet (1).csv", "Management Submissions Export Feb 20 2026
+(1).csv"). This stays running, notices new or rewritten files (inotify on
+Linux, falling back to polling size/mtime, where a file must look the same on
+two consecutive polls before it is read), skips files whose content
+fingerprint it has already processed, and routes each CSV by its header:
+
+    Entry ID ...                 leads (master sheet, via snapshots.master_sheet_rows)
+    ...;q5_confidence_ai_workflow team_submissions
+    ...;q3_ai_adoption_status    management_submissions
+
+Rows are hashed and compared with the hashes last seen for that table,
+whatever file they came from, so a re-download with three edited rows yields
+SQL for three rows; rows missing from a drop are left alone, since exports
+are often filtered. Leads are upserted with generate_seed_sql's typed values
+(unmapped columns registered in lead_columns and merged into custom_fields);
+survey rows are laid over the stored row with jsonb_populate_record, which
+drops export columns the table does not have and keeps table columns the
+export lacks (company_id). Submissions with the honeypot filled in are
+skipped.
+
+SQL goes to <out-dir>/<timestamp>-<table>-<fingerprint>.sql; with --apply it is also run
+against DATABASE_URL. Row hashes are only recorded once the SQL is written
+(and applied), so a failed run is retried on the next change.
+
+State lives in --state-dir (default .cache/watch-drops):
+    state.json      file fingerprints and per-table row hashes
+    sql/            generated SQL (default --out-dir)
+
+Usage:
+    python scripts/watch_drops.py                       # watch src/assets
+    python scripts/watch_drops.py --apply --interval 1
+    python scripts/watch_drops.py --once                # process what is there and exit
+"""
+import argparse
+import csv
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import struct
+import sys
+import time
+
+from generate_seed_sql import ColumnTypes, custom_fields_sql, lead_columns_sql, sql_val, unmapped_columns
+from pg_local import psql_stream, sql_literal
+from snapshots import MASTER_ID_HEADER, csv_rows, file_fingerprint, master_sheet_rows
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+WATCH_DIR = os.path.join(ROOT, 'src', 'assets')
+STATE_DIR = os.path.join(ROOT, '.cache', 'watch-drops')
+
+# header column that identifies each survey export
+SURVEY_MARKERS = {
+    'q5_confidence_ai_workflow': 'team_submissions',
+    'q3_ai_adoption_status': 'management_submissions',
+}
+BATCH = 500
+IN_CLOSE_WRITE = 0x08
+IN_MOVED_TO = 0x80
+EVENT = struct.Struct('iIII')
+
+
+def route(path):
+    """Target table for a CSV drop, or None."""
+    if not path.lower().endswith('.csv'):
+        return None
+    with open(path, newline='') as f:
+        header = f.readline()
+    if MASTER_ID_HEADER in header:
+        return 'leads'
+    columns = {c.strip().strip('"') for c in header.replace(';', ',').split(',')}
+    return next((table for marker, table in SURVEY_MARKERS.items() if marker in columns), None)
+
+
+def row_hash(row):
+    return hashlib.blake2b(json.dumps(row, sort_keys=True, default=str).encode(), digest_size=8).hexdigest()
+
+
+def survey_row(row):
+    """Export row -> JSON object for jsonb_populate_record (JSON-encoded lists become arrays)."""
+    out = {}
+    for key, val in row.items():
+        if val is not None and val.startswith('['):
+            try:
+                val = json.loads(val)
+            except ValueError:
+                pass
+        out[key] = val
+    return out
+
+
+def read_drop(path, table):
+    """Rows of one drop keyed by id; a row listed twice keeps its last version."""
+    if table == 'leads':
+        rows = master_sheet_rows(path)
+    else:
+        rows = (survey_row(r) for r in csv_rows(path) if not r.get('honeypot'))
+    return list({r['id']: r for r in rows if r.get('id')}.values())
+
+
+def leads_sql(path, rows):
+    with open(path, newline='') as f:
+        custom = unmapped_columns(next(csv.reader(f)))
+    types = ColumnTypes()
+    for row in rows:
+        for key, val in (row.get('custom_fields') or {}).items():
+            types.observe(key, val)
+    if custom:
+        yield lead_columns_sql(custom, types) + '\n'
+    cols = sorted({c for row in rows for c in row})
+    updates = ', '.join(
+        'custom_fields = COALESCE(leads.custom_fields, \'{}\'::jsonb) || EXCLUDED.custom_fields'
+        if c == 'custom_fields' else f'{c} = EXCLUDED.{c}'
+        for c in cols if c != 'id')
+    for start in range(0, len(rows), BATCH):
+        values = ',\n'.join(
+            '(' + ', '.join(custom_fields_sql(row.get(c) or {}, types) if c == 'custom_fields'
+                            else sql_val(c, row.get(c)) for c in cols) + ')'
+            for row in rows[start:start + BATCH])
+        yield (f'INSERT INTO public.leads ({", ".join(cols)}) VALUES\n{values}\n'
+               f'ON CONFLICT (id) DO UPDATE SET {updates};\n')
+
+
+def survey_sql(table, rows):
+    for start in range(0, len(rows), BATCH):
+        payload = sql_literal(json.dumps(rows[start:start + BATCH], ensure_ascii=False))
+        # the drop is laid over the stored row, so columns the export lacks (company_id) keep their values
+        yield (f'CREATE TEMP TABLE drop_rows ON COMMIT DROP AS SELECT m.* '
+               f'FROM jsonb_array_elements({payload}::jsonb) AS d(drop_row) '
+               f"LEFT JOIN public.{table} t ON t.id = (d.drop_row->>'id')::uuid "
+               'CROSS JOIN LATERAL jsonb_populate_record(t, d.drop_row) m;\n'
+               f'DELETE FROM public.{table} t USING drop_rows d WHERE t.id = d.id;\n'
+               f'INSERT INTO public.{table} SELECT * FROM drop_rows;\n'
+               'DROP TABLE drop_rows;\n')
+
+
+class Watcher:
+    def __init__(self, args):
+        self.args = args
+        self.files = {}    # path -> content fingerprint
+        self.rows = {}     # table -> {id: row hash}
+        self.load()
+
+    def load(self):
+        path = os.path.join(self.args.state_dir, 'state.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.files, self.rows = state['files'], state['rows']
+
+    def save(self):
+        os.makedirs(self.args.state_dir, exist_ok=True)
+        path = os.path.join(self.args.state_dir, 'state.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'files': self.files, 'rows': self.rows}, f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+
+    def process(self, path, detected=None):
+        detected = detected or time.monotonic()
+        try:
+            table = route(path)
+            if table is None:
+                return
+            fingerprint = file_fingerprint(path)
+            if self.files.get(path) == fingerprint:
+                return
+            rows = read_drop(path, table)
+        except (OSError, UnicodeDecodeError, csv.Error) as e:
+            print(f'{os.path.basename(path)}: unreadable ({e}), will retry', file=sys.stderr)
+            return
+        known = self.rows.setdefault(table, {})
+        hashes = {row['id']: row_hash(row) for row in rows}
+        changed = [row for row in rows if known.get(row['id']) != hashes[row['id']]]
+        name = os.path.basename(path)
+        if changed:
+            chunks = ['BEGIN;\n', *(leads_sql(path, changed) if table == 'leads' else survey_sql(table, changed)),
+                      'COMMIT;\n']
+            os.makedirs(self.args.out_dir, exist_ok=True)
+            out = os.path.join(self.args.out_dir, f'{time.strftime("%Y%m%dT%H%M%S")}-{table}-{fingerprint[:8]}.sql')
+            with open(out + '.tmp', 'w') as f:
+                f.writelines(chunks)
+            os.replace(out + '.tmp', out)
+            if self.args.apply:
+                try:
+                    psql_stream(chunks)
+                except RuntimeError as e:
+                    print(f'{name}: apply failed, SQL kept in {out}: {e}', file=sys.stderr)
+                    return
+            for row in changed:
+                known[row['id']] = hashes[row['id']]
+            print(f'{name} -> {table}: {len(changed)} of {len(rows)} rows changed -> {out}'
+                  f'{" (applied)" if self.args.apply else ""} in {time.monotonic() - detected:.2f}s', file=sys.stderr)
+        else:
+            print(f'{name} -> {table}: no row changes ({len(rows)} rows)', file=sys.stderr)
+        self.files[path] = fingerprint
+        self.save()
+
+    def scan(self):
+        for entry in sorted(os.scandir(self.args.dir), key=lambda e: e.name):
+            if entry.is_file():
+                self.process(entry.path)
+
+
+def inotify(directory):
+    """Non-blocking inotify fd watching `directory` for finished writes and moves-in."""
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+    if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+        os.close(fd)
+        raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {directory}')
+    return fd
+
+
+def inotify_names(fd, timeout):
+    if not select.select([fd], [], [], timeout)[0]:
+        return []
+    data = os.read(fd, 1 << 16)
+    names, pos = [], 0
+    while pos < len(data):
+        _, _, _, length = EVENT.unpack_from(data, pos)
+        pos += EVENT.size
+        names.append(os.fsdecode(data[pos:pos + length].rstrip(b'\0')))
+        pos += length
+    return names
+
+
+def watch_inotify(watcher, fd):
+    while True:
+        names = inotify_names(fd, None)
+        detected = time.monotonic()
+        for name in dict.fromkeys(names):
+            path = os.path.join(watcher.args.dir, name)
+            if os.path.isfile(path):
+                watcher.process(path, detected)
+
+
+def watch_polling(watcher, interval):
+    last, handled = {}, {}
+    while True:
+        time.sleep(interval)
+        current = {}
+        for entry in os.scandir(watcher.args.dir):
+            if entry.is_file():
+                st = entry.stat()
+                current[entry.path] = (st.st_size, st.st_mtime_ns)
+        for path, stat in sorted(current.items()):
+            # unchanged since the last poll: the writer is done with it
+            if last.get(path) == stat and handled.get(path) != stat:
+                watcher.process(path)
+                handled[path] = stat
+        last = current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', default=WATCH_DIR, help='folder exports are saved into')
+    parser.add_argument('--state-dir', default=STATE_DIR)
+    parser.add_argument('--out-dir', help='where SQL is written (default <state-dir>/sql)')
+    parser.add_argument('--apply', action='store_true', help='also run the SQL against DATABASE_URL')
+    parser.add_argument('--poll', action='store_true', help='poll even where inotify is available')
+    parser.add_argument('--interval', type=float, default=2.0, help='polling interval in seconds')
+    parser.add_argument('--once', action='store_true', help='process the folder once and exit')
+    args = parser.parse_args()
+    args.out_dir = args.out_dir or os.path.join(args.state_dir, 'sql')
+
+    watcher = Watcher(args)
+    fd = None
+    if not args.once and not args.poll:
+        try:
+            fd = inotify(args.dir)  # before the scan, so nothing lands in between
+        except (OSError, AttributeError) as e:
+            print(f'inotify unavailable ({e}); polling every {args.interval}s', file=sys.stderr)
+    watcher.scan()
+    if args.once:
+        return
+    print(f'watching {os.path.abspath(args.dir)} ({"inotify" if fd is not None else "polling"})', file=sys.stderr)
+    try:
+        if fd is not None:
+            watch_inotify(watcher, fd)
+        else:
+            watch_polling(watcher, args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Incrementally roll webinar_analytics page views up into daily aggregates.
+
+webinar_analytics gets one insert per page view followed by heartbeat updates
+to duration_seconds. This job streams rows whose updated_at is past the last
+watermark and folds them into day × path × variant × referrer aggregates:
+pageviews, distinct sessions (HyperLogLog), total duration and a duration
+sketch for percentiles. Rows still receiving heartbeats are remembered with
+their last folded duration, so a later heartbeat only applies its delta.
+
+State lives in --state-dir (default .cache/webinar-rollup):
+    rollups.jsonl   one aggregate per key, sketches included (mergeable)
+    state.json      watermark, rows still inside the heartbeat horizon and
+                    rollup keys changed since the last successful --load
+
+Usage:
+    python scripts/webinar_rollup.py --source db --load   # read/write DATABASE_URL
+    python scripts/webinar_rollup.py --source export.csv  # offline
+    python scripts/webinar_rollup.py --report             # per-variant summary
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+from pg_local import copy_block, psql_stream
+from sketches import DurationSketch, SessionCounter
+from snapshots import db_rows, read_rows
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+STATE_DIR = os.path.join(ROOT, '.cache', 'webinar-rollup')
+
+COLUMNS = ['id', 'session_id', 'path', 'referrer', 'variant', 'duration_seconds', 'created_at', 'updated_at']
+ROLLUP_COLUMNS = ['day', 'path', 'variant', 'referrer', 'pageviews', 'sessions', 'total_duration_seconds',
+                  'p50_duration_seconds', 'p90_duration_seconds', 'p99_duration_seconds',
+                  'duration_sketch', 'session_hll']
+
+# heartbeats for a page view stop once the tab closes; keep a day of slack
+HORIZON = timedelta(hours=24)
+# re-read a little before the watermark to tolerate client clock skew / commit lag
+OVERLAP = timedelta(minutes=5)
+
+
+class Aggregate:
+    def __init__(self, pageviews=0, total=0, sketch=None, sessions=None):
+        self.pageviews = pageviews
+        self.total = total
+        self.sketch = sketch or DurationSketch()
+        self.sessions = sessions or SessionCounter()
+
+    def to_row(self, key):
+        day, path, variant, referrer = key
+        q = self.sketch.quantile
+        return {
+            'day': day, 'path': path, 'variant': variant, 'referrer': referrer,
+            'pageviews': self.pageviews, 'sessions': self.sessions.estimate(),
+            'total_duration_seconds': self.total,
+            'p50_duration_seconds': round_or_none(q(0.5)),
+            'p90_duration_seconds': round_or_none(q(0.9)),
+            'p99_duration_seconds': round_or_none(q(0.99)),
+            'duration_sketch': self.sketch.to_dict(),
+            'session_hll': self.sessions.to_str(),
+        }
+
+    @classmethod
+    def from_row(cls, row):
+        sketch = row['duration_sketch']
+        if isinstance(sketch, str):
+            sketch = json.loads(sketch)
+        return cls(int(row['pageviews']), int(row['total_duration_seconds']),
+                   DurationSketch.from_dict(sketch), SessionCounter.from_str(row['session_hll']))
+
+
+def round_or_none(v):
+    return None if v is None else round(v, 1)
+
+
+def parse_ts(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00')) if isinstance(value, str) else value
+
+
+class Rollup:
+    def __init__(self, state_dir=STATE_DIR):
+        self.state_dir = state_dir
+        self.aggs = {}
+        self.watermark = None
+        self.cutoff = None
+        self.open = {}
+        self.touched = set()
+        self.late = 0
+        self.load()
+
+    def load(self):
+        path = os.path.join(self.state_dir, 'rollups.jsonl')
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    row = json.loads(line)
+                    key = (row['day'], row['path'], row['variant'], row['referrer'])
+                    self.aggs[key] = Aggregate.from_row(row)
+        path = os.path.join(self.state_dir, 'state.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.watermark = parse_ts(state['watermark'])
+            self.cutoff = parse_ts(state['cutoff'])
+            self.open = state['open']
+            # kept until a load succeeds, so a failed or skipped --load is retried next run
+            self.touched = {tuple(k) for k in state.get('unloaded', [])}
+
+    def save(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = os.path.join(self.state_dir, 'rollups.jsonl')
+        with open(path + '.tmp', 'w') as f:
+            for key in sorted(self.aggs):
+                f.write(json.dumps(self.aggs[key].to_row(key)) + '\n')
+        os.replace(path + '.tmp', path)
+        path = os.path.join(self.state_dir, 'state.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'watermark': self.watermark and self.watermark.isoformat(),
+                       'cutoff': self.cutoff and self.cutoff.isoformat(),
+                       'open': self.open, 'unloaded': sorted(self.touched)}, f)
+        os.replace(path + '.tmp', path)
+
+    def since(self):
+        return self.watermark - OVERLAP if self.watermark else None
+
+    def fold(self, rows):
+        high = self.watermark
+        n = 0
+        for row in rows:
+            created = parse_ts(row['created_at'])
+            updated = parse_ts(row['updated_at'])
+            duration = int(row['duration_seconds'] or 0)
+            key = (created.date().isoformat(), row['path'], row['variant'], row['referrer'])
+            agg = self.aggs.get(key)
+            if agg is None:
+                agg = self.aggs[key] = Aggregate()
+
+            prev = self.open.get(row['id'])
+            if prev is not None:
+                if prev[0] != duration:
+                    agg.total += duration - prev[0]
+                    agg.sketch.remove(prev[0])
+                    agg.sketch.add(duration)
+            elif self.cutoff is None or created >= self.cutoff:
+                agg.pageviews += 1
+                agg.total += duration
+                agg.sketch.add(duration)
+                agg.sessions.add(row['session_id'])
+            else:
+                # heartbeat for a page view already evicted from the horizon
+                self.late += 1
+                continue
+            self.open[row['id']] = [duration, created.isoformat()]
+            self.touched.add(key)
+            if high is None or updated > high:
+                high = updated
+            n += 1
+
+        self.watermark = high
+        if high is not None:
+            self.cutoff = high - HORIZON
+            cutoff = self.cutoff
+            self.open = {k: v for k, v in self.open.items() if parse_ts(v[1]) >= cutoff}
+        return n
+
+    def touched_rows(self):
+        for key in sorted(self.touched):
+            yield self.aggs[key].to_row(key)
+
+
+def upsert_script(rows):
+    """COPY touched rollups into a temp table and upsert them in one statement."""
+    yield ('BEGIN;\nCREATE TEMP TABLE webinar_rollup_in (LIKE public.webinar_analytics_daily '
+           'INCLUDING DEFAULTS) ON COMMIT DROP;\n')
+    yield from copy_block('webinar_rollup_in', ROLLUP_COLUMNS, (
+        [json.dumps(r[c]) if c == 'duration_sketch' else r[c] for c in ROLLUP_COLUMNS] for r in rows
+    ))
+    updates = ', '.join(f'{c} = EXCLUDED.{c}' for c in ROLLUP_COLUMNS[4:])
+    yield (f'INSERT INTO public.webinar_analytics_daily ({", ".join(ROLLUP_COLUMNS)}) '
+           f'SELECT {", ".join(ROLLUP_COLUMNS)} FROM webinar_rollup_in '
+           f'ON CONFLICT (day, path, variant, referrer) DO UPDATE SET {updates}, updated_at = now();\n'
+           'COMMIT;\n')
+
+
+def source_rows(source, since):
+    if source == 'db':
+        where = f"updated_at > '{since.isoformat()}'" if since else None
+        return db_rows('public.webinar_analytics', COLUMNS, where)
+    rows = read_rows(source)
+    if since is None:
+        return rows
+    return (r for r in rows if parse_ts(r['updated_at']) > since)
+
+
+def report(rollup):
+    """Per-variant totals built purely from the rollups (sketches merged)."""
+    by_variant = {}
+    for (day, path, variant, referrer), agg in rollup.aggs.items():
+        acc = by_variant.setdefault(variant, Aggregate())
+        acc.pageviews += agg.pageviews
+        acc.total += agg.total
+        acc.sketch.merge(agg.sketch)
+        acc.sessions.merge(agg.sessions)
+    for variant in sorted(by_variant):
+        acc = by_variant[variant]
+        avg = acc.total / acc.pageviews if acc.pageviews else 0
+        print(f'{variant}: pageviews={acc.pageviews} sessions~{acc.sessions.estimate()} '
+              f'avg={avg:.1f}s p50={round_or_none(acc.sketch.quantile(0.5))}s '
+              f'p90={round_or_none(acc.sketch.quantile(0.9))}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', help="'db' or an export file (csv/json/jsonl)")
+    parser.add_argument('--state-dir', default=STATE_DIR)
+    parser.add_argument('--load', action='store_true', help='upsert rollups changed since the last load into DATABASE_URL')
+    parser.add_argument('--out', help='write touched rollup rows as JSONL')
+    parser.add_argument('--report', action='store_true')
+    args = parser.parse_args()
+
+    rollup = Rollup(args.state_dir)
+    if args.source:
+        n = rollup.fold(source_rows(args.source, rollup.since()))
+        rollup.save()
+        print(f'Folded {n} rows; {len(rollup.touched)} rollup rows to load '
+              f'({len(rollup.aggs)} total, {rollup.late} late heartbeats skipped); '
+              f'watermark {rollup.watermark}', file=sys.stderr)
+        if args.out:
+            with open(args.out, 'w') as f:
+                for row in rollup.touched_rows():
+                    f.write(json.dumps(row) + '\n')
+        if args.load and rollup.touched:
+            psql_stream(upsert_script(rollup.touched_rows()))
+            rollup.touched.clear()
+            rollup.save()
+    if args.report:
+        report(rollup)
+
+
+if __name__ == '__main__':
+    main()
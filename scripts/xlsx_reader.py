@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""Stream rows out of an .xlsx workbook without exporting it to CSV first.
+
+Reads the workbook's zip members directly and walks the sheet XML with
+iterparse, clearing each <row> once it is yielded, so memory stays flat no
+matter how many rows the sheet has (only the shared-string table is held).
+Handles shared strings, inline and rich-text strings, formula string results,
+booleans, sparse rows/cells (positions come from the `r` attributes), and
+numbers styled as dates or percentages (date serials become ISO dates,
+1900 and 1904 date systems).
+
+The masterclass workbook (docs/business/AI Masterclass.xlsx) uses the lead_columns
+labels from migration 032 as its header row; lead_rows() maps those labels to
+leads columns and renders values the way the master-sheet CSV carries them, so
+the rows feed the same conversion as snapshots.master_sheet_rows().
+
+Usage:
+    python scripts/xlsx_reader.py "docs/business/AI Masterclass.xlsx" --leads > leads.jsonl
+    python scripts/xlsx_reader.py book.xlsx --sheet Sheet1 --columns A:D,AI --format csv
+    python scripts/xlsx_reader.py book.xlsx --list
+"""
+import argparse
+import csv
+import json
+import posixpath
+import re
+import sys
+import zipfile
+from datetime import datetime, timedelta
+from xml.etree.ElementTree import iterparse
+
+from generate_seed_sql import clean
+
+# migration 032 seeds lead_columns to match the workbook header row
+LEAD_LABELS = {
+    'ID': 'record_id', 'PRIORITY': 'priority', 'NAME': 'full_name', 'EMAIL': 'email', 'NUMBER': 'phone',
+    'PROFESSION': 'job_title', 'COMPANY': 'company_name', 'LOCATION': 'country', 'INSTAGRAM': 'instagram',
+    'ZOOM DATE': 'discovery_call_date', 'OFFERING TYPE': 'offering_type', 'PART': 'session_type',
+    'PAYMENT': 'payment_amount', 'COUPON': 'has_coupon', 'COUPON %': 'coupon_percent', 'CODE': 'coupon_code',
+    '#SEATS': 'seats', 'PAID DEPOSIT': 'paid_deposit', 'AMOUNT PAID': 'amount_paid', 'DOP': 'date_of_payment',
+    'PAID PLAN': 'is_payment_plan', 'AMOUNT PAID 2': 'amount_paid_2', 'DOP 2': 'date_of_payment_2',
+    'BALANCE': 'balance', 'BALANCE DOP': 'balance_dop', 'PAID FULL': 'paid_full', 'DOP 3': 'date_of_payment_3',
+    'DAY SLOT': 'day_slot', 'TIME SLOT': 'time_slot', 'START DATE': 'start_date', 'END DATE': 'end_date',
+    'SESSIONS DONE': 'sessions_done', 'BOOKED SUPPORT': 'booked_support', 'DATE BOOKED': 'support_date_booked',
+    'REMARKS': 'notes',
+}
+
+# lead_columns of type 'date'; the sheet also has dates typed in as text, day first
+LEAD_DATE_COLUMNS = {'discovery_call_date', 'date_of_payment', 'date_of_payment_2', 'balance_dop',
+                     'date_of_payment_3', 'start_date', 'end_date', 'support_date_booked'}
+TEXT_DATE = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})')
+
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+# built-in number formats that display dates/times
+DATE_FORMAT_IDS = set(range(14, 23)) | set(range(27, 37)) | set(range(45, 48)) | set(range(50, 59))
+PERCENT_FORMAT_IDS = {9, 10}
+CELL_REF = re.compile(r'([A-Z]+)(\d+)')
+
+
+def local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def column_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+
+def parse_columns(spec):
+    """'A:D,F,AI' -> sorted 0-based column indexes."""
+    cols = set()
+    for part in spec.split(','):
+        first, _, last = part.strip().upper().partition(':')
+        cols.update(range(column_index(first), column_index(last or first) + 1))
+    return sorted(cols)
+
+
+def is_date_format(code):
+    code = re.sub(r'"[^"]*"|\\.|\[[^\]]*\]', '', code).lower()
+    return 'general' not in code and bool(re.search(r'[dmyhs]', code))
+
+
+class Workbook:
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path)
+        names = set(self.zip.namelist())
+        rels = {}
+        with self.zip.open('xl/_rels/workbook.xml.rels') as f:
+            for _, el in iterparse(f):
+                if local(el.tag) == 'Relationship':
+                    target = el.get('Target')
+                    rels[el.get('Id')] = target.lstrip('/') if target.startswith('/') else posixpath.join('xl', target)
+        self.sheets = {}
+        self.epoch = datetime(1899, 12, 30)
+        with self.zip.open('xl/workbook.xml') as f:
+            for _, el in iterparse(f):
+                if local(el.tag) == 'sheet':
+                    self.sheets[el.get('name')] = rels[el.get(REL_NS + 'id')]
+                elif local(el.tag) == 'workbookPr' and el.get('date1904') in ('1', 'true'):
+                    self.epoch = datetime(1904, 1, 1)
+        self.strings = self._shared_strings() if 'xl/sharedStrings.xml' in names else []
+        self.styles = self._styles() if 'xl/styles.xml' in names else []
+
+    def _shared_strings(self):
+        strings = []
+        with self.zip.open('xl/sharedStrings.xml') as f:
+            for _, el in iterparse(f):
+                if local(el.tag) == 'si':
+                    strings.append(text_of(el))
+                    el.clear()
+        return strings
+
+    def _styles(self):
+        """Per cellXfs index: 'date', 'percent' or None."""
+        custom, kinds = {}, []
+        in_xfs = False
+        with self.zip.open('xl/styles.xml') as f:
+            for event, el in iterparse(f, events=('start', 'end')):
+                tag = local(el.tag)
+                if tag == 'cellXfs':
+                    in_xfs = event == 'start'
+                elif event == 'end' and tag == 'numFmt':
+                    custom[int(el.get('numFmtId'))] = el.get('formatCode', '')
+                elif event == 'start' and tag == 'xf' and in_xfs:
+                    fmt = int(el.get('numFmtId', 0))
+                    code = custom.get(fmt)
+                    if fmt in PERCENT_FORMAT_IDS or (code and '%' in code):
+                        kinds.append('percent')
+                    elif fmt in DATE_FORMAT_IDS or (code and is_date_format(code)):
+                        kinds.append('date')
+                    else:
+                        kinds.append(None)
+        return kinds
+
+    def _value(self, cell):
+        kind = cell.get('t', 'n')
+        v = None
+        for child in cell:
+            tag = local(child.tag)
+            if tag == 'v':
+                v = child.text
+            elif tag == 'is':
+                return text_of(child)
+        if v is None:
+            return None
+        if kind == 's':
+            return self.strings[int(v)]
+        if kind == 'b':
+            return v == '1'
+        if kind in ('str', 'e', 'inlineStr'):
+            return v
+        number = float(v)
+        style = int(cell.get('s', 0))
+        fmt = self.styles[style] if style < len(self.styles) else None
+        if fmt == 'date':
+            stamp = self.epoch + timedelta(days=number)
+            return stamp.date().isoformat() if number == int(number) else stamp.isoformat(timespec='seconds')
+        if fmt == 'percent':
+            return f'{round(number * 100, 6):g}%'
+        return int(number) if number.is_integer() else number
+
+    def rows(self, sheet=None, columns=None, skip_empty=True):
+        """Yield (row_number, values) from a sheet; `columns` restricts to those indexes, in order."""
+        part = self.sheets[sheet] if sheet else next(iter(self.sheets.values()))
+        wanted = set(columns) if columns is not None else None
+        with self.zip.open(part) as f:
+            parent = None
+            row_number = 0
+            for event, el in iterparse(f, events=('start', 'end')):
+                tag = local(el.tag)
+                if event == 'start':
+                    if tag == 'sheetData':
+                        parent = el
+                    continue
+                if tag != 'row':
+                    continue
+                row_number = int(el.get('r') or row_number + 1)
+                cells = {}
+                col = -1
+                for cell in el:
+                    if local(cell.tag) != 'c':
+                        continue
+                    ref = CELL_REF.match(cell.get('r', ''))
+                    col = column_index(ref.group(1)) if ref else col + 1
+                    if wanted is not None and col not in wanted:
+                        continue
+                    value = self._value(cell)
+                    if value is not None and value != '':
+                        cells[col] = value
+                el.clear()
+                if parent is not None:
+                    parent.clear()  # drop finished rows so the tree never grows
+                if skip_empty and not cells:
+                    continue
+                if columns is not None:
+                    yield row_number, [cells.get(c) for c in columns]
+                else:
+                    yield row_number, [cells.get(c) for c in range(max(cells) + 1)] if cells else []
+
+    def records(self, sheet=None, columns=None, header_row=1):
+        """Row dicts keyed by the header row's values."""
+        header = None
+        for number, values in self.rows(sheet, columns):
+            if number < header_row:
+                continue
+            if header is None:
+                header = ['' if v is None else str(v).strip() for v in values]
+                continue
+            yield {h: values[i] if i < len(values) else None for i, h in enumerate(header) if h}
+
+
+def text_of(el):
+    """Concatenated <t> text of a string item, skipping phonetic runs."""
+    parts = []
+
+    def walk(node):
+        for child in node:
+            tag = local(child.tag)
+            if tag == 't':
+                parts.append(child.text or '')
+            elif tag == 'r':
+                walk(child)
+    if local(el.tag) == 't':
+        return el.text or ''
+    walk(el)
+    return ''.join(parts)
+
+
+def as_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'Yes' if value else 'No'
+    return str(value)
+
+
+def lead_rows(path, sheet=None):
+    """Yield leads rows keyed by database column from the masterclass workbook layout."""
+    for rec in Workbook(path).records(sheet):
+        row = {}
+        for label, value in rec.items():
+            col = LEAD_LABELS.get(label.upper())
+            if col:
+                row[col] = clean(as_text(value))
+                m = TEXT_DATE.fullmatch(row[col] or '') if col in LEAD_DATE_COLUMNS else None
+                if m:
+                    row[col] = f'{m.group(3)}-{int(m.group(2)):02d}-{int(m.group(1)):02d}'
+        if 'is_payment_plan' in row:
+            # PAID PLAN holds the plan itself ('60%', '3 INSTALLMENTS'); migration 041 splits it the same way
+            row['payment_plan'] = row['is_payment_plan']
+            row['is_payment_plan'] = None if row['payment_plan'] is None else 'Yes'
+        if any(v is not None for v in row.values()):
+            yield row
+
+
+def xlsx_rows(path, sheet=None):
+    """Snapshot rows: lead-mapped for the masterclass layout, header-keyed otherwise."""
+    book = Workbook(path)
+    _, header = next(book.rows(sheet), (None, []))
+    labels = {as_text(h).strip().upper() for h in header}
+    if {'EMAIL', 'PRIORITY', 'NAME'} <= labels:
+        yield from lead_rows(path, sheet)
+    else:
+        for rec in book.records(sheet):
+            yield {k: (None if v is None else as_text(v)) for k, v in rec.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--sheet', help='sheet name (default: first sheet)')
+    parser.add_argument('--columns', help="column letters/ranges, e.g. 'A:D,AI'")
+    parser.add_argument('--leads', action='store_true', help='map the masterclass header row to leads columns')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], default='jsonl')
+    parser.add_argument('--list', action='store_true', help='list sheet names and exit')
+    args = parser.parse_args()
+
+    book = Workbook(args.path)
+    if args.list:
+        for name in book.sheets:
+            print(name)
+        return
+    columns = parse_columns(args.columns) if args.columns else None
+    if args.leads:
+        rows = lead_rows(args.path, args.sheet)
+    else:
+        rows = ({k: (None if v is None else as_text(v)) for k, v in rec.items()}
+                for rec in book.records(args.sheet, columns))
+
+    n = 0
+    writer = None
+    for row in rows:
+        if args.format == 'csv':
+            if writer is None:
+                writer = csv.DictWriter(sys.stdout, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow({k: '' if v is None else v for k, v in row.items()})
+        else:
+            sys.stdout.write(json.dumps(row, ensure_ascii=False) + '\n')
+        n += 1
+    print(f'{n} rows', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
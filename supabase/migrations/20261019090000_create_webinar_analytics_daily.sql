@@ -0,0 +1,33 @@
+-- Daily rollups of webinar_analytics, maintained by scripts/webinar_rollup.py
+-- One row per day × path × variant × referrer. duration_sketch / session_hll
+-- are mergeable so coarser groupings can be rebuilt without the raw rows.
+CREATE TABLE IF NOT EXISTS public.webinar_analytics_daily (
+    day date NOT NULL,
+    path text NOT NULL,
+    variant text NOT NULL,
+    referrer text NOT NULL,
+    pageviews integer DEFAULT 0 NOT NULL,
+    sessions integer DEFAULT 0 NOT NULL,
+    total_duration_seconds bigint DEFAULT 0 NOT NULL,
+    p50_duration_seconds numeric,
+    p90_duration_seconds numeric,
+    p99_duration_seconds numeric,
+    duration_sketch jsonb DEFAULT '{}'::jsonb NOT NULL,
+    session_hll text,
+    updated_at timestamptz DEFAULT now() NOT NULL,
+    PRIMARY KEY (day, path, variant, referrer)
+);
+
+CREATE INDEX IF NOT EXISTS webinar_analytics_daily_variant_idx ON public.webinar_analytics_daily (variant, day);
+
+-- Enable RLS
+ALTER TABLE public.webinar_analytics_daily ENABLE ROW LEVEL SECURITY;
+
+-- Allow admins/owners select access (writes come from the service role job)
+CREATE POLICY "Allow admins select on webinar_analytics_daily" ON public.webinar_analytics_daily
+    FOR SELECT TO authenticated
+    USING (
+        auth.uid() IN (
+            SELECT id FROM public.users WHERE role IN ('owner', 'admin')
+        )
+    );
@@ -0,0 +1,27 @@
+-- Monthly finance rollups, maintained by scripts/ledger.py
+-- One row per month × offering_type. Amounts are in the leads' currency units;
+-- costs are spread over offering types in proportion to that month's cash-in
+-- (months without cash-in keep their costs under offering_type 'unallocated').
+CREATE TABLE IF NOT EXISTS public.ledger_monthly (
+    month date NOT NULL,
+    offering_type text NOT NULL,
+    cash_in numeric(12, 2) DEFAULT 0 NOT NULL,
+    payments integer DEFAULT 0 NOT NULL,
+    coupon_leakage numeric(12, 2) DEFAULT 0 NOT NULL,
+    allocated_costs numeric(12, 2) DEFAULT 0 NOT NULL,
+    net numeric(12, 2) DEFAULT 0 NOT NULL,
+    updated_at timestamptz DEFAULT now() NOT NULL,
+    PRIMARY KEY (month, offering_type)
+);
+
+-- Enable RLS
+ALTER TABLE public.ledger_monthly ENABLE ROW LEVEL SECURITY;
+
+-- Allow admins/owners select access (writes come from the service role job)
+CREATE POLICY "Allow admins select on ledger_monthly" ON public.ledger_monthly
+    FOR SELECT TO authenticated
+    USING (
+        auth.uid() IN (
+            SELECT id FROM public.users WHERE role IN ('owner', 'admin')
+        )
+    );
@@ -0,0 +1,37 @@
+-- Precomputed chat sidebar state, maintained by scripts/chat_unread.py
+-- chat_unread_counts matches get_unread_counts(): messages from others newer
+-- than the member's last_read_at (all of them when there is no receipt).
+CREATE TABLE IF NOT EXISTS public.chat_unread_counts (
+    room_id uuid NOT NULL REFERENCES public.chat_rooms(id) ON DELETE CASCADE,
+    user_id uuid NOT NULL REFERENCES public.users(id) ON DELETE CASCADE,
+    unread_count integer DEFAULT 0 NOT NULL,
+    last_read_at timestamptz,
+    updated_at timestamptz DEFAULT now() NOT NULL,
+    PRIMARY KEY (room_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS chat_unread_counts_user_idx ON public.chat_unread_counts (user_id);
+
+CREATE TABLE IF NOT EXISTS public.chat_room_last_message (
+    room_id uuid PRIMARY KEY REFERENCES public.chat_rooms(id) ON DELETE CASCADE,
+    message_id uuid,
+    sender_id uuid,
+    message_type text,
+    preview text,
+    created_at timestamptz,
+    message_count bigint DEFAULT 0 NOT NULL,
+    updated_at timestamptz DEFAULT now() NOT NULL
+);
+
+-- Enable RLS
+ALTER TABLE public.chat_unread_counts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.chat_room_last_message ENABLE ROW LEVEL SECURITY;
+
+-- Users read their own badges; writes come from the service role job
+CREATE POLICY "Users can view their own unread counts" ON public.chat_unread_counts
+    FOR SELECT TO authenticated
+    USING (user_id = auth.uid());
+
+CREATE POLICY "Room members can view last message" ON public.chat_room_last_message
+    FOR SELECT TO authenticated
+    USING (public.is_room_member(room_id, auth.uid()));
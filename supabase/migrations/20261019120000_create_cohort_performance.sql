@@ -0,0 +1,24 @@
+-- Precomputed cohort performance, maintained by scripts/cohort_matrix.py
+-- One row per cohort. session_ids / assignment_ids fix the column order of
+-- each member's attendance and submitted bitsets (hex, bit i = column i) and
+-- scores array; summary holds cohort totals and the held/due masks.
+CREATE TABLE IF NOT EXISTS public.cohort_performance (
+    cohort_id uuid PRIMARY KEY REFERENCES public.cohorts(id) ON DELETE CASCADE,
+    session_ids uuid[] DEFAULT '{}' NOT NULL,
+    assignment_ids uuid[] DEFAULT '{}' NOT NULL,
+    summary jsonb DEFAULT '{}'::jsonb NOT NULL,
+    members jsonb DEFAULT '[]'::jsonb NOT NULL,
+    updated_at timestamptz DEFAULT now() NOT NULL
+);
+
+-- Enable RLS
+ALTER TABLE public.cohort_performance ENABLE ROW LEVEL SECURITY;
+
+-- Allow admins/owners select access (writes come from the service role job)
+CREATE POLICY "Allow admins select on cohort_performance" ON public.cohort_performance
+    FOR SELECT TO authenticated
+    USING (
+        auth.uid() IN (
+            SELECT id FROM public.users WHERE role IN ('owner', 'admin')
+        )
+    );
@@ -0,0 +1,32 @@
+-- Pre/post survey improvement per cohort, maintained by scripts/survey_impact.py
+-- One row per group × survey type × paired question. group_key is
+-- 'cohort:<uuid>', 'company:<normalized name>' when the company has no cohort,
+-- or 'all'. Deltas are post minus pre on the 1-5 scale; effect_size is
+-- Cohen's d for paired samples (mean delta / sd of deltas).
+CREATE TABLE IF NOT EXISTS public.survey_impact (
+    group_key text NOT NULL,
+    cohort_id uuid REFERENCES public.cohorts(id) ON DELETE CASCADE,
+    survey_type text NOT NULL CHECK (survey_type IN ('team', 'management')),
+    question text NOT NULL,
+    pairs integer NOT NULL,
+    pre_mean numeric,
+    post_mean numeric,
+    mean_delta numeric,
+    sd_delta numeric,
+    effect_size numeric,
+    improved_share numeric,
+    updated_at timestamptz DEFAULT now() NOT NULL,
+    PRIMARY KEY (group_key, survey_type, question)
+);
+
+-- Enable RLS
+ALTER TABLE public.survey_impact ENABLE ROW LEVEL SECURITY;
+
+-- Allow admins/owners select access (writes come from the service role job)
+CREATE POLICY "Allow admins select on survey_impact" ON public.survey_impact
+    FOR SELECT TO authenticated
+    USING (
+        auth.uid() IN (
+            SELECT id FROM public.users WHERE role IN ('owner', 'admin')
+        )
+    );
@@ -0,0 +1,9 @@
+-- Link leads to companies, maintained by scripts/company_resolver.py
+-- leads.company_name stays the free text the sales team typed; company_id is
+-- the resolved link and company_match_score how it was made (1 = exact
+-- normalized name, NULL = set by hand, which the resolver never overwrites).
+ALTER TABLE public.leads
+    ADD COLUMN IF NOT EXISTS company_id UUID REFERENCES public.companies(id) ON DELETE SET NULL,
+    ADD COLUMN IF NOT EXISTS company_match_score NUMERIC(4,3);
+
+CREATE INDEX IF NOT EXISTS idx_leads_company_id ON public.leads(company_id);